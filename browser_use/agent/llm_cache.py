@@ -0,0 +1,186 @@
+"""
+Content-addressed cache of LLM responses, for deterministic reruns of the same task on the same page states.
+
+Set on the chat models of an agent (Agent(llm_cache=...)), it answers every call that was made with exactly the same
+model, parameters, output schema and messages before without querying the LLM again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import warnings
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Literal
+
+from langchain_core._api.beta_decorator import LangChainBetaWarning
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+LLMCacheMode = Literal['read_write', 'record', 'replay']
+
+# parts of the messages that change on every run without changing what the LLM should answer
+VOLATILE_PATTERNS = [
+	(re.compile(r'Current date and time: \d{4}-\d{2}-\d{2} \d{2}:\d{2}'), 'Current date and time: <now>'),
+]
+
+
+class LLMCacheMissError(Exception):
+	"""Raised in replay mode when a call was not recorded before"""
+
+
+class LLMCacheBackend(ABC):
+	"""Storage of serialized responses by key, subclass it to keep them somewhere else"""
+
+	@abstractmethod
+	def get(self, key: str) -> str | None:
+		pass
+
+	@abstractmethod
+	def set(self, key: str, value: str) -> None:
+		pass
+
+	@abstractmethod
+	def delete(self, key: str) -> None:
+		pass
+
+	@abstractmethod
+	def clear(self) -> None:
+		pass
+
+
+class MemoryCacheBackend(LLMCacheBackend):
+	"""Keeps the max_entries most recently used responses in memory"""
+
+	def __init__(self, max_entries: int = 1000):
+		self.max_entries = max_entries
+		self._entries: OrderedDict[str, str] = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key: str) -> str | None:
+		with self._lock:
+			value = self._entries.get(key)
+			if value is not None:
+				self._entries.move_to_end(key)
+			return value
+
+	def set(self, key: str, value: str) -> None:
+		with self._lock:
+			self._entries[key] = value
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def delete(self, key: str) -> None:
+		with self._lock:
+			self._entries.pop(key, None)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+
+
+class DiskCacheBackend(LLMCacheBackend):
+	"""Keeps the responses as one JSON file per key in a directory, e.g. to check the recordings of a test suite in"""
+
+	def __init__(self, directory: str | Path = '.browser_use_llm_cache'):
+		self.directory = Path(directory)
+
+	def _path(self, key: str) -> Path:
+		return self.directory / key[:2] / f'{key}.json'
+
+	def get(self, key: str) -> str | None:
+		try:
+			return self._path(key).read_text(encoding='utf-8')
+		except FileNotFoundError:
+			return None
+
+	def set(self, key: str, value: str) -> None:
+		path = self._path(key)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		# write to a temporary file first, concurrent agents must never read a half written response
+		fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+		with os.fdopen(fd, 'w', encoding='utf-8') as f:
+			f.write(value)
+		os.replace(tmp_path, path)
+
+	def delete(self, key: str) -> None:
+		self._path(key).unlink(missing_ok=True)
+
+	def clear(self) -> None:
+		for path in self.directory.glob('*/*.json'):
+			path.unlink(missing_ok=True)
+
+
+class LLMResponseCache(BaseCache):
+	"""
+	LangChain cache keyed by a hash of the model and its parameters (including the output schema bound as tools or
+	response format) and of the messages, screenshots included.
+
+	mode:
+		'read_write': answer from the cache when possible, query the LLM and store the response otherwise
+		'record': always query the LLM and store the responses, e.g. to refresh recorded test runs
+		'replay': only answer from the cache, raise LLMCacheMissError instead of querying the LLM
+	ttl_seconds: responses older than this are not used anymore (None: never expire)
+	"""
+
+	def __init__(
+		self,
+		backend: LLMCacheBackend | None = None,
+		mode: LLMCacheMode = 'read_write',
+		ttl_seconds: float | None = None,
+	):
+		self.backend = backend or MemoryCacheBackend()
+		self.mode = mode
+		self.ttl_seconds = ttl_seconds
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def make_key(prompt: str, llm_string: str) -> str:
+		"""prompt: the serialized messages, llm_string: the serialized model, parameters and bound tools (as LangChain passes them)"""
+		for pattern, replacement in VOLATILE_PATTERNS:
+			prompt = pattern.sub(replacement, prompt)
+		return hashlib.sha256(f'{llm_string}\n{prompt}'.encode()).hexdigest()
+
+	def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+		if self.mode == 'record':
+			return None
+
+		key = self.make_key(prompt, llm_string)
+		value = self.backend.get(key)
+		entry = json.loads(value) if value is not None else None
+
+		if entry is not None and self.ttl_seconds is not None and time.time() - entry['created_at'] > self.ttl_seconds:
+			self.backend.delete(key)
+			entry = None
+
+		if entry is None:
+			self.misses += 1
+			if self.mode == 'replay':
+				raise LLMCacheMissError(f'No recorded LLM response for {key} in replay mode')
+			return None
+
+		self.hits += 1
+		logger.debug(f'💾 LLM response {key[:12]} answered from the cache')
+		with warnings.catch_warnings():
+			warnings.simplefilter('ignore', LangChainBetaWarning)
+			return [loads(generation) for generation in entry['generations']]
+
+	def update(self, prompt: str, llm_string: str, return_val: Sequence) -> None:
+		if self.mode == 'replay':
+			return
+		entry = {'created_at': time.time(), 'generations': [dumps(generation) for generation in return_val]}
+		self.backend.set(self.make_key(prompt, llm_string), json.dumps(entry))
+
+	def clear(self, **kwargs) -> None:
+		self.backend.clear()
@@ -0,0 +1,155 @@
+"""
+Embedders and vector stores of procedural memory, shared by all agents of the process with the same configuration.
+
+Without sharing, every Memory loads its own copy of the embedding model (a local sentence-transformers model by default)
+and keeps its own copy of the vector store, which all agents save to the same files.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections.abc import Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
+
+from langchain_core.embeddings import Embeddings
+
+from browser_use.agent.memory.views import MemoryConfig
+
+if TYPE_CHECKING:
+	from mem0.embeddings.base import EmbeddingBase
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# held while a mem0 Memory is created with the shared vector stores, see shared_vector_stores
+_mem0_init_lock = threading.Lock()
+_embeddings: dict[tuple[str, str, int], SharedEmbeddings] = {}
+_vector_stores: dict[tuple[str, str], SharedVectorStore] = {}
+
+
+class SharedEmbeddings(Embeddings):
+	"""
+	One embedder for all agents. A text is embedded right away if no other one is being embedded, the texts that arrive
+	in the meantime (memories are created in threads, see Memory.start_procedural_memory) are embedded in one batch next.
+	"""
+
+	def __init__(self, embedder: EmbeddingBase, max_batch_size: int = 64):
+		self.embedder = embedder
+		self.max_batch_size = max_batch_size
+		self._lock = threading.Lock()
+		self._pending: list[tuple[str, Future[list[float]]]] = []
+		self._embedding = False
+
+	def embed_query(self, text: str) -> list[float]:
+		future: Future[list[float]] = Future()
+		with self._lock:
+			self._pending.append((text, future))
+			# the first caller embeds until nothing is pending, the others wait for their results
+			leader, self._embedding = not self._embedding, True
+
+		while leader:
+			with self._lock:
+				batch = self._pending[: self.max_batch_size]
+				del self._pending[: len(batch)]
+				if not batch:
+					self._embedding = False
+					break
+			try:
+				embeddings = self.embed_documents([text for text, _ in batch])
+			except Exception as e:
+				for _, pending in batch:
+					pending.set_exception(e)
+			else:
+				for (_, pending), embedding in zip(batch, embeddings):
+					pending.set_result(embedding)
+
+		return future.result()
+
+	def embed_documents(self, texts: list[str]) -> list[list[float]]:
+		if len(texts) > 1:
+			logger.debug(f'Embedding {len(texts)} texts in one batch')
+
+		# batch APIs of the providers that have one, one call per text otherwise
+		model = getattr(self.embedder, 'model', None)
+		if hasattr(model, 'encode'):  # sentence-transformers
+			return model.encode(texts, convert_to_numpy=True).tolist()  # type: ignore[union-attr]
+		client = getattr(self.embedder, 'client', None)
+		if hasattr(client, 'embeddings') and hasattr(client.embeddings, 'create'):  # OpenAI
+			response = client.embeddings.create(  # type: ignore[union-attr]
+				input=[text.replace('\n', ' ') for text in texts],
+				model=self.embedder.config.model,
+				dimensions=self.embedder.config.embedding_dims,
+			)
+			return [item.embedding for item in response.data]
+		return [self.embedder.embed(text) for text in texts]
+
+
+class SharedVectorStore:
+	"""One vector store handle for all agents, their calls are serialized as the stores are not thread-safe"""
+
+	def __init__(self, store: Any):
+		self._store = store
+		self._lock = threading.RLock()
+
+	def __getattr__(self, name: str) -> Any:
+		attribute = getattr(self._store, name)
+		if not callable(attribute):
+			return attribute
+
+		def locked(*args, **kwargs):
+			with self._lock:
+				return attribute(*args, **kwargs)
+
+		return locked
+
+
+def get_shared_embeddings(config: MemoryConfig) -> SharedEmbeddings:
+	"""The embedder for the embedder settings of the config, created by the first agent that needs it"""
+	key = (config.embedder_provider, config.embedder_model, config.embedder_dims)
+	# held while the model loads, agents starting at the same time wait for it instead of loading it as well
+	with _lock:
+		if key not in _embeddings:
+			from mem0.utils.factory import EmbedderFactory
+
+			logger.debug(f'Loading the {config.embedder_provider} embedder {config.embedder_model} for all agents')
+			embedder = EmbedderFactory.create(config.embedder_provider, config.embedder_config_dict['config'], None)
+			_embeddings[key] = SharedEmbeddings(embedder)
+		return _embeddings[key]
+
+
+def get_shared_vector_store(provider: str, config: Any, factory: Any) -> SharedVectorStore:
+	"""The vector store for the provider and its config (path, collection, dimensions), opened by the first agent"""
+	settings = config.model_dump() if hasattr(config, 'model_dump') else dict(config)
+	key = (provider, json.dumps(settings, sort_keys=True, default=str))
+	with _lock:
+		if key not in _vector_stores:
+			logger.debug(f'Opening the {provider} vector store {settings.get("collection_name")} for all agents')
+			_vector_stores[key] = SharedVectorStore(factory.create(provider, config))
+		return _vector_stores[key]
+
+
+@contextmanager
+def shared_vector_stores() -> Iterator[None]:
+	"""
+	The mem0 Memory created inside opens the shared vector stores, for its memories and its telemetry,
+	instead of loading its own copies of the stores from disk.
+	"""
+	import mem0.memory.main as mem0_main
+
+	class SharedVectorStoreFactory:
+		@staticmethod
+		def create(provider: str, config: Any) -> SharedVectorStore:
+			return get_shared_vector_store(provider, config, factory)
+
+	# NOTE: mem0 has no way to pass in existing vector stores, its module is patched while the Memory is created
+	with _mem0_init_lock:
+		factory = mem0_main.VectorStoreFactory
+		mem0_main.VectorStoreFactory = SharedVectorStoreFactory  # type: ignore[misc]
+		try:
+			yield
+		finally:
+			mem0_main.VectorStoreFactory = factory  # type: ignore[misc]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 
@@ -10,6 +11,7 @@ from langchain_core.messages import (
 )
 from langchain_core.messages.utils import convert_to_openai_messages
 
+from browser_use.agent.memory.registry import get_shared_embeddings, shared_vector_stores
 from browser_use.agent.memory.views import MemoryConfig
 from browser_use.agent.message_manager.service import MessageManager
 from browser_use.agent.message_manager.views import ManagedMessage, MessageMetadata
@@ -57,7 +59,7 @@ class Memory:
 				self.config.embedder_dims = 512
 		else:
 			# Ensure LLM instance is set in the config
-			self.config = MemoryConfig(config)  # re-validate user-provided config
+			self.config = MemoryConfig.model_validate(config)  # re-validate user-provided config
 			self.config.llm_instance = llm
 
 		# Check for required packages
@@ -78,8 +80,18 @@ class Memory:
 					'sentence_transformers is required when enable_memory=True and embedder_provider="huggingface". Please install it with `pip install sentence-transformers`.'
 				)
 
-		# Initialize Mem0 with the configuration
-		self.mem0 = Mem0Memory.from_config(config_dict=self.config.full_config_dict)
+		# Initialize Mem0 with the configuration, with the embedder and vector store shared by all agents of the process
+		config_dict = self.config.full_config_dict
+		config_dict['embedder'] = {
+			'provider': 'langchain',
+			'config': {'model': get_shared_embeddings(self.config), 'embedding_dims': self.config.embedder_dims},
+		}
+		with shared_vector_stores():
+			self.mem0 = Mem0Memory.from_config(config_dict=config_dict)
+
+		# procedural memory being created in the background, and the messages it replaces
+		self._consolidation: asyncio.Task[str | None] | None = None
+		self._consolidated_messages: list[ManagedMessage] = []
 
 	@time_execution_sync('--create_procedural_memory')
 	def create_procedural_memory(self, current_step: int) -> None:
@@ -91,20 +103,9 @@ class Memory:
 		"""
 		logger.info(f'Creating procedural memory at step {current_step}')
 
-		# Get all messages
-		all_messages = self.message_manager.state.history.messages
-
-		# Separate messages into those to keep as-is and those to process for memory
-		new_messages = []
-		messages_to_process = []
-
-		for msg in all_messages:
-			if isinstance(msg, ManagedMessage) and msg.metadata.message_type in {'init', 'memory'}:
-				# Keep system and memory messages as they are
-				new_messages.append(msg)
-			else:
-				if len(msg.message.content) > 0:
-					messages_to_process.append(msg)
+		messages_to_replace = self._get_messages_to_replace()
+		# the model outputs (tool calls) and their tool responses have no content, they are replaced but not summarized
+		messages_to_process = [m for m in messages_to_replace if len(m.message.content) > 0]
 
 		# Need at least 2 messages to create a meaningful summary
 		if len(messages_to_process) <= 1:
@@ -117,22 +118,77 @@ class Memory:
 			logger.warning('Failed to create procedural memory')
 			return
 
-		# Replace the processed messages with the consolidated memory
+		self._replace_with_memory(messages_to_replace, memory_content)
+
+	def start_procedural_memory(self, current_step: int) -> None:
+		"""
+		Like create_procedural_memory, but the memory is created in a thread on a snapshot of the messages while the agent
+		keeps stepping. apply_procedural_memory swaps it into the history once it is done.
+		"""
+		if self._consolidation is not None:
+			logger.debug('Procedural memory is still being created, not starting another one')
+			return
+
+		messages_to_replace = self._get_messages_to_replace()
+		messages_to_process = [m for m in messages_to_replace if len(m.message.content) > 0]
+		if len(messages_to_process) <= 1:
+			logger.info('Not enough non-memory messages to summarize')
+			return
+
+		logger.info(f'Creating procedural memory at step {current_step} in the background')
+		snapshot = [m.message.model_copy(deep=True) for m in messages_to_process]
+		self._consolidated_messages = messages_to_replace
+		self._consolidation = asyncio.create_task(asyncio.to_thread(self._create, snapshot, current_step))
+
+	def apply_procedural_memory(self) -> bool:
+		"""Replaces the consolidated messages with the procedural memory if its creation finished, call it between steps"""
+		if self._consolidation is None or not self._consolidation.done():
+			return False
+
+		consolidation, self._consolidation = self._consolidation, None
+		messages, self._consolidated_messages = self._consolidated_messages, []
+		memory_content = None if consolidation.cancelled() else consolidation.result()
+		if not memory_content:
+			logger.warning('Failed to create procedural memory')
+			return False
+
+		self._replace_with_memory(messages, memory_content)
+		return True
+
+	def cancel_procedural_memory(self) -> None:
+		"""Drops a procedural memory that is still being created, its thread finishes on its own"""
+		if self._consolidation is not None:
+			self._consolidation.cancel()
+		self._consolidation = None
+		self._consolidated_messages = []
+
+	def _get_messages_to_replace(self) -> list[ManagedMessage]:
+		# Keep system, task and memory messages as they are, and the full page state later state messages refer to
+		kept_types = {'init', 'task', 'memory', 'state_base', 'history_summary'}
+		return [msg for msg in self.message_manager.state.history.messages if msg.metadata.message_type not in kept_types]
+
+	def _replace_with_memory(self, messages_to_replace: list[ManagedMessage], memory_content: str) -> None:
+		"""
+		Replace the messages with the consolidated memory, in the place of the first of them.
+		Messages added since the memory was started stay after it, replaced messages that are gone already are skipped.
+		"""
+		history = self.message_manager.state.history
+		processed = {id(m) for m in messages_to_replace}
+		position = next((i for i, m in enumerate(history.messages) if id(m) in processed), len(history.messages))
+
 		memory_message = HumanMessage(content=memory_content)
 		memory_tokens = self.message_manager._count_tokens(memory_message)
 		memory_metadata = MessageMetadata(tokens=memory_tokens, message_type='memory')
 
 		# Calculate the total tokens being removed
-		removed_tokens = sum(m.metadata.tokens for m in messages_to_process)
-
-		# Add the memory message
-		new_messages.append(ManagedMessage(message=memory_message, metadata=memory_metadata))
+		removed_tokens = sum(m.metadata.tokens for m in history.messages if id(m) in processed)
 
 		# Update the history
-		self.message_manager.state.history.messages = new_messages
-		self.message_manager.state.history.current_tokens -= removed_tokens
-		self.message_manager.state.history.current_tokens += memory_tokens
-		logger.info(f'Messages consolidated: {len(messages_to_process)} messages converted to procedural memory')
+		new_messages = [m for m in history.messages if id(m) not in processed]
+		new_messages.insert(position, ManagedMessage(message=memory_message, metadata=memory_metadata))
+		history.messages = new_messages
+		history.current_tokens += memory_tokens - removed_tokens
+		logger.info(f'Messages consolidated: {len(messages_to_replace)} messages converted to procedural memory')
 
 	def _create(self, messages: list[BaseMessage], current_step: int) -> str | None:
 		parsed_messages = convert_to_openai_messages(messages)
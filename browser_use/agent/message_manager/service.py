@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
+from functools import partial
 
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import (
 	AIMessage,
 	BaseMessage,
@@ -9,25 +13,64 @@ from langchain_core.messages import (
 	SystemMessage,
 	ToolMessage,
 )
-from pydantic import BaseModel
-
-from browser_use.agent.message_manager.views import MessageMetadata
+from pydantic import BaseModel, Field
+
+from browser_use.agent.message_manager.tokenizers import CharacterEstimateTokenizer, Tokenizer, get_image_size
+from browser_use.agent.message_manager.views import (
+	FoldedStep,
+	HistorySummary,
+	ManagedMessage,
+	MessageMetadata,
+	RenderedStateMessage,
+	StateDeltaBase,
+)
 from browser_use.agent.prompts import AgentMessagePrompt
 from browser_use.agent.views import ActionResult, AgentOutput, AgentStepInfo, MessageManagerState
 from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMBaseNode, DOMElementNode, DOMTextNode
 from browser_use.utils import time_execution_sync
 
 logger = logging.getLogger(__name__)
 
+# Url, headings, step info and date of a state message, without tabs, elements and action results
+STATE_MESSAGE_TEMPLATE_TOKENS = 150
+# Send the full state again once more than this share of the page elements changed
+MAX_STATE_DELTA_RATIO = 0.5
+# Full state messages replaced by a newer one, they stay in place and are folded with the steps around them
+SUPERSEDED_STATE_BASE = 'superseded_state_base'
+# Characters kept of each action parameter list and each action result of a folded step
+MAX_FOLDED_ACTION_CHARACTERS = 100
+MAX_FOLDED_OUTCOME_CHARACTERS = 300
+
+HISTORY_SUMMARY_PROMPT = """You maintain the running summary of the history of a browser automation agent.
+You get the current summary and the steps that were folded out of the history since.
+Write the new summary of all of them, for the agent to continue its task with: what was achieved, the facts and values that were found, what failed and should not be tried again, and where the agent is now.
+Keep it under {max_tokens} tokens. Answer only with the summary."""
+
 
 class MessageManagerSettings(BaseModel):
 	max_input_tokens: int = 128000
 	estimated_characters_per_token: int = 3
-	image_tokens: int = 800
+	image_tokens: int = 800  # for images of unknown size
 	include_attributes: list[str] = []
+	compact_repeated_elements: int | None = Field(default=None, ge=1)
+	# Only list the changes of the page elements against the last full state message
+	state_delta: bool = False
+	state_delta_refresh_interval: int = 10  # send the full state at least every N state messages
 	message_context: str | None = None
+	# Add cache_control markers to the end of the stable prefix of the messages (Anthropic prompt caching)
+	prompt_cache_markers: bool = False
 	sensitive_data: dict[str, str] | None = None
 	available_file_paths: list[str] | None = None
+	# Fold the steps before the last history_keep_steps into a running summary, history_fold_steps at a time,
+	# and more of them while the history is above history_token_target (default: half of max_input_tokens)
+	history_compaction: bool = False
+	history_keep_steps: int = 5
+	history_fold_steps: int = 5
+	history_token_target: int | None = None
+	history_summary_max_tokens: int = 2000
+	# folded steps that are rewritten into the summary text at once, see acompact_history
+	history_summary_min_steps: int = 5
 
 
 class MessageManager:
@@ -37,11 +80,13 @@ class MessageManager:
 		system_message: SystemMessage,
 		settings: MessageManagerSettings = MessageManagerSettings(),
 		state: MessageManagerState = MessageManagerState(),
+		tokenizer: Tokenizer | None = None,
 	):
 		self.task = task
 		self.settings = settings
 		self.state = state
 		self.system_prompt = system_message
+		self.tokenizer = tokenizer or CharacterEstimateTokenizer(self.settings.estimated_characters_per_token)
 
 		# Only initialize messages if state is empty
 		if len(self.state.history.messages) == 0:
@@ -115,7 +160,7 @@ class MessageManager:
 	def add_new_task(self, new_task: str) -> None:
 		content = f'Your new ultimate task is: """{new_task}""". Take the previous context into account and finish your new ultimate task. '
 		msg = HumanMessage(content=content)
-		self._add_message_with_tokens(msg)
+		self._add_message_with_tokens(msg, message_type='task')
 		self.task = new_task
 
 	@time_execution_sync('--add_state_message')
@@ -125,9 +170,40 @@ class MessageManager:
 		result: list[ActionResult] | None = None,
 		step_info: AgentStepInfo | None = None,
 		use_vision=True,
+		page_actions: str | None = None,
 	) -> None:
-		"""Add browser state as human message"""
+		"""Add browser state as human message
 
+		page_actions: actions only available on the current page, they change with the page and are therefore only part of
+			the state message, not of the history
+		"""
+		prompt = self._prepare_state_message(state, result, step_info, use_vision, page_actions)
+		self._commit_state_message(self._render_state_message(prompt, state, use_vision))
+
+	async def aadd_state_message(
+		self,
+		state: BrowserState,
+		result: list[ActionResult] | None = None,
+		step_info: AgentStepInfo | None = None,
+		use_vision=True,
+		page_actions: str | None = None,
+	) -> None:
+		"""Like add_state_message, but renders the state message in a thread to keep the event loop free in the meantime"""
+		prompt = self._prepare_state_message(state, result, step_info, use_vision, page_actions)
+		# NOTE: Only the rendering runs in the thread. The history is changed on the event loop, where the memory,
+		#       the planner and the compaction change and read it as well.
+		rendered = await asyncio.to_thread(self._render_state_message, prompt, state, use_vision)
+		self._commit_state_message(rendered)
+
+	def _prepare_state_message(
+		self,
+		state: BrowserState,
+		result: list[ActionResult] | None,
+		step_info: AgentStepInfo | None,
+		use_vision: bool,
+		page_actions: str | None,
+	) -> AgentMessagePrompt:
+		"""Adds the action results to keep to the history, returns the prompt of the state message"""
 		# if keep in memory, add to directly to history and add state without result
 		if result:
 			for r in result:
@@ -145,14 +221,270 @@ class MessageManager:
 						self._add_message_with_tokens(msg)
 					result = None  # if result in history, we dont want to add it again
 
+		if self.settings.history_compaction:
+			self.compact_history()
+
 		# otherwise add state message and result to next message (which will not stay in memory)
-		state_message = AgentMessagePrompt(
+		return AgentMessagePrompt(
 			state,
 			result,
 			include_attributes=self.settings.include_attributes,
 			step_info=step_info,
-		).get_user_message(use_vision)
-		self._add_message_with_tokens(state_message)
+			elements_token_budget=self._get_elements_token_budget(state, result, use_vision, page_actions),
+			# the lines are only counted for this budget, they would push the history out of the cache of the tokenizer
+			count_tokens=partial(self.tokenizer.count_text_tokens, cache=False),
+			compact_repeated_elements=self.settings.compact_repeated_elements,
+			page_actions=page_actions,
+		)
+
+	@time_execution_sync('--render_state_message')
+	def _render_state_message(self, prompt: AgentMessagePrompt, state: BrowserState, use_vision: bool) -> RenderedStateMessage:
+		"""Renders the state message, only reads the history"""
+		rendered = RenderedStateMessage(message=ManagedMessage(message=HumanMessage(content='')))
+		if self.settings.state_delta:
+			self._set_state_delta_base(prompt, state, rendered)
+		rendered.message = self._get_managed_message(prompt.get_user_message(use_vision))
+		return rendered
+
+	def _commit_state_message(self, rendered: RenderedStateMessage) -> None:
+		if self.settings.state_delta:
+			if rendered.state_delta_base is not None and rendered.state_base_message is None:
+				rendered.state_delta_base.state_messages += 1
+			else:
+				# NOTE: The last base is kept, removing it would change the messages after it, which then miss the prompt
+				#       cache. The base before it is removed, otherwise every new base would grow the prompt.
+				self.state.history.remove_messages_by_type(SUPERSEDED_STATE_BASE)
+				for m in self.state.history.messages:
+					if m.metadata.message_type == 'state_base':
+						m.metadata.message_type = SUPERSEDED_STATE_BASE
+				if rendered.state_base_message is not None:
+					self.state.history.add_message(rendered.state_base_message.message, rendered.state_base_message.metadata)
+			self.state.state_delta_base = rendered.state_delta_base
+		self.state.history.add_message(rendered.message.message, rendered.message.metadata)
+
+	def _set_state_delta_base(self, prompt: AgentMessagePrompt, state: BrowserState, rendered: RenderedStateMessage) -> None:
+		"""
+		Lets the state message only list the changes against the last full state, if that is still worth it.
+		Otherwise the full element list is kept in history as the new base, and the state message lists no changes.
+		"""
+		base = self.state.state_delta_base
+		has_base_message = any(m.metadata.message_type == 'state_base' for m in self.state.history.messages)
+		if (
+			base is not None
+			and has_base_message
+			and base.url == state.url
+			and base.state_messages < self.settings.state_delta_refresh_interval
+		):
+			_, changes = prompt.get_state_delta(base)
+			if changes <= MAX_STATE_DELTA_RATIO * max(len(state.selector_map), 1):
+				rendered.state_delta_base = prompt.state_delta_base = base
+				return
+
+		elements, texts = prompt.get_state_lines()
+		if len(elements) != len(state.selector_map):
+			# elements that can't be told apart by their hash can't be diffed, send the full state
+			return
+
+		left_out: list[DOMBaseNode] = []
+		elements_text = prompt.get_elements_text(left_out)
+		# the model only saw the lines within the token budget, the next deltas list the others as new
+		left_out_indexes = {node.highlight_index for node in left_out if isinstance(node, DOMElementNode)}
+		left_out_texts = {node.text for node in left_out if isinstance(node, DOMTextNode)}
+		elements = {element_hash: line for element_hash, line in elements.items() if line[0] not in left_out_indexes}
+		texts = [text for text in texts if text not in left_out_texts]
+
+		base_message = HumanMessage(
+			content=(
+				'[Full page state - the following state messages only list the changes against it]\n'
+				f'Current url: {state.url}\n'
+				f'Interactive elements from top layer of the current page inside the viewport:\n{elements_text}'
+			)
+		)
+		rendered.state_base_message = self._get_managed_message(base_message, message_type='state_base')
+		rendered.state_delta_base = prompt.state_delta_base = StateDeltaBase(url=state.url, elements=elements, texts=texts)
+
+	def _get_elements_token_budget(
+		self, state: BrowserState, result: list[ActionResult] | None, use_vision: bool, page_actions: str | None = None
+	) -> int:
+		"""Tokens left for the page elements of the next state message, after the history and the rest of the state message"""
+		budget = self.settings.max_input_tokens - self._get_input_tokens() - STATE_MESSAGE_TEMPLATE_TOKENS
+		budget -= self._count_text_tokens(f'{state.url}{state.tabs}{page_actions or ""}')
+		for r in result or []:
+			budget -= self._count_text_tokens(f'{r.extracted_content or ""}{r.error or ""}')
+		if use_vision and state.screenshot:
+			budget -= self._count_image_tokens(f'data:image/png;base64,{state.screenshot}')
+		return max(budget, 0)
+
+	def _get_input_tokens(self) -> int:
+		"""Input tokens of the current messages, including what the provider counts on top of them"""
+		return self.state.history.current_tokens + self.state.history.overhead_tokens
+
+	async def aload_tokenizer(self) -> None:
+		"""Loads the tokenizer without blocking the event loop, and counts the messages estimated until then again"""
+		await self.tokenizer.aload()
+		for m in self.state.history.messages:
+			m.metadata.tokens = self._count_tokens(m.message)
+		self.state.history.current_tokens = sum(m.metadata.tokens for m in self.state.history.messages)
+
+	def reconcile_input_tokens(self, input_tokens: int) -> None:
+		"""
+		Takes the input tokens the provider reported for the current messages into account:
+		the difference to the local count is kept as overhead for the following budgets.
+		"""
+		overhead = input_tokens - self.state.history.current_tokens
+		if overhead != self.state.history.overhead_tokens:
+			logger.debug(
+				f'Provider counted {input_tokens} input tokens, {self.state.history.current_tokens} counted locally - overhead {overhead}'
+			)
+		self.state.history.overhead_tokens = overhead
+
+	@time_execution_sync('--compact_history')
+	def compact_history(self) -> None:
+		"""
+		Folds the steps before the last history_keep_steps into the running summary once history_fold_steps of them
+		piled up, and more of them (down to the last step) while the history is above the token target. If it still is,
+		the oldest steps are left out of the summary.
+		"""
+		steps = self._get_history_steps()
+		target = self.settings.history_token_target or self.settings.max_input_tokens // 2
+		keep = max(self.settings.history_keep_steps, 1)
+		# NOTE: Each fold changes the summary and every message after it, which misses the prompt cache of the provider.
+		#       Folding in batches keeps the history unchanged in between.
+		fold = len(steps) - keep if len(steps) >= keep + max(self.settings.history_fold_steps, 1) else 0
+		folded_tokens = sum(m.metadata.tokens for step in steps[:fold] for m in step)
+		while fold < len(steps) - 1 and self._get_input_tokens() - folded_tokens > target:
+			folded_tokens += sum(m.metadata.tokens for m in steps[fold])
+			fold += 1
+
+		summary = self.state.history_summary
+		for step in steps[:fold]:
+			summary.steps.append(self._fold_step(step, summary))
+		summary.folded_steps += fold
+
+		if fold:
+			folded_messages = {id(m) for step in steps[:fold] for m in step}
+			self.state.history.messages = [m for m in self.state.history.messages if id(m) not in folded_messages]
+			self.state.history.current_tokens -= folded_tokens
+			self._set_history_summary_message()
+
+		while summary.steps and (
+			self._get_history_summary_tokens() > self.settings.history_summary_max_tokens or self._get_input_tokens() > target
+		):
+			summary.steps.pop(0)
+			summary.omitted_steps += 1
+			self._set_history_summary_message()
+
+		if fold:
+			logger.debug(
+				f'Folded {fold} steps into the history summary - total tokens now: {self.state.history.current_tokens}/{target}'
+			)
+
+	async def acompact_history(self, llm: BaseChatModel) -> None:
+		"""
+		Like compact_history, and once history_summary_min_steps steps were folded, lets the LLM merge them into the summary text.
+		The folded steps are kept as they are if that fails.
+		"""
+		self.compact_history()
+		summary = self.state.history_summary
+		if not summary.steps or len(summary.steps) < self.settings.history_summary_min_steps:
+			return
+
+		max_tokens = self.settings.history_summary_max_tokens
+		try:
+			response = await llm.ainvoke(
+				[
+					SystemMessage(content=HISTORY_SUMMARY_PROMPT.format(max_tokens=max_tokens)),
+					HumanMessage(content=self._render_history_summary()),
+				]
+			)
+			text = self._message_text(response).strip()
+		except Exception as e:
+			logger.warning(f'⚠️ Could not summarize the history with the LLM, keeping the folded steps: {e}')
+			return
+		if not text:
+			return
+
+		tokens = self._count_text_tokens(text)
+		if tokens > max_tokens:
+			text = text[: len(text) * max_tokens // tokens]
+		summary.text = text
+		summary.summarized_steps = summary.folded_steps
+		summary.omitted_steps = 0
+		summary.steps = []
+		self._set_history_summary_message()
+
+	def _get_history_steps(self) -> list[list[ManagedMessage]]:
+		"""The messages of each step in the history: the model output, its tool response, the action results and plans"""
+		steps: list[list[ManagedMessage]] = []
+		# superseded full states before the first step are folded with it
+		leading: list[ManagedMessage] = []
+		for m in self.state.history.messages:
+			if m.metadata.message_type == SUPERSEDED_STATE_BASE:
+				(steps[-1] if steps else leading).append(m)
+			elif m.metadata.message_type is not None:
+				continue
+			elif isinstance(m.message, AIMessage) and m.message.tool_calls:
+				steps.append([*leading, m])
+				leading = []
+			elif steps:
+				steps[-1].append(m)
+		return steps
+
+	def _fold_step(self, step: list[ManagedMessage], summary: HistorySummary) -> FoldedStep:
+		folded = FoldedStep()
+		for m in step:
+			if m.metadata.message_type == SUPERSEDED_STATE_BASE:
+				continue
+			message = m.message
+			if isinstance(message, AIMessage) and message.tool_calls:
+				output = message.tool_calls[0]['args']
+				current_state = output.get('current_state', {})
+				folded.goal = current_state.get('next_goal', '')
+				summary.memory = current_state.get('memory', '') or summary.memory
+				for action in output.get('action', []):
+					for name, params in action.items():
+						params = json.dumps(params, ensure_ascii=False) if params else ''
+						folded.actions.append(f'{name}({params[:MAX_FOLDED_ACTION_CHARACTERS]})')
+			elif isinstance(message, HumanMessage):
+				# plans and tool responses are outdated once the step is folded, the action results are kept
+				if text := self._message_text(message):
+					folded.outcomes.append(text[:MAX_FOLDED_OUTCOME_CHARACTERS])
+		return folded
+
+	def _render_history_summary(self) -> str:
+		summary = self.state.history_summary
+		if not summary.folded_steps:
+			return ''
+		lines = [f'[Summary of steps 1-{summary.folded_steps} of the task history, the later steps follow in full]']
+		if summary.text:
+			lines.append(summary.text)
+		if summary.omitted_steps:
+			first = summary.summarized_steps + 1
+			lines.append(f'Steps {first}-{first + summary.omitted_steps - 1} were left out.')
+		first = summary.summarized_steps + summary.omitted_steps + 1
+		for i, step in enumerate(summary.steps):
+			lines.append(f'Step {first + i}: {step.goal}')
+			if step.actions:
+				lines.append(f'  Actions: {"; ".join(step.actions)}')
+			for outcome in step.outcomes:
+				lines.append(f'  {outcome}')
+		if summary.memory:
+			lines.append(f'Memory after step {summary.folded_steps}: {summary.memory}')
+		return '\n'.join(lines)
+
+	def _set_history_summary_message(self) -> None:
+		"""Puts the rendered summary in place of the old one, or before the first step of the history"""
+		messages = self.state.history.messages
+		position = next((i for i, m in enumerate(messages) if m.metadata.message_type == 'history_summary'), None)
+		if position is None:
+			steps = self._get_history_steps()
+			position = messages.index(steps[0][0]) if steps else len(messages)
+		self.state.history.remove_messages_by_type('history_summary')
+		if text := self._render_history_summary():
+			self._add_message_with_tokens(HumanMessage(content=text), position, message_type='history_summary')
+
+	def _get_history_summary_tokens(self) -> int:
+		return sum(m.metadata.tokens for m in self.state.history.messages if m.metadata.message_type == 'history_summary')
 
 	def add_model_output(self, model_output: AgentOutput) -> None:
 		"""Add model output as AI message"""
@@ -192,8 +524,38 @@ class MessageManager:
 			logger.debug(f'{m.message.__class__.__name__} - Token count: {m.metadata.tokens}')
 		logger.debug(f'Total input tokens: {total_input_tokens}')
 
+		if self.settings.prompt_cache_markers:
+			msg = self._add_prompt_cache_markers(msg)
+
 		return msg
 
+	def _add_prompt_cache_markers(self, messages: list[BaseMessage]) -> list[BaseMessage]:
+		"""
+		Marks the system message and the last message before the state message as cache breakpoints.
+		Everything up to there is the same as in the previous step, only the state message at the end changes.
+		"""
+		marked = list(messages)
+		breakpoints = [0]
+		for i in range(len(marked) - 2, 0, -1):
+			# empty messages (tool responses) can't carry a marker
+			if self._message_text(marked[i]):
+				breakpoints.append(i)
+				break
+
+		for i in breakpoints:
+			message = marked[i]
+			content = message.content if isinstance(message.content, list) else [{'type': 'text', 'text': message.content}]
+			content = [dict(block) if isinstance(block, dict) else {'type': 'text', 'text': block} for block in content]
+			content[-1]['cache_control'] = {'type': 'ephemeral'}
+			marked[i] = message.model_copy(update={'content': content})
+		return marked
+
+	@staticmethod
+	def _message_text(message: BaseMessage) -> str:
+		if isinstance(message.content, str):
+			return message.content
+		return ''.join(block.get('text', '') if isinstance(block, dict) else block for block in message.content)
+
 	def _add_message_with_tokens(
 		self, message: BaseMessage, position: int | None = None, message_type: str | None = None
 	) -> None:
@@ -201,13 +563,17 @@ class MessageManager:
 		position: None for last, -1 for second last, etc.
 		"""
 
+		managed_message = self._get_managed_message(message, message_type)
+		self.state.history.add_message(managed_message.message, managed_message.metadata, position)
+
+	def _get_managed_message(self, message: BaseMessage, message_type: str | None = None) -> ManagedMessage:
+		"""The message with sensitive data filtered out and its token count"""
 		# filter out sensitive data from the message
 		if self.settings.sensitive_data:
 			message = self._filter_sensitive_data(message)
 
 		token_count = self._count_tokens(message)
-		metadata = MessageMetadata(tokens=token_count, message_type=message_type)
-		self.state.history.add_message(message, metadata, position)
+		return ManagedMessage(message=message, metadata=MessageMetadata(tokens=token_count, message_type=message_type))
 
 	@time_execution_sync('--filter_sensitive_data')
 	def _filter_sensitive_data(self, message: BaseMessage) -> BaseMessage:
@@ -246,7 +612,7 @@ class MessageManager:
 		if isinstance(message.content, list):
 			for item in message.content:
 				if 'image_url' in item:
-					tokens += self.settings.image_tokens
+					tokens += self._count_image_tokens(item['image_url']['url'])  # type: ignore
 				elif isinstance(item, dict) and 'text' in item:
 					tokens += self._count_text_tokens(item['text'])
 		else:
@@ -258,12 +624,17 @@ class MessageManager:
 
 	def _count_text_tokens(self, text: str) -> int:
 		"""Count tokens in a text string"""
-		tokens = len(text) // self.settings.estimated_characters_per_token  # Rough estimate if no tokenizer available
-		return tokens
+		return self.tokenizer.count_text_tokens(text)
+
+	def _count_image_tokens(self, image_url: str) -> int:
+		size = get_image_size(image_url)
+		if size is None:
+			return self.settings.image_tokens
+		return self.tokenizer.count_image_tokens(*size)
 
 	def cut_messages(self):
 		"""Get current message list, potentially trimmed to max tokens"""
-		diff = self.state.history.current_tokens - self.settings.max_input_tokens
+		diff = self._get_input_tokens() - self.settings.max_input_tokens
 		if diff <= 0:
 			return None
 
@@ -275,11 +646,12 @@ class MessageManager:
 			for item in msg.message.content:
 				if 'image_url' in item:
 					msg.message.content.remove(item)
-					diff -= self.settings.image_tokens
-					msg.metadata.tokens -= self.settings.image_tokens
-					self.state.history.current_tokens -= self.settings.image_tokens
+					image_tokens = self._count_image_tokens(item['image_url']['url'])  # type: ignore
+					diff -= image_tokens
+					msg.metadata.tokens -= image_tokens
+					self.state.history.current_tokens -= image_tokens
 					logger.debug(
-						f'Removed image with {self.settings.image_tokens} tokens - total tokens now: {self.state.history.current_tokens}/{self.settings.max_input_tokens}'
+						f'Removed image with {image_tokens} tokens - total tokens now: {self.state.history.current_tokens}/{self.settings.max_input_tokens}'
 					)
 				elif 'text' in item and isinstance(item, dict):
 					text += item['text']
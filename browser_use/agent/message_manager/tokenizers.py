@@ -0,0 +1,175 @@
+"""
+Local token counting per model family, for keeping the messages within max_input_tokens.
+
+No tokenizer is exact for every provider (Anthropic and Google don't ship theirs), the per-model-family tokenizers
+are much closer than a character estimate though, and the message manager reconciles the remaining difference with
+the input tokens the provider reports.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import logging
+import math
+import struct
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+	from tiktoken import Encoding
+
+logger = logging.getLogger(__name__)
+
+
+class Tokenizer(ABC):
+	"""Counts the tokens of texts and images like a model family does, texts are memoized by content hash"""
+
+	def __init__(self, max_cached_texts: int = 4096):
+		self.max_cached_texts = max_cached_texts
+		self._cache: OrderedDict[bytes, int] = OrderedDict()
+
+	async def aload(self) -> None:
+		"""Loads what the counts need (e.g. an encoding to download) without blocking the event loop"""
+		pass
+
+	def count_text_tokens(self, text: str, cache: bool = True) -> int:
+		"""cache=False for texts that are only counted once, like the lines of a page state"""
+		if not text:
+			return 0
+		if not cache:
+			return self._count_text_tokens(text)
+		# the history is counted again and again (budgets, memory), the texts themselves don't need to be kept for that
+		key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+		tokens = self._cache.get(key)
+		if tokens is None:
+			tokens = self._count_text_tokens(text)
+			self._cache[key] = tokens
+			if len(self._cache) > self.max_cached_texts:
+				self._cache.popitem(last=False)
+		else:
+			self._cache.move_to_end(key)
+		return tokens
+
+	@abstractmethod
+	def _count_text_tokens(self, text: str) -> int:
+		pass
+
+	def count_image_tokens(self, width: int, height: int) -> int:
+		"""OpenAI high detail: fit into 2048x2048, scale the shortest side to 768, 170 tokens per 512px tile plus 85"""
+		scale = min(1.0, 2048 / max(width, height))
+		width, height = width * scale, height * scale
+		scale = min(1.0, 768 / min(width, height))
+		width, height = width * scale, height * scale
+		return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class CharacterEstimateTokenizer(Tokenizer):
+	"""Rough estimate for models without a known tokenizer"""
+
+	def __init__(self, characters_per_token: int = 3, max_cached_texts: int = 4096):
+		super().__init__(max_cached_texts)
+		self.characters_per_token = characters_per_token
+
+	def count_text_tokens(self, text: str, cache: bool = True) -> int:
+		# cheaper than hashing
+		return self._count_text_tokens(text)
+
+	def _count_text_tokens(self, text: str) -> int:
+		return len(text) // self.characters_per_token
+
+
+class TiktokenTokenizer(Tokenizer):
+	"""
+	Tokenizer of OpenAI models, and the closest local approximation for other families.
+	Counts with a character estimate until the encoding is loaded with load() or aload(), and if tiktoken or the
+	encoding is not available (the encodings are downloaded once).
+	"""
+
+	def __init__(self, encoding_name: str = 'o200k_base', max_cached_texts: int = 4096):
+		super().__init__(max_cached_texts)
+		self.encoding_name = encoding_name
+		self._encoding: Encoding | None = None
+		self._loaded = False
+		self._fallback = CharacterEstimateTokenizer()
+
+	def load(self) -> None:
+		"""Loads the encoding, the first load of an encoding in a process downloads it"""
+		if self._loaded:
+			return
+		self._encoding = _get_encoding(self.encoding_name)
+		self._loaded = True
+		# the texts counted so far were estimated
+		self._cache.clear()
+
+	async def aload(self) -> None:
+		if not self._loaded:
+			await asyncio.to_thread(self.load)
+
+	def _count_text_tokens(self, text: str) -> int:
+		if self._encoding is None:
+			return self._fallback.count_text_tokens(text)
+		return len(self._encoding.encode(text, disallowed_special=()))
+
+
+class AnthropicTokenizer(TiktokenTokenizer):
+	"""Claude models: images are resized to at most 1568px on the long edge and cost width * height / 750 tokens"""
+
+	def __init__(self, max_cached_texts: int = 4096):
+		super().__init__('cl100k_base', max_cached_texts)
+
+	def count_image_tokens(self, width: int, height: int) -> int:
+		scale = min(1.0, 1568 / max(width, height))
+		return math.ceil(width * scale * height * scale / 750)
+
+
+class GeminiTokenizer(TiktokenTokenizer):
+	"""Gemini models: images cost 258 tokens per 768x768 tile"""
+
+	def __init__(self, max_cached_texts: int = 4096):
+		super().__init__('cl100k_base', max_cached_texts)
+
+	def count_image_tokens(self, width: int, height: int) -> int:
+		return 258 * math.ceil(width / 768) * math.ceil(height / 768)
+
+
+@cache
+def _get_encoding(encoding_name: str) -> Encoding | None:
+	"""The tiktoken encoding, loaded once per process for all tokenizers, None if it is not available"""
+	try:
+		import tiktoken
+
+		return tiktoken.get_encoding(encoding_name)
+	except Exception as e:
+		logger.warning(f'⚠️ Could not load the {encoding_name} tokenizer, estimating tokens from characters: {e}')
+		return None
+
+
+def get_tokenizer(model_name: str | None, characters_per_token: int = 3) -> Tokenizer:
+	"""Tokenizer for the family of a model, by its name - it estimates the counts until it is loaded (see Tokenizer.aload)"""
+	name = (model_name or '').lower()
+	if any(family in name for family in ('gpt-4o', 'gpt-4.1', 'gpt-4.5')) or name.startswith(('o1', 'o3', 'o4')):
+		return TiktokenTokenizer('o200k_base')
+	if any(family in name for family in ('gpt-4', 'gpt-3.5')):
+		return TiktokenTokenizer('cl100k_base')
+	if 'claude' in name:
+		return AnthropicTokenizer()
+	if 'gemini' in name:
+		return GeminiTokenizer()
+	return CharacterEstimateTokenizer(characters_per_token)
+
+
+def get_image_size(image_url: str) -> tuple[int, int] | None:
+	"""Width and height of a base64 PNG data url (screenshots), from its header only"""
+	if not image_url.startswith('data:image/png;base64,'):
+		return None
+	try:
+		# signature (8 bytes), IHDR length and type (8 bytes), width and height (4 bytes each)
+		header = base64.b64decode(image_url[len('data:image/png;base64,') :][:32])
+		width, height = struct.unpack('>II', header[16:24])
+	except Exception:
+		return None
+	return width, height
@@ -51,6 +51,90 @@ def extract_json_from_model_output(content: str) -> dict:
 		raise ValueError('Could not parse response.')
 
 
+THINK_START_TAG = '<think>'
+THINK_END_TAG = '</think>'
+
+
+class ActionStreamParser:
+	"""
+	Scans the JSON output of the model while it is streamed in and hands out the current_state object and each object
+	of the action list as soon as it is complete, long before the whole output is.
+	"""
+
+	def __init__(self):
+		self.text = ''
+		self._position = 0
+		self._depth = 0
+		self._in_string = False
+		self._escaped = False
+		self._string_start = 0
+		self._last_string = ''
+		self._key: str | None = None  # key of the top-level value being scanned
+		self._value_start = 0
+
+	def feed(self, chunk: str) -> list[tuple[str, dict]]:
+		"""Add the next chunk of the output, returns the newly completed ('current_state' | 'action', object) pairs"""
+		self.text += chunk
+		completed = []
+
+		position = self._position
+		while position < len(self.text):
+			char = self.text[position]
+
+			if self._depth == 0:
+				# anything before the output object (code fences, a list around it, reasoning) is skipped
+				if char == '<':
+					tag = self.text[position : position + len(THINK_START_TAG)]
+					if tag != THINK_START_TAG and THINK_START_TAG.startswith(tag):
+						break  # wait for the rest of the tag
+					if tag == THINK_START_TAG:
+						# NOTE: Reasoning models can write JSON while thinking, it must not be taken for actions
+						end = self.text.find(THINK_END_TAG, position)
+						if end == -1:
+							break  # wait for the end of the reasoning
+						position = end + len(THINK_END_TAG)
+						continue
+				elif char == '{':
+					self._depth = 1
+				position += 1
+				continue
+
+			if self._in_string:
+				if self._escaped:
+					self._escaped = False
+				elif char == '\\':
+					self._escaped = True
+				elif char == '"':
+					self._in_string = False
+					self._last_string = self.text[self._string_start + 1 : position]
+			elif char == '"':
+				self._in_string = True
+				self._string_start = position
+			elif char in '{[':
+				self._depth += 1
+				if char == '{' and (
+					(self._depth == 2 and self._key == 'current_state') or (self._depth == 3 and self._key == 'action')
+				):
+					self._value_start = position
+			elif char in '}]':
+				self._depth -= 1
+				if char == '}' and (
+					(self._depth == 1 and self._key == 'current_state') or (self._depth == 2 and self._key == 'action')
+				):
+					try:
+						completed.append((self._key, json.loads(self.text[self._value_start : position + 1])))
+					except json.JSONDecodeError:
+						logger.debug(f'Failed to parse streamed {self._key}: {self.text[self._value_start : position + 1]}')
+			elif self._depth == 1 and char == ':':
+				self._key = self._last_string
+			elif self._depth == 1 and char == ',':
+				self._key = None
+			position += 1
+
+		self._position = position
+		return completed
+
+
 def convert_input_messages(input_messages: list[BaseMessage], model_name: str | None) -> list[BaseMessage]:
 	"""Convert input messages to a format that is compatible with the planner model"""
 	if model_name is None:
@@ -71,6 +71,9 @@ class MessageHistory(BaseModel):
 
 	messages: list[ManagedMessage] = Field(default_factory=list)
 	current_tokens: int = 0
+	# input tokens the provider counts on top of the messages (tool schemas, message framing, tokenizer differences),
+	# learned from the usage it reports
+	overhead_tokens: int = 0
 
 	model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -119,6 +122,12 @@ class MessageHistory(BaseModel):
 				self.messages.pop(i)
 				break
 
+	def remove_messages_by_type(self, message_type: str) -> None:
+		"""Remove all messages of a type from history"""
+		for msg in [m for m in self.messages if m.metadata.message_type == message_type]:
+			self.current_tokens -= msg.metadata.tokens
+			self.messages.remove(msg)
+
 	def remove_last_state_message(self) -> None:
 		"""Remove last state message from history"""
 		if len(self.messages) > 2 and isinstance(self.messages[-1].message, HumanMessage):
@@ -126,10 +135,55 @@ class MessageHistory(BaseModel):
 			self.messages.pop()
 
 
+class StateDeltaBase(BaseModel):
+	"""Page elements of the last full state message, the following state messages only list the changes against it"""
+
+	url: str
+	# element hash -> (highlight index, rendered line)
+	elements: dict[str, tuple[int, str]]
+	texts: list[str]
+	# state messages sent as delta against this base so far
+	state_messages: int = 0
+
+
+class RenderedStateMessage(BaseModel):
+	"""A state message rendered from the page state, not added to the history yet"""
+
+	message: ManagedMessage
+	# with state_delta: the base the message lists the changes against, None to send the full state
+	state_delta_base: StateDeltaBase | None = None
+	# new full state message to keep in history as the base
+	state_base_message: ManagedMessage | None = None
+
+
+class FoldedStep(BaseModel):
+	"""A step folded out of the history into the running summary"""
+
+	goal: str = ''
+	actions: list[str] = Field(default_factory=list)
+	outcomes: list[str] = Field(default_factory=list)
+
+
+class HistorySummary(BaseModel):
+	"""Running summary of the steps folded out of the history, from the oldest to the newest"""
+
+	folded_steps: int = 0
+	# the first steps, summarized by the LLM in text
+	summarized_steps: int = 0
+	text: str = ''
+	# the steps after those that were left out to keep the summary within its budget
+	omitted_steps: int = 0
+	steps: list[FoldedStep] = Field(default_factory=list)
+	# memory of the agent at the last folded step
+	memory: str = ''
+
+
 class MessageManagerState(BaseModel):
 	"""Holds the state for MessageManager"""
 
 	history: MessageHistory = Field(default_factory=MessageHistory)
 	tool_id: int = 1
+	state_delta_base: StateDeltaBase | None = None
+	history_summary: HistorySummary = Field(default_factory=HistorySummary)
 
 	model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -1,12 +1,17 @@
 import importlib.resources
+from collections.abc import Callable
 from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from browser_use.dom.clickable_element_processor.service import ClickableElementProcessor
+
 if TYPE_CHECKING:
+	from browser_use.agent.message_manager.views import StateDeltaBase
 	from browser_use.agent.views import ActionResult, AgentStepInfo
 	from browser_use.browser.views import BrowserState
+	from browser_use.dom.views import DOMBaseNode
 
 
 class SystemPrompt:
@@ -66,18 +71,51 @@ class AgentMessagePrompt:
 		result: list['ActionResult'] | None = None,
 		include_attributes: list[str] | None = None,
 		step_info: Optional['AgentStepInfo'] = None,
+		elements_token_budget: int | None = None,
+		count_tokens: Callable[[str], int] | None = None,
+		compact_repeated_elements: int | None = None,
+		state_delta_base: Optional['StateDeltaBase'] = None,
+		page_actions: str | None = None,
 	):
 		self.state = state
 		self.result = result
 		self.include_attributes = include_attributes or []
 		self.step_info = step_info
-
-	def get_user_message(self, use_vision: bool = True) -> HumanMessage:
-		elements_text = self.state.element_tree.clickable_elements_to_string(include_attributes=self.include_attributes)
-
+		self.elements_token_budget = elements_token_budget
+		# counts the tokens of the element lines for the budget, with the tokenizer of the model
+		self.count_tokens = count_tokens
+		self.compact_repeated_elements = compact_repeated_elements
+		# if set, only the changes of the page elements against this base are listed
+		self.state_delta_base = state_delta_base
+		# descriptions of the actions only available on the current page
+		self.page_actions = page_actions
+
+	def get_elements_text(self, left_out: list['DOMBaseNode'] | None = None) -> str:
+		"""
+		Full list of the page elements, with hints about the content above and below the viewport.
+		left_out collects the element and text nodes the token budget left out.
+		"""
+		elements_text = self.state.element_tree.clickable_elements_to_string(
+			include_attributes=self.include_attributes,
+			token_budget=self.elements_token_budget,
+			count_tokens=self.count_tokens,
+			compact_repeated_elements=self.compact_repeated_elements,
+			left_out=left_out,
+		)
+
+		return self._add_page_hints(elements_text)
+
+	def _add_page_hints(self, elements_text: str) -> str:
+		"""Adds the hints about the content above and below the viewport, and about a partial extraction"""
 		has_content_above = (self.state.pixels_above or 0) > 0
 		has_content_below = (self.state.pixels_below or 0) > 0
 
+		if self.state.truncation is not None:
+			elements_text = (
+				f'{elements_text}\n... page too large, only partially extracted ({self.state.truncation.skipped_subtrees} parts '
+				'furthest from the viewport left out) - scroll or extract content to see more ...'
+			).strip()
+
 		if elements_text != '':
 			if has_content_above:
 				elements_text = (
@@ -93,6 +131,54 @@ class AgentMessagePrompt:
 				elements_text = f'{elements_text}\n[End of page]'
 		else:
 			elements_text = 'empty page'
+		return elements_text
+
+	def get_state_lines(self) -> tuple[dict[str, tuple[int, str]], list[str]]:
+		"""Index and line of every interactive element by element hash, and the texts between them"""
+		elements = {
+			ClickableElementProcessor.hash_dom_element(element): (
+				index,
+				element.format_line(include_attributes=self.include_attributes, mark_new=False),
+			)
+			for index, element in self.state.selector_map.items()
+		}
+		return elements, self.state.element_tree.get_visible_texts()
+
+	def get_state_delta(self, base: 'StateDeltaBase') -> tuple[str, int]:
+		"""Lists the page elements added, removed or changed since the base, returns the text and the number of changes"""
+		elements, texts = self.get_state_lines()
+
+		changed = []
+		for element_hash, (index, line) in elements.items():
+			base_element = base.elements.get(element_hash)
+			if base_element is None:
+				changed.append(line)
+			elif base_element[1] != line:
+				# the index is part of the line, an element whose index moved is listed with its new index
+				changed.append(line if base_element[0] == index else f'{line} (was [{base_element[0]}])')
+		removed = sorted(index for element_hash, (index, _) in base.elements.items() if element_hash not in elements)
+		base_texts = set(base.texts)
+		new_texts = [text for text in texts if text not in base_texts]
+
+		if not (changed or removed or new_texts):
+			return 'No changes since the full page state above.', 0
+
+		lines = ['Changes since the full page state above (elements not listed are unchanged and keep their index):']
+		if removed:
+			lines.append(f'No longer on the page: {", ".join(f"[{index}]" for index in removed)}')
+		if changed:
+			lines.append('New or changed elements:')
+			lines.extend(changed)
+		if new_texts:
+			lines.append('New text:')
+			lines.extend(new_texts)
+		return '\n'.join(lines), len(changed) + len(removed) + len(new_texts)
+
+	def get_user_message(self, use_vision: bool = True) -> HumanMessage:
+		if self.state_delta_base is not None:
+			elements_text = self._add_page_hints(self.get_state_delta(self.state_delta_base)[0])
+		else:
+			elements_text = self.get_elements_text()
 
 		if self.step_info:
 			step_info_description = f'Current step: {self.step_info.step_number + 1}/{self.step_info.max_steps}'
@@ -113,6 +199,9 @@ Interactive elements from top layer of the current page inside the viewport:
 {step_info_description}
 """
 
+		if self.page_actions:
+			state_description += f'\nFor this page, these additional actions are available:\n{self.page_actions}\n'
+
 		if self.result:
 			for i, result in enumerate(self.result):
 				if result.extracted_content:
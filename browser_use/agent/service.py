@@ -7,9 +7,9 @@ import os
 import re
 import sys
 import time
-from collections.abc import Awaitable, Callable
+from collections.abc import AsyncIterator, Awaitable, Callable
 from pathlib import Path
-from typing import Any, Generic, TypeVar
+from typing import Any, Generic, TypeVar, get_args
 
 from dotenv import load_dotenv
 from langchain_core.language_models.chat_models import BaseChatModel
@@ -18,15 +18,21 @@ from langchain_core.messages import (
 	HumanMessage,
 	SystemMessage,
 )
+from langchain_core.messages.ai import UsageMetadata, add_usage
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
 
 # from lmnr.sdk.decorators import observe
 from pydantic import BaseModel, ValidationError
 
 from browser_use.agent.gif import create_history_gif
+from browser_use.agent.llm_cache import LLMResponseCache
 from browser_use.agent.memory.service import Memory
 from browser_use.agent.memory.views import MemoryConfig
 from browser_use.agent.message_manager.service import MessageManager, MessageManagerSettings
+from browser_use.agent.message_manager.tokenizers import Tokenizer, get_tokenizer
 from browser_use.agent.message_manager.utils import (
+	ActionStreamParser,
 	convert_input_messages,
 	extract_json_from_model_output,
 	is_model_without_tool_support,
@@ -66,6 +72,8 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 SKIP_LLM_API_KEY_VERIFICATION = os.environ.get('SKIP_LLM_API_KEY_VERIFICATION', 'false').lower()[0] in 'ty1'
+# A plan made in the background is dropped once more than this share of the page elements changed since
+STALE_PLAN_CHANGE_RATIO = 0.5
 
 
 def log_response(response: AgentOutput) -> None:
@@ -141,11 +149,24 @@ class Agent(Generic[Context]):
 			'aria-expanded',
 			'data-date-format',
 		],
+		compact_repeated_elements: int | None = None,
+		state_delta: bool = False,
 		max_actions_per_step: int = 10,
+		pipeline_steps: bool = False,
+		stream_actions: bool = False,
+		prompt_cache_markers: bool = False,
+		history_compaction: bool = False,
+		history_keep_steps: int = 5,
+		history_fold_steps: int = 5,
+		history_token_target: int | None = None,
+		history_summary_llm: BaseChatModel | None = None,
+		history_summary_max_tokens: int = 2000,
+		history_summary_min_steps: int = 5,
 		tool_calling_method: ToolCallingMethod | None = 'auto',
 		page_extraction_llm: BaseChatModel | None = None,
 		planner_llm: BaseChatModel | None = None,
 		planner_interval: int = 1,  # Run planner every N steps
+		async_planner: bool = False,
 		is_planner_reasoning: bool = False,
 		extend_planner_system_message: str | None = None,
 		injected_agent_state: AgentState | None = None,
@@ -153,6 +174,8 @@ class Agent(Generic[Context]):
 		save_playwright_script_path: str | None = None,
 		enable_memory: bool = True,
 		memory_config: MemoryConfig | None = None,
+		llm_cache: LLMResponseCache | None = None,
+		tokenizer: Tokenizer | None = None,
 		source: str | None = None,
 	):
 		if page_extraction_llm is None:
@@ -179,11 +202,24 @@ class Agent(Generic[Context]):
 			generate_gif=generate_gif,
 			available_file_paths=available_file_paths,
 			include_attributes=include_attributes,
+			compact_repeated_elements=compact_repeated_elements,
+			state_delta=state_delta,
 			max_actions_per_step=max_actions_per_step,
+			pipeline_steps=pipeline_steps,
+			stream_actions=stream_actions,
+			prompt_cache_markers=prompt_cache_markers,
+			history_compaction=history_compaction,
+			history_keep_steps=history_keep_steps,
+			history_fold_steps=history_fold_steps,
+			history_token_target=history_token_target,
+			history_summary_llm=history_summary_llm,
+			history_summary_max_tokens=history_summary_max_tokens,
+			history_summary_min_steps=history_summary_min_steps,
 			tool_calling_method=tool_calling_method,
 			page_extraction_llm=page_extraction_llm,
 			planner_llm=planner_llm,
 			planner_interval=planner_interval,
+			async_planner=async_planner,
 			is_planner_reasoning=is_planner_reasoning,
 			save_playwright_script_path=save_playwright_script_path,
 			extend_planner_system_message=extend_planner_system_message,
@@ -195,6 +231,17 @@ class Agent(Generic[Context]):
 
 		# Initialize state
 		self.state = injected_agent_state or AgentState()
+		# state for the next step, captured while the current one finishes up (pipeline_steps)
+		self._next_state: asyncio.Task[BrowserState] | None = None
+		# token usage of the last LLM call for the next action, as reported by the provider
+		self._last_usage: UsageMetadata | None = None
+		# plan being made in the background (async_planner), and the url and elements of the page state it is made for
+		self._planning: asyncio.Task[str | None] | None = None
+		self._planning_fingerprint: tuple[str, frozenset[str]] | None = None
+
+		# output models and LLMs bound to them, by action model - pages with the same actions reuse them
+		self._agent_output_models: dict[type[ActionModel], type[AgentOutput]] = {}
+		self._structured_llms: dict[tuple[type[AgentOutput], str | None], Runnable] = {}
 
 		# Action setup
 		self._setup_action_models()
@@ -234,8 +281,22 @@ class Agent(Generic[Context]):
 			f'extraction_model={getattr(self.settings.page_extraction_llm, "model_name", None)} '
 		)
 
-		# Verify we can connect to the LLM
-		self._verify_llm_connection()
+		# Verify we can connect to the LLM, a replayed run only answers from the cache and needs no connection
+		if llm_cache is None or llm_cache.mode != 'replay':
+			self._verify_llm_connection()
+
+		if llm_cache is not None:
+			# bound on copies, the models passed in are not cached for other agents using them
+			cached_models = {
+				id(model): model.model_copy(update={'cache': llm_cache})
+				for model in (self.llm, self.settings.page_extraction_llm, self.settings.planner_llm)
+				if model is not None
+			}
+			self.llm = cached_models[id(self.llm)]
+			if self.settings.page_extraction_llm is not None:
+				self.settings.page_extraction_llm = cached_models[id(self.settings.page_extraction_llm)]
+			if self.settings.planner_llm is not None:
+				self.settings.planner_llm = cached_models[id(self.settings.planner_llm)]
 
 		# Initialize available actions for system prompt (only non-filtered actions)
 		# These will be used for the system prompt to maintain caching
@@ -256,11 +317,21 @@ class Agent(Generic[Context]):
 			settings=MessageManagerSettings(
 				max_input_tokens=self.settings.max_input_tokens,
 				include_attributes=self.settings.include_attributes,
+				compact_repeated_elements=self.settings.compact_repeated_elements,
+				state_delta=self.settings.state_delta,
 				message_context=self.settings.message_context,
+				prompt_cache_markers=self.settings.prompt_cache_markers,
+				history_compaction=self.settings.history_compaction,
+				history_keep_steps=self.settings.history_keep_steps,
+				history_fold_steps=self.settings.history_fold_steps,
+				history_token_target=self.settings.history_token_target,
+				history_summary_max_tokens=self.settings.history_summary_max_tokens,
+				history_summary_min_steps=self.settings.history_summary_min_steps,
 				sensitive_data=sensitive_data,
 				available_file_paths=self.settings.available_file_paths,
 			),
 			state=self.state.message_manager_state,
+			tokenizer=tokenizer or get_tokenizer(self.model_name),
 		)
 
 		if self.enable_memory:
@@ -388,11 +459,29 @@ class Agent(Generic[Context]):
 		# Initially only include actions with no filters
 		self.ActionModel = self.controller.registry.create_action_model()
 		# Create output model with the dynamic actions
-		self.AgentOutput = AgentOutput.type_with_custom_actions(self.ActionModel)
+		self.AgentOutput = self._get_agent_output_model(self.ActionModel)
 
 		# used to force the done action when max_steps is reached
 		self.DoneActionModel = self.controller.registry.create_action_model(include_actions=['done'])
-		self.DoneAgentOutput = AgentOutput.type_with_custom_actions(self.DoneActionModel)
+		self.DoneAgentOutput = self._get_agent_output_model(self.DoneActionModel)
+
+	def _get_agent_output_model(self, action_model: type[ActionModel]) -> type[AgentOutput]:
+		if action_model not in self._agent_output_models:
+			self._agent_output_models[action_model] = AgentOutput.type_with_custom_actions(action_model)
+		return self._agent_output_models[action_model]
+
+	def _get_structured_llm(self, method: str | None) -> Runnable:
+		"""The LLM with the output model of the current actions, built once per action set and method"""
+		key = (self.AgentOutput, method)
+		if key not in self._structured_llms:
+			if method is None:
+				self._structured_llms[key] = self.llm.with_structured_output(self.AgentOutput, include_raw=True)
+			elif method == 'stream':
+				tool_name = convert_to_openai_tool(self.AgentOutput)['function']['name']
+				self._structured_llms[key] = self.llm.bind_tools([self.AgentOutput], tool_choice=tool_name)
+			else:
+				self._structured_llms[key] = self.llm.with_structured_output(self.AgentOutput, include_raw=True, method=method)
+		return self._structured_llms[key]
 
 	def _set_tool_calling_method(self) -> ToolCallingMethod | None:
 		tool_calling_method = self.settings.tool_calling_method
@@ -440,49 +529,51 @@ class Agent(Generic[Context]):
 		result: list[ActionResult] = []
 		step_start_time = time.time()
 		tokens = 0
+		acting: asyncio.Task[list[ActionResult]] | None = None
+		# results of the streamed actions as they complete, kept if the step fails while they run
+		acted: list[ActionResult] = []
+		self._last_usage = None
 
 		try:
-			state = await self.browser_context.get_state(cache_clickable_elements_hashes=True)
+			state = await self._get_step_state()
 			current_page = await self.browser_context.get_current_page()
 
-			# generate procedural memory if needed
-			if self.enable_memory and self.memory and self.state.n_steps % self.memory.config.memory_interval == 0:
-				self.memory.create_procedural_memory(self.state.n_steps)
+			# generate procedural memory if needed, in the background - it replaces the history once it is done
+			if self.enable_memory and self.memory:
+				self.memory.apply_procedural_memory()
+				if self.state.n_steps % self.memory.config.memory_interval == 0:
+					self.memory.start_procedural_memory(self.state.n_steps)
 
 			await self._raise_if_stopped_or_paused()
 
 			# Update action models with page-specific actions
 			await self._update_action_models_for_page(current_page)
 
-			# Get page-specific filtered actions
+			# Get page-specific filtered actions, they are only part of the state message of this step. The system prompt,
+			# context and history stay byte-identical from step to step, so providers can serve them from their prompt cache.
 			page_filtered_actions = self.controller.registry.get_prompt_description(current_page)
 
-			# If there are page-specific actions, add them as a special message for this step only
-			if page_filtered_actions:
-				page_action_message = f'For this page, these additional actions are available:\n{page_filtered_actions}'
-				self._message_manager._add_message_with_tokens(HumanMessage(content=page_action_message))
-
-			# If using raw tool calling method, we need to update the message context with new actions
-			if self.tool_calling_method == 'raw':
-				# For raw tool calling, get all non-filtered actions plus the page-filtered ones
-				all_unfiltered_actions = self.controller.registry.get_prompt_description()
-				all_actions = all_unfiltered_actions
-				if page_filtered_actions:
-					all_actions += '\n' + page_filtered_actions
-
-				context_lines = (self._message_manager.settings.message_context or '').split('\n')
-				non_action_lines = [line for line in context_lines if not line.startswith('Available actions:')]
-				updated_context = '\n'.join(non_action_lines)
-				if updated_context:
-					updated_context += f'\n\nAvailable actions: {all_actions}'
-				else:
-					updated_context = f'Available actions: {all_actions}'
-				self._message_manager.settings.message_context = updated_context
+			if self.settings.history_compaction and self.settings.history_summary_llm:
+				# the deterministic compaction of add_state_message has nothing left to do afterwards
+				await self._message_manager.acompact_history(self.settings.history_summary_llm)
 
-			self._message_manager.add_state_message(state, self.state.last_result, step_info, self.settings.use_vision)
+			if self.browser_context.config.dom_processing_executor == 'event_loop':
+				self._message_manager.add_state_message(
+					state, self.state.last_result, step_info, self.settings.use_vision, page_filtered_actions
+				)
+			else:
+				# rendering the page state and filtering sensitive data is pure CPU work, keep the event loop free in the meantime
+				await self._message_manager.aadd_state_message(
+					state, self.state.last_result, step_info, self.settings.use_vision, page_filtered_actions
+				)
 
 			# Run planner at specified intervals if planner is configured
-			if self.settings.planner_llm and self.state.n_steps % self.settings.planner_interval == 0:
+			if self.settings.planner_llm and self.settings.async_planner:
+				# the plan made while the last actions ran, the next one is made while this step runs - never waited for
+				self._add_finished_plan(state)
+				if self.state.n_steps % self.settings.planner_interval == 0:
+					await self._start_planner(state)
+			elif self.settings.planner_llm and self.state.n_steps % self.settings.planner_interval == 0:
 				plan = await self._run_planner()
 				# add plan before last state message
 				self._message_manager.add_plan(plan, position=-1)
@@ -501,7 +592,16 @@ class Agent(Generic[Context]):
 			tokens = self._message_manager.state.history.current_tokens
 
 			try:
-				model_output = await self.get_next_action(input_messages)
+				if self._can_stream_actions():
+					# the actions run as soon as they are streamed in, while the LLM is still writing the next ones
+					streamed_actions: asyncio.Queue[ActionModel | None] = asyncio.Queue()
+					acting = asyncio.create_task(self.multi_act(self._iterate_streamed_actions(streamed_actions), results=acted))
+					model_output = await self.stream_next_action(input_messages, streamed_actions)
+				else:
+					model_output = await self.get_next_action(input_messages)
+				if self._last_usage:
+					# learn what the provider counts on top of the local count, for the budgets of the next steps
+					self._message_manager.reconcile_input_tokens(self._last_usage['input_tokens'])
 				if (
 					not model_output.action
 					or not isinstance(model_output.action, list)
@@ -549,40 +649,51 @@ class Agent(Generic[Context]):
 			except asyncio.CancelledError:
 				# Task was cancelled due to Ctrl+C
 				self._message_manager._remove_last_state_message()
+				result = await self._cancel_acting(acting, acted)
 				raise InterruptedError('Model query cancelled by user')
 			except InterruptedError:
 				# Agent was paused during get_next_action
 				self._message_manager._remove_last_state_message()
+				result = await self._cancel_acting(acting, acted)
 				raise  # Re-raise to be caught by the outer try/except
 			except Exception as e:
 				# model call failed, remove last state message from history
 				self._message_manager._remove_last_state_message()
+				result = await self._cancel_acting(acting, acted)
 				raise e
 
-			result: list[ActionResult] = await self.multi_act(model_output.action)
+			result: list[ActionResult] = await acting if acting is not None else []
+			if not result:
+				# not streamed, or nothing was streamed and the actions come from the retry
+				result = await self.multi_act(model_output.action)
 
 			self.state.last_result = result
 
 			if len(result) > 0 and result[-1].is_done:
 				logger.info(f'📄 Result: {result[-1].extracted_content}')
+			elif self.settings.pipeline_steps and not (step_info and step_info.is_last_step()):
+				# the actions are done, capture the next state while this step is recorded and the hooks run
+				self._next_state = asyncio.create_task(self.browser_context.get_state(cache_clickable_elements_hashes=True))
 
 			self.state.consecutive_failures = 0
 
 		except InterruptedError:
 			# logger.debug('Agent paused')
 			self.state.last_result = [
+				*result,
 				ActionResult(
 					error='The agent was paused mid-step - the last action might need to be repeated', include_in_memory=False
-				)
+				),
 			]
 			return
 		except asyncio.CancelledError:
 			# Directly handle the case where the step is cancelled at a higher level
 			# logger.debug('Task cancelled - agent was paused with Ctrl+C')
-			self.state.last_result = [ActionResult(error='The agent was paused with Ctrl+C', include_in_memory=False)]
+			self.state.last_result = [*result, ActionResult(error='The agent was paused with Ctrl+C', include_in_memory=False)]
 			raise InterruptedError('Step cancelled by user')
 		except Exception as e:
-			result = await self._handle_step_error(e)
+			# the streamed actions that already ran stay in the history, before the error
+			result = [*result, *await self._handle_step_error(e)]
 			self.state.last_result = result
 
 		finally:
@@ -591,14 +702,42 @@ class Agent(Generic[Context]):
 				return
 
 			if state:
+				cached_input_tokens, uncached_input_tokens = self._get_prompt_cache_usage()
 				metadata = StepMetadata(
 					step_number=self.state.n_steps,
 					step_start_time=step_start_time,
 					step_end_time=step_end_time,
 					input_tokens=tokens,
+					cached_input_tokens=cached_input_tokens,
+					uncached_input_tokens=uncached_input_tokens,
 				)
 				self._make_history_item(model_output, state, result, metadata)
 
+	def _get_prompt_cache_usage(self) -> tuple[int | None, int | None]:
+		"""Input tokens of the last LLM call that were / were not read from the prompt cache of the provider"""
+		if not self._last_usage:
+			return None, None
+		cached = self._last_usage.get('input_token_details', {}).get('cache_read', 0)
+		uncached = self._last_usage['input_tokens'] - cached
+		logger.debug(f'💾 {cached}/{cached + uncached} input tokens read from the prompt cache')
+		return cached, uncached
+
+	async def _get_step_state(self) -> BrowserState:
+		next_state, self._next_state = self._next_state, None
+		if next_state is not None:
+			return await next_state
+		return await self.browser_context.get_state(cache_clickable_elements_hashes=True)
+
+	def _discard_next_state(self) -> None:
+		"""Drop the state captured ahead, the page might change before the next step (pause, stop, end of the run)"""
+		next_state, self._next_state = self._next_state, None
+		if next_state is None:
+			return
+		if not next_state.done():
+			next_state.cancel()
+		elif not next_state.cancelled():
+			next_state.exception()  # nobody awaits it anymore, mark a failed capture as retrieved
+
 	@time_execution_async('--handle_step_error (agent)')
 	async def _handle_step_error(self, error: Exception) -> list[ActionResult]:
 		"""Handle all types of errors that can occur during a step"""
@@ -702,6 +841,7 @@ class Agent(Generic[Context]):
 				logger.error(f'Failed to invoke model: {str(e)}')
 				raise LLMException(401, 'LLM API call failed') from e
 			# TODO: currently invoke does not return reasoning_content, we should override invoke
+			self._last_usage = output.usage_metadata
 			output.content = self._remove_think_tags(str(output.content))
 			try:
 				parsed_json = extract_json_from_model_output(output.content)
@@ -712,7 +852,7 @@ class Agent(Generic[Context]):
 				raise ValueError('Could not parse response.')
 
 		elif self.tool_calling_method is None:
-			structured_llm = self.llm.with_structured_output(self.AgentOutput, include_raw=True)
+			structured_llm = self._get_structured_llm(None)
 			try:
 				response: dict[str, Any] = await structured_llm.ainvoke(input_messages)  # type: ignore
 				parsed: AgentOutput | None = response['parsed']
@@ -723,9 +863,12 @@ class Agent(Generic[Context]):
 
 		else:
 			logger.debug(f'Using {self.tool_calling_method} for {self.chat_model_library}')
-			structured_llm = self.llm.with_structured_output(self.AgentOutput, include_raw=True, method=self.tool_calling_method)
+			structured_llm = self._get_structured_llm(self.tool_calling_method)
 			response: dict[str, Any] = await structured_llm.ainvoke(input_messages)  # type: ignore
 
+		if 'raw' in response:
+			self._last_usage = getattr(response['raw'], 'usage_metadata', None)
+
 		# Handle tool call responses
 		if response.get('parsing_error') and 'raw' in response:
 			raw_msg = response['raw']
@@ -771,6 +914,98 @@ class Agent(Generic[Context]):
 
 		return parsed
 
+	def _can_stream_actions(self) -> bool:
+		return self.settings.stream_actions and self.tool_calling_method in ('raw', 'function_calling', 'tools')
+
+	@time_execution_async('--stream_next_action')
+	async def stream_next_action(
+		self, input_messages: list[BaseMessage], streamed_actions: asyncio.Queue[ActionModel | None]
+	) -> AgentOutput:
+		"""Like get_next_action, but puts every action into streamed_actions as soon as it is complete in the streamed output"""
+		input_messages = self._convert_input_messages(input_messages)
+		action_model = get_args(self.AgentOutput.model_fields['action'].annotation)[0]
+		parser = ActionStreamParser()
+		current_state = None
+		actions: list[ActionModel] = []
+		dispatching = True
+		tool_name = convert_to_openai_tool(self.AgentOutput)['function']['name']
+		# only the first chunk of a tool call names it, the later ones carry its index - which is not 0 when the
+		# provider streams text or thinking blocks before it (Anthropic)
+		output_tool_call_indexes: set[int | None] = set()
+
+		try:
+			if self.tool_calling_method == 'raw':
+				stream = self.llm.astream(input_messages)
+			else:
+				# the output model bound as the forced tool, its arguments are streamed in
+				stream = self._get_structured_llm('stream').astream(input_messages)
+
+			async for chunk in stream:
+				if chunk.usage_metadata:
+					# some providers report the input and output tokens in different chunks
+					self._last_usage = add_usage(self._last_usage, chunk.usage_metadata)
+				if self.tool_calling_method == 'raw':
+					text = chunk.content if isinstance(chunk.content, str) else ''
+				else:
+					text = ''
+					for tool_call_chunk in getattr(chunk, 'tool_call_chunks', []):
+						if tool_call_chunk.get('name') == tool_name:
+							output_tool_call_indexes.add(tool_call_chunk.get('index'))
+						if tool_call_chunk.get('index') in output_tool_call_indexes:
+							text += tool_call_chunk.get('args') or ''
+
+				for key, value in parser.feed(text):
+					if key == 'current_state':
+						current_state = value
+						continue
+					if not dispatching or len(actions) >= self.settings.max_actions_per_step:
+						continue
+					try:
+						action = action_model(**value)
+					except ValidationError as e:
+						# the actions after an invalid one might depend on it, stop running them
+						logger.warning(f'Invalid streamed action {value}: {str(e)}')
+						dispatching = False
+						continue
+					actions.append(action)
+					await streamed_actions.put(action)
+		except Exception as e:
+			logger.error(f'Failed to invoke model: {str(e)}')
+			raise LLMException(401, 'LLM API call failed') from e
+		finally:
+			await streamed_actions.put(None)
+
+		try:
+			parsed = self.AgentOutput(**extract_json_from_model_output(self._remove_think_tags(parser.text)))
+			parsed.action = parsed.action[: len(actions)] if actions else parsed.action[: self.settings.max_actions_per_step]
+		except (ValueError, ValidationError) as e:
+			if current_state is None or not actions:
+				logger.warning(f'Failed to parse model output: {parser.text} {str(e)}')
+				raise ValueError('Could not parse response.')
+			# the output broke after the actions that already ran, keep those
+			parsed = self.AgentOutput(current_state=current_state, action=actions)
+
+		if not (hasattr(self.state, 'paused') and (self.state.paused or self.state.stopped)):
+			log_response(parsed)
+
+		return parsed
+
+	@staticmethod
+	async def _iterate_streamed_actions(streamed_actions: asyncio.Queue[ActionModel | None]) -> AsyncIterator[ActionModel]:
+		while (action := await streamed_actions.get()) is not None:
+			yield action
+
+	@staticmethod
+	async def _cancel_acting(acting: asyncio.Task | None, acted: list[ActionResult]) -> list[ActionResult]:
+		"""Stops the streamed actions, returns the results of the ones that already ran"""
+		if acting is None:
+			return []
+		acting.cancel()
+		await asyncio.gather(acting, return_exceptions=True)
+		if acted:
+			logger.info(f'Step failed after {len(acted)} streamed actions ran, they are kept in the history')
+		return acted
+
 	def _log_agent_run(self) -> None:
 		"""Log the agent run"""
 		logger.info(f'🚀 Starting task: {self.task}')
@@ -879,6 +1114,9 @@ class Agent(Generic[Context]):
 		try:
 			self._log_agent_run()
 
+			# the tokenizer is only loaded now, its first load can download an encoding
+			await self._message_manager.aload_tokenizer()
+
 			# Execute initial actions if provided
 			if self.initial_actions:
 				result = await self.multi_act(self.initial_actions, check_for_new_elements=False)
@@ -960,6 +1198,10 @@ class Agent(Generic[Context]):
 		finally:
 			# Unregister signal handlers before cleanup
 			signal_handler.unregister()
+			self._discard_next_state()
+			self._discard_planning()
+			if self.memory:
+				self.memory.cancel_procedural_memory()
 
 			if not self._force_exit_telemetry_logged:  # MODIFIED: Check the flag
 				try:
@@ -1002,18 +1244,28 @@ class Agent(Generic[Context]):
 	@time_execution_async('--multi-act (agent)')
 	async def multi_act(
 		self,
-		actions: list[ActionModel],
+		actions: list[ActionModel] | AsyncIterator[ActionModel],
 		check_for_new_elements: bool = True,
+		results: list[ActionResult] | None = None,
 	) -> list[ActionResult]:
-		"""Execute multiple actions"""
-		results = []
+		"""Execute multiple actions, streamed ones as they arrive. The results are appended to results as they complete."""
+		results = [] if results is None else results
 
 		cached_selector_map = await self.browser_context.get_selector_map()
 		cached_path_hashes = {e.hash.branch_path_hash for e in cached_selector_map.values()}
 
 		await self.browser_context.remove_highlights()
 
-		for i, action in enumerate(actions):
+		if isinstance(actions, list):
+			action_iterator = self._iterate_actions(actions)
+			total = f' / {len(actions)}'
+		else:
+			action_iterator = actions
+			total = ''  # unknown while streaming
+
+		i = 0
+		action = await anext(action_iterator, None)
+		while action is not None:
 			if action.get_index() is not None and i != 0:
 				new_state = await self.browser_context.get_state(cache_clickable_elements_hashes=False)
 				new_selector_map = new_state.selector_map
@@ -1024,7 +1276,7 @@ class Agent(Generic[Context]):
 				new_target = new_selector_map.get(action.get_index())  # type: ignore
 				new_target_hash = new_target.hash.branch_path_hash if new_target else None
 				if orig_target_hash != new_target_hash:
-					msg = f'Element index changed after action {i} / {len(actions)}, because page changed.'
+					msg = f'Element index changed after action {i}{total}, because page changed.'
 					logger.info(msg)
 					results.append(ActionResult(extracted_content=msg, include_in_memory=True))
 					break
@@ -1032,7 +1284,7 @@ class Agent(Generic[Context]):
 				new_path_hashes = {e.hash.branch_path_hash for e in new_selector_map.values()}
 				if check_for_new_elements and not new_path_hashes.issubset(cached_path_hashes):
 					# next action requires index but there are new elements on the page
-					msg = f'Something new appeared after action {i} / {len(actions)}'
+					msg = f'Something new appeared after action {i}{total}'
 					logger.info(msg)
 					results.append(ActionResult(extracted_content=msg, include_in_memory=True))
 					break
@@ -1051,9 +1303,14 @@ class Agent(Generic[Context]):
 
 				results.append(result)
 
-				logger.debug(f'Executed action {i + 1} / {len(actions)}')
-				if results[-1].is_done or results[-1].error or i == len(actions) - 1:
+				logger.debug(f'Executed action {i + 1}{total}')
+				if results[-1].is_done or results[-1].error:
+					break
+
+				action = await anext(action_iterator, None)
+				if action is None:
 					break
+				i += 1
 
 				await asyncio.sleep(self.browser_context.config.wait_between_actions)
 				# hash all elements. if it is a subset of cached_state its fine - else break (new elements on page)
@@ -1068,6 +1325,11 @@ class Agent(Generic[Context]):
 
 		return results
 
+	@staticmethod
+	async def _iterate_actions(actions: list[ActionModel]) -> AsyncIterator[ActionModel]:
+		for action in actions:
+			yield action
+
 	async def _validate_output(self) -> bool:
 		"""Validate the output of the last action is what the user wanted"""
 		system_msg = (
@@ -1087,6 +1349,7 @@ class Agent(Generic[Context]):
 				state=state,
 				result=self.state.last_result,
 				include_attributes=self.settings.include_attributes,
+				compact_repeated_elements=self.settings.compact_repeated_elements,
 			)
 			msg = [SystemMessage(content=system_msg), content.get_user_message(self.settings.use_vision)]
 		else:
@@ -1260,6 +1523,7 @@ class Agent(Generic[Context]):
 		"""Pause the agent before the next step"""
 		print('\n\n⏸️  Got Ctrl+C, paused the agent and left the browser open.')
 		self.state.paused = True
+		self._discard_next_state()
 
 		# The signal handler will handle the asyncio pause logic for us
 		# No need to duplicate the code here
@@ -1285,6 +1549,7 @@ class Agent(Generic[Context]):
 		"""Stop the agent"""
 		logger.info('⏹️ Agent stopping')
 		self.state.stopped = True
+		self._discard_next_state()
 
 	def _convert_initial_actions(self, actions: list[dict[str, dict[str, Any]]]) -> list[ActionModel]:
 		"""Convert dictionary-based actions to ActionModel instances"""
@@ -1359,12 +1624,88 @@ class Agent(Generic[Context]):
 			else:
 				pass
 
-	async def _run_planner(self) -> str | None:
+	async def _start_planner(self, state: BrowserState) -> None:
+		"""Starts the planner in the background on the current messages, unless it is still busy with the last ones"""
+		if self._planning is not None:
+			logger.debug('Planner is still running, not starting it again')
+			return
+		planner_messages = await self._get_planner_messages()
+		self._planning_fingerprint = self._get_plan_fingerprint(state)
+		self._planning = asyncio.create_task(self._run_planner(planner_messages))
+
+	def _add_finished_plan(self, state: BrowserState) -> None:
+		"""Adds the plan made in the background before the state message, if it is done and the page did not change too much"""
+		if self._planning is None or not self._planning.done():
+			return
+
+		planning, self._planning = self._planning, None
+		if planning.cancelled():
+			return
+		if error := planning.exception():
+			logger.warning(f'⚠️ Planner failed in the background: {error}')
+			return
+		if self._planning_fingerprint is None or self._is_plan_stale(self._planning_fingerprint, state):
+			logger.info('🗑️ Dropping the plan, the page changed since it was made')
+			return
+		self._message_manager.add_plan(planning.result(), position=-1)
+
+	@staticmethod
+	def _get_plan_fingerprint(state: BrowserState) -> tuple[str, frozenset[str]]:
+		return state.url, frozenset(element.xpath for element in state.selector_map.values())
+
+	def _is_plan_stale(self, fingerprint: tuple[str, frozenset[str]], state: BrowserState) -> bool:
+		url, elements = fingerprint
+		current_url, current_elements = self._get_plan_fingerprint(state)
+		if url != current_url:
+			return True
+		changed = len(elements ^ current_elements)
+		return changed > STALE_PLAN_CHANGE_RATIO * max(len(elements | current_elements), 1)
+
+	def _discard_planning(self) -> None:
+		"""Drop the plan being made in the background (end of the run)"""
+		planning, self._planning = self._planning, None
+		if planning is None:
+			return
+		if not planning.done():
+			planning.cancel()
+		elif not planning.cancelled():
+			planning.exception()  # nobody awaits it anymore, mark a failed plan as retrieved
+
+	async def _run_planner(self, planner_messages: list[BaseMessage] | None = None) -> str | None:
 		"""Run the planner to analyze state and suggest next steps"""
 		# Skip planning if no planner_llm is set
 		if not self.settings.planner_llm:
 			return None
 
+		if planner_messages is None:
+			planner_messages = await self._get_planner_messages()
+
+		# Get planner output
+		try:
+			response = await self.settings.planner_llm.ainvoke(planner_messages)
+		except Exception as e:
+			logger.error(f'Failed to invoke planner: {str(e)}')
+			raise LLMException(401, 'LLM API call failed') from e
+
+		plan = str(response.content)
+		# if deepseek-reasoner, remove think tags
+		if self.planner_model_name and (
+			'deepseek-r1' in self.planner_model_name or 'deepseek-reasoner' in self.planner_model_name
+		):
+			plan = self._remove_think_tags(plan)
+		try:
+			plan_json = json.loads(plan)
+			logger.info(f'Planning Analysis:\n{json.dumps(plan_json, indent=4)}')
+		except json.JSONDecodeError:
+			logger.info(f'Planning Analysis:\n{plan}')
+		except Exception as e:
+			logger.debug(f'Error parsing planning analysis: {e}')
+			logger.info(f'Plan: {plan}')
+
+		return plan
+
+	async def _get_planner_messages(self) -> list[BaseMessage]:
+		"""The planner prompt with all available actions, followed by the current messages"""
 		# Get current state to filter actions by page
 		page = await self.browser_context.get_current_page()
 
@@ -1401,31 +1742,7 @@ class Agent(Generic[Context]):
 
 			planner_messages[-1] = HumanMessage(content=new_msg)
 
-		planner_messages = convert_input_messages(planner_messages, self.planner_model_name)
-
-		# Get planner output
-		try:
-			response = await self.settings.planner_llm.ainvoke(planner_messages)
-		except Exception as e:
-			logger.error(f'Failed to invoke planner: {str(e)}')
-			raise LLMException(401, 'LLM API call failed') from e
-
-		plan = str(response.content)
-		# if deepseek-reasoner, remove think tags
-		if self.planner_model_name and (
-			'deepseek-r1' in self.planner_model_name or 'deepseek-reasoner' in self.planner_model_name
-		):
-			plan = self._remove_think_tags(plan)
-		try:
-			plan_json = json.loads(plan)
-			logger.info(f'Planning Analysis:\n{json.dumps(plan_json, indent=4)}')
-		except json.JSONDecodeError:
-			logger.info(f'Planning Analysis:\n{plan}')
-		except Exception as e:
-			logger.debug(f'Error parsing planning analysis: {e}')
-			logger.info(f'Plan: {plan}')
-
-		return plan
+		return convert_input_messages(planner_messages, self.planner_model_name)
 
 	@property
 	def message_manager(self) -> MessageManager:
@@ -1448,11 +1765,11 @@ class Agent(Generic[Context]):
 
 	async def _update_action_models_for_page(self, page) -> None:
 		"""Update action models with page-specific actions"""
-		# Create new action model with current page's filtered actions
+		# Create new action model with current page's filtered actions, the models are only built for new action sets
 		self.ActionModel = self.controller.registry.create_action_model(page=page)
 		# Update output model with the new actions
-		self.AgentOutput = AgentOutput.type_with_custom_actions(self.ActionModel)
+		self.AgentOutput = self._get_agent_output_model(self.ActionModel)
 
 		# Update done action model too
 		self.DoneActionModel = self.controller.registry.create_action_model(include_actions=['done'], page=page)
-		self.DoneAgentOutput = AgentOutput.type_with_custom_actions(self.DoneActionModel)
+		self.DoneAgentOutput = self._get_agent_output_model(self.DoneActionModel)
@@ -65,12 +65,27 @@ class AgentSettings(BaseModel):
 		'alt',
 		'aria-expanded',
 	]
+	compact_repeated_elements: int | None = Field(
+		default=None, ge=1
+	)  # Show only the first N of repeated sibling structures in full
+	state_delta: bool = False  # Only send the changed page elements between full state messages
 	max_actions_per_step: int = 10
+	pipeline_steps: bool = False  # Capture the next state as soon as the actions are done, while the step is recorded
+	stream_actions: bool = False  # Run each action as soon as it is complete in the streamed output of the LLM
+	prompt_cache_markers: bool = False  # Mark the end of the stable message prefix for providers with explicit prompt caching
+	history_compaction: bool = False  # Fold older steps of the history into a running summary
+	history_keep_steps: int = 5
+	history_fold_steps: int = 5
+	history_token_target: int | None = None
+	history_summary_llm: BaseChatModel | None = None  # Writes the running summary, if set
+	history_summary_max_tokens: int = 2000
+	history_summary_min_steps: int = 5
 
 	tool_calling_method: ToolCallingMethod | None = 'auto'
 	page_extraction_llm: BaseChatModel | None = None
 	planner_llm: BaseChatModel | None = None
 	planner_interval: int = 1  # Run planner every N steps
+	async_planner: bool = False  # Run the planner in the background, its plan is added at the next step if still fresh
 	is_planner_reasoning: bool = False  # type: ignore
 	extend_planner_system_message: str | None = None
 
@@ -123,6 +138,9 @@ class StepMetadata(BaseModel):
 	step_end_time: float
 	input_tokens: int  # Approximate tokens from message manager for this step
 	step_number: int
+	# Input tokens of the LLM call as reported by the provider, read from / not in its prompt cache (None if not reported)
+	cached_input_tokens: int | None = None
+	uncached_input_tokens: int | None = None
 
 	@property
 	def duration_seconds(self) -> float:
@@ -12,7 +12,7 @@ import re
 import time
 import uuid
 from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
 import anyio
 from patchright._impl._errors import TimeoutError
@@ -22,11 +22,13 @@ from patchright.async_api import (
 )
 from patchright.async_api import (
 	ElementHandle,
+	Frame,
 	FrameLocator,
 	Page,
 )
 from pydantic import BaseModel, ConfigDict, Field
 
+from browser_use.browser.utils.screenshot_highlights import draw_highlights_on_screenshot
 from browser_use.browser.views import (
 	BrowserError,
 	BrowserState,
@@ -34,8 +36,13 @@ from browser_use.browser.views import (
 	URLNotAllowedError,
 )
 from browser_use.dom.clickable_element_processor.service import ClickableElementProcessor
-from browser_use.dom.service import DomService
-from browser_use.dom.views import DOMElementNode, SelectorMap
+from browser_use.dom.service import (
+	DISCONNECT_MUTATION_OBSERVER_JS,
+	DOMProcessingExecutor,
+	DomService,
+	get_dom_processing_executor,
+)
+from browser_use.dom.views import DOMElementNode, DOMElementRef, DOMState, SelectorMap
 from browser_use.utils import time_execution_async, time_execution_sync
 
 if TYPE_CHECKING:
@@ -51,6 +58,15 @@ BROWSER_NAVBAR_HEIGHT = {
 	'linux': 90,
 }.get(platform.system().lower(), 85)
 
+# Scroll position and size of the viewport, rounded like the scroll positions the viewport tiles are keyed by
+VIEWPORT_POSITION_JS = """() => ({
+	x: Math.round(window.scrollX),
+	y: Math.round(window.scrollY),
+	width: window.innerWidth,
+	height: window.innerHeight,
+	scrollHeight: document.documentElement.scrollHeight,
+})"""
+
 
 class BrowserContextConfig(BaseModel):
 	"""
@@ -102,9 +118,42 @@ class BrowserContextConfig(BaseModel):
 	    highlight_elements: True
 	        Highlight elements in the DOM on the screen
 
+	    highlight_renderer: 'dom'
+	        How highlights are drawn. 'dom' adds positioned overlay elements per highlighted element, 'canvas' draws all highlights onto a single canvas (cheaper on pages with many interactive elements).
+	        'screenshot' leaves the page untouched and draws the highlights onto the screenshot only (requires Pillow).
+
 	    viewport_expansion: 0
 	        Viewport expansion in pixels. This amount will increase the number of elements which are included in the state what the LLM will see. If set to -1, all elements will be included (this leads to high token usage). If set to 0, only the elements which are visible in the viewport will be included.
 
+	    prefetch_viewport_tiles: False
+	        Extract the DOM of the viewports above and below the current one in the background, while the LLM is thinking.
+	        After scrolling there the state is built from the prefetched extraction if the page did not change in the meantime.
+
+	    dom_extraction_mode: 'dom'
+	        How the interactive elements are extracted. 'dom' walks the DOM in the page, 'accessibility' builds them from the accessibility tree over CDP
+	        (Chromium only). The accessibility tree is already pruned and much smaller on deeply nested apps, highlights are drawn onto the screenshot.
+
+	    extract_cross_origin_iframes: False
+	        Also extract the elements of visible cross-origin iframes (embedded widgets, payment forms, ...), which the DOM walk cannot descend into.
+	        Each frame is extracted on its own, concurrently with the page, and its elements continue the highlight indices of the page.
+
+	    max_parallel_frame_extractions: 4
+	        Maximum number of cross-origin iframes extracted at the same time.
+
+	    dom_max_nodes: None
+	    dom_time_budget_ms: None
+	        Stop the DOM extraction after visiting this many nodes / after this many milliseconds, to bound the step latency on pathological pages.
+	        With a budget the viewport is extracted first and the rest of the page closest to the viewport first, the LLM is told when parts were left out.
+
+	    dom_processing_executor: 'event_loop'
+	        Where the CPU-bound processing of the page state runs (building the element tree, hashing the elements, rendering the state message).
+	        'event_loop' runs it directly, 'thread' or 'process' in a pool shared by all contexts of the process, so many agents in one process
+	        don't stall each other's network handling. Work that updates state in place (hashing, the state message) always uses threads.
+
+	    dom_transfer_chunk_size: None
+	        Transfer the DOM extraction of the page in batches of this many nodes instead of one huge message.
+	        The element tree is built from each batch while the next one is transferred, which lowers the peak memory on huge pages.
+
 	    allowed_domains: None
 	        List of allowed domains that can be accessed. If None, all domains are allowed.
 	        Example: ['example.com', 'api.example.com']
@@ -164,7 +213,16 @@ class BrowserContextConfig(BaseModel):
 	user_agent: str | None = None
 
 	highlight_elements: bool = True
+	highlight_renderer: Literal['dom', 'canvas', 'screenshot'] = 'dom'
 	viewport_expansion: int = 0
+	prefetch_viewport_tiles: bool = False
+	dom_extraction_mode: Literal['dom', 'accessibility'] = 'dom'
+	extract_cross_origin_iframes: bool = False
+	max_parallel_frame_extractions: int = 4
+	dom_max_nodes: int | None = None
+	dom_time_budget_ms: int | None = None
+	dom_processing_executor: DOMProcessingExecutor = 'event_loop'
+	dom_transfer_chunk_size: int | None = None
 	allowed_domains: list[str] | None = None
 	include_dynamic_attributes: bool = True
 	http_credentials: dict[str, str] | None = None
@@ -201,6 +259,10 @@ class BrowserSession:
 
 		self.cached_state_clickable_elements_hashes: CachedStateClickableElementsHashes | None = None
 
+		# DOM extractions of the viewports next to the current one, keyed by (url, scroll x, scroll y, width, height)
+		self.viewport_tiles: dict[tuple[str, int, int, int, int], DOMState] = {}
+		self.viewport_prefetch_task: asyncio.Task | None = None
+
 
 @dataclass
 class BrowserContextState:
@@ -249,6 +311,9 @@ class BrowserContext:
 			if self.session is None:
 				return
 
+			if self.session.viewport_prefetch_task:
+				self.session.viewport_prefetch_task.cancel()
+
 			# Then remove CDP protocol listeners
 			if self._page_event_handler and self.session.context:
 				try:
@@ -266,6 +331,15 @@ class BrowserContext:
 				except Exception as e:
 					logger.debug(f'Failed to stop tracing: {e}')
 
+			if self.config.keep_alive:
+				# the pages stay open, stop tracking their changes for the extraction caches
+				for page in self.session.context.pages:
+					for frame in page.frames:
+						try:
+							await frame.evaluate(DISCONNECT_MUTATION_OBSERVER_JS)
+						except Exception as e:
+							logger.debug(f'Failed to disconnect the mutation observer: {e}')
+
 			# This is crucial - it closes the CDP connection
 			if not self.config.keep_alive:
 				logger.debug('Closing browser context')
@@ -680,34 +754,33 @@ class BrowserContext:
 				window._eventListenerTrackerInitialized = true;
 
 				const originalAddEventListener = EventTarget.prototype.addEventListener;
-				const eventListenersMap = new WeakMap();
+				// One bit per interaction event type, keep in sync with EVENT_LISTENER_BITS in buildDomTree.js
+				const eventListenerBits = new Map([
+					['click', 1], ['mousedown', 2], ['mouseup', 4], ['dblclick', 8],
+					['pointerdown', 16], ['pointerup', 32], ['keydown', 64], ['keyup', 128],
+					['submit', 256], ['change', 512], ['input', 1024], ['focus', 2048], ['blur', 4096],
+				]);
+				// node -> bitmask of the interaction event types it listens to, no listener references are kept
+				const eventListenerMasks = new WeakMap();
 
 				EventTarget.prototype.addEventListener = function(type, listener, options) {
-					if (typeof listener === "function") {
-						let listeners = eventListenersMap.get(this);
-						if (!listeners) {
-							listeners = [];
-							eventListenersMap.set(this, listeners);
-						}
-
-						listeners.push({
-							type,
-							listener,
-							listenerPreview: listener.toString().slice(0, 100),
-							options
-						});
+					const bit = eventListenerBits.get(type);
+					if (bit && listener) {
+						eventListenerMasks.set(this, (eventListenerMasks.get(this) || 0) | bit);
 					}
 
 					return originalAddEventListener.call(this, type, listener, options);
 				};
 
+				window.getEventListenerMaskForNode = (node) => eventListenerMasks.get(node) || 0;
+
 				window.getEventListenersForNode = (node) => {
-					const listeners = eventListenersMap.get(node) || [];
-					return listeners.map(({ type, listenerPreview, options }) => ({
-						type,
-						listenerPreview,
-						options
-					}));
+					const mask = eventListenerMasks.get(node) || 0;
+					const listeners = [];
+					for (const [type, bit] of eventListenerBits) {
+						if (mask & bit) listeners.push({ type });
+					}
+					return listeners;
 				};
 			})();
 			"""
@@ -1131,24 +1204,11 @@ class BrowserContext:
 		# Find out which elements are new
 		# Do this only if url has not changed
 		if cache_clickable_elements_hashes:
-			# if we are on the same url as the last state, we can use the cached hashes
-			if (
-				session.cached_state_clickable_elements_hashes
-				and session.cached_state_clickable_elements_hashes.url == updated_state.url
-			):
-				# Pointers, feel free to edit in place
-				updated_state_clickable_elements = ClickableElementProcessor.get_clickable_elements(updated_state.element_tree)
-
-				for dom_element in updated_state_clickable_elements:
-					dom_element.is_new = (
-						ClickableElementProcessor.hash_dom_element(dom_element)
-						not in session.cached_state_clickable_elements_hashes.hashes  # see which elements are new from the last state where we cached the hashes
-					)
-			# in any case, we need to cache the new hashes
-			session.cached_state_clickable_elements_hashes = CachedStateClickableElementsHashes(
-				url=updated_state.url,
-				hashes=ClickableElementProcessor.get_clickable_elements_hashes(updated_state.element_tree),
-			)
+			if self.config.dom_processing_executor == 'event_loop':
+				self._update_clickable_elements_hashes(session, updated_state)
+			else:
+				# hashing every element is pure CPU work, keep the event loop free for the other agents in the meantime
+				await asyncio.to_thread(self._update_clickable_elements_hashes, session, updated_state)
 
 		session.cached_state = updated_state
 
@@ -1158,6 +1218,31 @@ class BrowserContext:
 
 		return session.cached_state
 
+	def _update_clickable_elements_hashes(self, session: BrowserSession, updated_state: BrowserState) -> None:
+		"""Marks the elements that are new since the last cached state, then caches the hashes of the updated state"""
+		# if we are on the same url as the last state, we can use the cached hashes
+		if (
+			session.cached_state_clickable_elements_hashes
+			and session.cached_state_clickable_elements_hashes.url == updated_state.url
+		):
+			# Pointers, feel free to edit in place
+			updated_state_clickable_elements = ClickableElementProcessor.get_clickable_elements(updated_state.element_tree)
+
+			for dom_element in updated_state_clickable_elements:
+				dom_element.is_new = (
+					ClickableElementProcessor.hash_dom_element(dom_element)
+					not in session.cached_state_clickable_elements_hashes.hashes  # see which elements are new from the last state where we cached the hashes
+				)
+		# in any case, we need to cache the new hashes
+		session.cached_state_clickable_elements_hashes = CachedStateClickableElementsHashes(
+			url=updated_state.url,
+			hashes=ClickableElementProcessor.get_clickable_elements_hashes(updated_state.element_tree),
+		)
+
+	def _highlights_on_screenshot(self) -> bool:
+		"""Whether highlights are drawn onto the screenshot instead of the page"""
+		return self.config.highlight_renderer == 'screenshot' or self.config.dom_extraction_mode == 'accessibility'
+
 	async def _get_updated_state(self, focus_element: int = -1) -> BrowserState:
 		"""Update and return state."""
 		session = await self.get_session()
@@ -1173,12 +1258,21 @@ class BrowserContext:
 
 		try:
 			await self.remove_highlights()
-			dom_service = DomService(page)
-			content = await dom_service.get_clickable_elements(
-				focus_element=focus_element,
-				viewport_expansion=self.config.viewport_expansion,
-				highlight_elements=self.config.highlight_elements,
-			)
+			dom_service = DomService(page, get_dom_processing_executor(self.config.dom_processing_executor))
+			content = await self._get_prefetched_viewport_tile(session, page, dom_service, focus_element)
+			if content is None:
+				content = await dom_service.get_clickable_elements(
+					focus_element=focus_element,
+					viewport_expansion=self.config.viewport_expansion,
+					highlight_elements=self.config.highlight_elements and not self._highlights_on_screenshot(),
+					highlight_renderer=self.config.highlight_renderer,
+					extraction_mode=self.config.dom_extraction_mode,
+					extract_cross_origin_iframes=self.config.extract_cross_origin_iframes,
+					max_parallel_frame_extractions=self.config.max_parallel_frame_extractions,
+					max_nodes=self.config.dom_max_nodes,
+					time_budget_ms=self.config.dom_time_budget_ms,
+					chunk_size=self.config.dom_transfer_chunk_size,
+				)
 
 			tabs_info = await self.get_tabs_info()
 
@@ -1203,6 +1297,8 @@ class BrowserContext:
 			# 	)
 
 			screenshot_b64 = await self.take_screenshot()
+			if self.config.highlight_elements and self._highlights_on_screenshot():
+				screenshot_b64 = await asyncio.to_thread(draw_highlights_on_screenshot, screenshot_b64, content.selector_map)
 			pixels_above, pixels_below = await self.get_scroll_info(page)
 
 			# Find the agent's active tab ID
@@ -1222,8 +1318,18 @@ class BrowserContext:
 				screenshot=screenshot_b64,
 				pixels_above=pixels_above,
 				pixels_below=pixels_below,
+				truncation=content.truncation,
 			)
 
+			if (
+				self.config.prefetch_viewport_tiles
+				and self.config.viewport_expansion != -1
+				and self.config.dom_extraction_mode == 'dom'
+				and not self.config.extract_cross_origin_iframes  # tiles only cover the page itself
+			):
+				session.viewport_tiles = {}
+				session.viewport_prefetch_task = asyncio.create_task(self._prefetch_viewport_tiles(session, page))
+
 			return self.current_state
 		except Exception as e:
 			logger.error(f'❌  Failed to update state: {str(e)}')
@@ -1232,6 +1338,69 @@ class BrowserContext:
 				return self.current_state
 			raise
 
+	async def _prefetch_viewport_tiles(self, session: BrowserSession, page: Page) -> None:
+		"""
+		Extracts the DOM one viewport below and above the current one (where scroll_down/scroll_up end up by default)
+		without scrolling the page. Runs in the background while the LLM is thinking about the next action.
+		"""
+		try:
+			viewport = await page.evaluate(VIEWPORT_POSITION_JS)
+			max_scroll_y = max(0, viewport['scrollHeight'] - viewport['height'])
+			target_scroll_ys = {
+				min(viewport['y'] + viewport['height'], max_scroll_y),
+				max(viewport['y'] - viewport['height'], 0),
+			} - {viewport['y']}
+
+			dom_service = DomService(page, get_dom_processing_executor(self.config.dom_processing_executor))
+			# the tile below first, scrolling down is by far the most common
+			for target_scroll_y in sorted(target_scroll_ys, reverse=True):
+				tile = await dom_service.get_clickable_elements(
+					highlight_elements=False,
+					viewport_expansion=self.config.viewport_expansion,
+					viewport_offset=target_scroll_y - viewport['y'],
+					max_nodes=self.config.dom_max_nodes,
+					time_budget_ms=self.config.dom_time_budget_ms,
+					chunk_size=self.config.dom_transfer_chunk_size,
+				)
+				key = (page.url, viewport['x'], target_scroll_y, viewport['width'], viewport['height'])
+				session.viewport_tiles[key] = tile
+		except Exception as e:
+			logger.debug(f'Failed to prefetch viewport tiles: {e}')
+
+	async def _get_prefetched_viewport_tile(
+		self, session: BrowserSession, page: Page, dom_service: DomService, focus_element: int
+	) -> DOMState | None:
+		"""
+		Returns the prefetched viewport tile for the current scroll position, if the page did not change since it was extracted.
+		"""
+		task, session.viewport_prefetch_task = session.viewport_prefetch_task, None
+		if task is None:
+			return None
+		if not task.done():
+			task.cancel()  # the agent was faster than the prefetch, use what is done so far
+
+		tiles, session.viewport_tiles = session.viewport_tiles, {}
+		if not tiles:
+			return None
+
+		viewport = await page.evaluate(VIEWPORT_POSITION_JS)
+		tile = tiles.get((page.url, viewport['x'], viewport['y'], viewport['width'], viewport['height']))
+		if tile is None:
+			return None
+
+		is_valid = await dom_service.validate_dom_state(
+			tile,
+			highlight_elements=self.config.highlight_elements and not self._highlights_on_screenshot(),
+			focus_element=focus_element,
+			highlight_renderer=self.config.highlight_renderer,
+		)
+		if not is_valid:
+			logger.debug('Prefetched viewport tile is outdated, extracting the DOM again')
+			return None
+
+		logger.debug(f'♻️  Reusing prefetched viewport tile at scroll position {viewport["y"]}')
+		return tile
+
 	# region - Browser Actions
 	@time_execution_async('--take_screenshot')
 	async def take_screenshot(self, full_page: bool = False) -> str:
@@ -1262,11 +1431,17 @@ class BrowserContext:
 		Removes all highlight overlays and labels created by the highlightElement function.
 		Handles cases where the page might be closed or inaccessible.
 		"""
+		if self._highlights_on_screenshot():
+			return  # highlights only exist on the screenshot, nothing to remove from the page
+
 		try:
 			page = await self.get_agent_current_page()
-			await page.evaluate(
-				"""
+			remove_highlights_js = """
                 try {
+                    // Detach the scroll/resize handlers registered by the highlight renderers
+                    (window._highlightCleanupFunctions || []).forEach(fn => fn());
+                    window._highlightCleanupFunctions = [];
+
                     // Remove the highlight container and all its contents
                     const container = document.getElementById('playwright-highlight-container');
                     if (container) {
@@ -1282,7 +1457,11 @@ class BrowserContext:
                     console.error('Failed to remove highlights:', e);
                 }
                 """
-			)
+			await page.evaluate(remove_highlights_js)
+			if self.config.extract_cross_origin_iframes:
+				# separately extracted cross-origin frames draw their highlights inside the frame
+				child_frames = [frame for frame in page.frames if frame != page.main_frame]
+				await asyncio.gather(*(frame.evaluate(remove_highlights_js) for frame in child_frames), return_exceptions=True)
 		except Exception as e:
 			logger.debug(f'⚠  Failed to remove highlights (this is usually ok): {str(e)}')
 			# Don't raise the error since this is not critical functionality
@@ -1476,6 +1655,28 @@ class BrowserContext:
 
 		# Process all iframe parents in sequence
 		iframes = [item for item in parents if item.tag_name == 'iframe']
+
+		# Prefer the node recorded by the extractor, selectors are only needed when the reference went stale.
+		# Elements of separately extracted frames are recorded in the window of their frame.
+		if element.frame_url is not None:
+			ref_frames = [frame for frame in current_frame.frames if frame.url == element.frame_url]
+		else:
+			ref_frames = [] if iframes else [current_frame]
+		for ref_frame in ref_frames:
+			if element.node_ref is None:
+				break
+			element_handle = await self._resolve_element_ref(ref_frame, element.node_ref)
+			if element_handle is None:
+				continue  # another frame with the same url
+			try:
+				is_hidden = await element_handle.is_hidden()
+				if not is_hidden:
+					await element_handle.scroll_into_view_if_needed()
+				return element_handle
+			except Exception as e:
+				logger.debug(f'Recorded element reference unusable, falling back to selector: {str(e)}')
+				break
+
 		for parent in iframes:
 			css_selector = self._enhanced_css_selector_for_element(
 				parent,
@@ -1504,6 +1705,28 @@ class BrowserContext:
 			logger.error(f'❌  Failed to locate element: {str(e)}')
 			return None
 
+	async def _resolve_element_ref(self, frame: Page | Frame, node_ref: DOMElementRef) -> ElementHandle | None:
+		"""
+		Resolves the element handle of a node kept page-side by buildDomTree.js.
+		Returns None if the extraction was dropped (e.g. after a navigation) or the node was detached since.
+		"""
+		try:
+			js_handle = await frame.evaluate_handle(
+				"""([extractionId, index]) => {
+					const node = window.__browserUseNodeRefs?.get(extractionId)?.[index];
+					return node && node.isConnected ? node : null;
+				}""",
+				[node_ref.extraction_id, node_ref.index],
+			)
+		except Exception as e:
+			logger.debug(f'Failed to resolve element reference {node_ref}: {str(e)}')
+			return None
+
+		element_handle = js_handle.as_element()
+		if element_handle is None:
+			await js_handle.dispose()
+		return element_handle
+
 	@time_execution_async('--get_locate_element_by_xpath')
 	async def get_locate_element_by_xpath(self, xpath: str) -> ElementHandle | None:
 		"""
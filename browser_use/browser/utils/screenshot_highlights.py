@@ -0,0 +1,108 @@
+import base64
+import io
+import logging
+
+from browser_use.dom.views import SelectorMap
+
+logger = logging.getLogger(__name__)
+
+# Same palette as the in-page highlight renderers in buildDomTree.js
+HIGHLIGHT_COLORS = [
+	(0xFF, 0x00, 0x00),
+	(0x00, 0xFF, 0x00),
+	(0x00, 0x00, 0xFF),
+	(0xFF, 0xA5, 0x00),
+	(0x80, 0x00, 0x80),
+	(0x00, 0x80, 0x80),
+	(0xFF, 0x69, 0xB4),
+	(0x4B, 0x00, 0x82),
+	(0xFF, 0x45, 0x00),
+	(0x2E, 0x8B, 0x57),
+	(0xDC, 0x14, 0x3C),
+	(0x46, 0x82, 0xB4),
+]
+
+
+def draw_highlights_on_screenshot(screenshot_b64: str, selector_map: SelectorMap) -> str:
+	"""
+	Draws the highlight boxes and index labels of all highlighted elements onto a base64 encoded screenshot.
+
+	Uses the viewport coordinates recorded by the extractor, so the page itself is never touched.
+	All boxes are drawn onto one transparent layer which is composited onto the screenshot in a single pass.
+	Returns the screenshot unchanged if Pillow is not installed.
+	"""
+	try:
+		from PIL import Image, ImageDraw, ImageFont
+	except ImportError:
+		logger.warning('⚠️ Pillow is required to draw highlights onto the screenshot, install it with `pip install pillow`')
+		return screenshot_b64
+
+	elements = [(index, node) for index, node in selector_map.items() if node.viewport_coordinates is not None]
+	if not elements:
+		return screenshot_b64
+
+	image = Image.open(io.BytesIO(base64.b64decode(screenshot_b64))).convert('RGBA')
+
+	# Coordinates are CSS pixels, the screenshot has device pixels
+	viewport_width = next((node.viewport_info.width for _, node in elements if node.viewport_info), None)
+	scale = image.width / viewport_width if viewport_width else 1.0
+
+	overlay = Image.new('RGBA', image.size, (0, 0, 0, 0))
+	draw = ImageDraw.Draw(overlay)
+	fonts: dict[int, ImageFont.ImageFont | ImageFont.FreeTypeFont] = {}
+	labels = []
+
+	for index, node in elements:
+		coordinates = node.viewport_coordinates
+		if coordinates is None or coordinates.width <= 0 or coordinates.height <= 0:
+			continue
+
+		left = coordinates.top_left.x * scale
+		top = coordinates.top_left.y * scale
+		right = coordinates.bottom_right.x * scale
+		bottom = coordinates.bottom_right.y * scale
+		if right < 0 or bottom < 0 or left > image.width or top > image.height:
+			continue  # outside of the screenshot (e.g. in the expanded viewport)
+
+		color = HIGHLIGHT_COLORS[index % len(HIGHLIGHT_COLORS)]
+		draw.rectangle(
+			(left, top, right - 1, bottom - 1), fill=(*color, 0x1A), outline=(*color, 255), width=max(1, round(2 * scale))
+		)
+		labels.append((index, color, left, top, right, bottom))
+
+	# Labels go on top of all boxes
+	for index, color, left, top, right, bottom in labels:
+		font_size = round(min(12, max(8, (bottom - top) / scale / 2)) * scale)
+		if font_size not in fonts:
+			try:
+				fonts[font_size] = ImageFont.load_default(size=font_size)
+			except TypeError:  # Pillow < 10.1 has no sizable default font
+				fonts[font_size] = ImageFont.load_default()
+		font = fonts[font_size]
+
+		text = str(index)
+		text_left, text_top, text_right, text_bottom = draw.textbbox((0, 0), text, font=font)
+		padding_x, padding_y = 4 * scale, 1 * scale
+		label_width = text_right - text_left + 2 * padding_x
+		label_height = text_bottom - text_top + 2 * padding_y
+
+		label_left = right - label_width - 2 * scale
+		label_top = top + 2 * scale
+		# Put the label above small elements instead of covering them
+		if right - left < label_width + 4 * scale or bottom - top < label_height + 4 * scale:
+			label_left = right - label_width
+			label_top = top - label_height - 2 * scale
+		label_left = max(0, min(label_left, image.width - label_width))
+		label_top = max(0, min(label_top, image.height - label_height))
+
+		draw.rounded_rectangle(
+			(label_left, label_top, label_left + label_width, label_top + label_height), radius=4 * scale, fill=(*color, 255)
+		)
+		draw.text(
+			(label_left + padding_x - text_left, label_top + padding_y - text_top), text, font=font, fill=(255, 255, 255, 255)
+		)
+
+	image = Image.alpha_composite(image, overlay).convert('RGB')
+	buffer = io.BytesIO()
+	image.save(buffer, format='PNG')
+	return base64.b64encode(buffer.getvalue()).decode('utf-8')
@@ -29,6 +29,8 @@ class Registry(Generic[Context]):
 		self.registry = ActionRegistry()
 		self.telemetry = ProductTelemetry()
 		self.exclude_actions = exclude_actions if exclude_actions is not None else []
+		# action models by the names of their actions, the pages of a task mostly share a few action sets
+		self._action_models: dict[frozenset[str], type[ActionModel]] = {}
 
 	# @time_execution_sync('--create_param_model')
 	def _create_param_model(self, function: Callable) -> type[BaseModel]:
@@ -86,6 +88,7 @@ class Registry(Generic[Context]):
 				page_filter=page_filter,
 			)
 			self.registry.actions[func.__name__] = action
+			self._action_models.clear()
 			return func
 
 		return decorator
@@ -218,6 +221,10 @@ class Registry(Generic[Context]):
 			if domain_is_allowed and page_is_allowed:
 				available_actions[name] = action
 
+		key = frozenset(available_actions)
+		if key in self._action_models:
+			return self._action_models[key]
+
 		fields = {
 			name: (
 				Optional[action.param_model],
@@ -235,7 +242,9 @@ class Registry(Generic[Context]):
 			)
 		)
 
-		return create_model('ActionModel', __base__=ActionModel, **fields)  # type:ignore
+		action_model = create_model('ActionModel', __base__=ActionModel, **fields)  # type:ignore
+		self._action_models[key] = action_model
+		return action_model
 
 	def get_prompt_description(self, page=None) -> str:
 		"""Get a description of all actions for the prompt
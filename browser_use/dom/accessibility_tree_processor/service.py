@@ -0,0 +1,317 @@
+import logging
+from collections import defaultdict
+
+from browser_use.dom.history_tree_processor.view import Coordinates, CoordinateSet, ViewportInfo
+from browser_use.dom.views import DOMElementNode, DOMTextNode, SelectorMap
+
+logger = logging.getLogger(__name__)
+
+# roles the user can act on, regardless of whether the element is focusable
+INTERACTIVE_ROLES = frozenset(
+	{
+		'button',
+		'checkbox',
+		'combobox',
+		'link',
+		'listbox',
+		'menuitem',
+		'menuitemcheckbox',
+		'menuitemradio',
+		'option',
+		'radio',
+		'searchbox',
+		'slider',
+		'spinbutton',
+		'switch',
+		'tab',
+		'textbox',
+		'treeitem',
+	}
+)
+
+# roles of the documents themselves, focusable but never an element to interact with
+DOCUMENT_ROLES = frozenset({'RootWebArea', 'WebArea', 'Iframe', 'IframePresentational'})
+
+ELEMENT_NODE = 1
+DOCUMENT_FRAGMENT_NODE = 11
+
+
+class AccessibilityTreeProcessor:
+	"""
+	Builds the element tree from the accessibility tree of the page (CDP Accessibility.getFullAXTree) instead of walking the DOM.
+
+	The accessibility tree is already pruned of layout-only wrappers and carries roles and names,
+	the DOM snapshot (CDP DOMSnapshot.captureSnapshot) joined on the backend node id adds tag names, attributes,
+	xpaths and bounding boxes, so the result has the same shape as the tree built by buildDomTree.js.
+
+	@dev elements are not checked for occlusion, every visible element in the viewport counts as top element
+	"""
+
+	def __init__(self, snapshot: dict, viewport_info: ViewportInfo, viewport_expansion: int = 0):
+		self.strings: list[str] = snapshot['strings']
+		self.documents: list[dict] = snapshot['documents']
+		self.viewport_info = viewport_info
+		self.viewport_expansion = viewport_expansion
+
+		# backend node id -> (document index, node index)
+		self.node_locations: dict[int, tuple[int, int]] = {}
+		# per document: node index -> layout bounds [x, y, width, height] in document coordinates
+		self.bounds: list[dict[int, list[float]]] = []
+		self.clickable: list[set[int]] = []
+		self.shadow_hosts: list[set[int]] = []
+		# per document: node index of an iframe -> index of its content document
+		self.content_documents: list[dict[int, int]] = []
+		self.xpath_positions: list[dict[int, int]] = []
+
+		for document_index, document in enumerate(self.documents):
+			nodes = document['nodes']
+			for node_index, backend_node_id in enumerate(nodes['backendNodeId']):
+				self.node_locations[backend_node_id] = (document_index, node_index)
+
+			layout = document['layout']
+			self.bounds.append(dict(zip(layout['nodeIndex'], layout['bounds'])))
+			self.clickable.append(set(nodes.get('isClickable', {}).get('index', [])))
+			self.shadow_hosts.append(
+				{
+					parent_index
+					for node_type, parent_index in zip(nodes['nodeType'], nodes['parentIndex'])
+					if node_type == DOCUMENT_FRAGMENT_NODE
+				}
+			)
+			content_document_index = nodes.get('contentDocumentIndex', {})
+			self.content_documents.append(
+				dict(zip(content_document_index.get('index', []), content_document_index.get('value', [])))
+			)
+			self.xpath_positions.append(self._get_xpath_positions(nodes))
+
+		self.document_offsets = self._get_document_offsets()
+
+	def _get_xpath_positions(self, nodes: dict) -> dict[int, int]:
+		"""1-based position of each element among its siblings with the same tag, only for elements that have such siblings"""
+		positions: dict[int, int] = {}
+		counts: dict[tuple[int, str], int] = defaultdict(int)
+		keys: dict[int, tuple[int, str]] = {}
+		for node_index, (node_type, parent_index, name_index) in enumerate(
+			zip(nodes['nodeType'], nodes['parentIndex'], nodes['nodeName'])
+		):
+			name = self.strings[name_index]
+			if node_type != ELEMENT_NODE or name.startswith('::'):  # pseudo elements are no siblings
+				continue
+			key = (parent_index, name)
+			counts[key] += 1
+			positions[node_index] = counts[key]
+			keys[node_index] = key
+		return {node_index: position for node_index, position in positions.items() if counts[keys[node_index]] > 1}
+
+	def _get_document_offsets(self) -> list[tuple[float, float]]:
+		"""Position of the origin of each document in the viewport (documents of iframes are offset by the iframe)"""
+		owners = {
+			content_document: (document_index, node_index)
+			for document_index, content_documents in enumerate(self.content_documents)
+			for node_index, content_document in content_documents.items()
+		}
+
+		offsets: dict[int, tuple[float, float]] = {}
+		for document_index in range(len(self.documents)):
+			chain = [document_index]
+			while chain[-1] in owners and owners[chain[-1]][0] not in offsets and owners[chain[-1]][0] not in chain:
+				chain.append(owners[chain[-1]][0])
+
+			for current in reversed(chain):
+				if current in offsets:
+					continue
+				document = self.documents[current]
+				x, y = -document.get('scrollOffsetX', 0), -document.get('scrollOffsetY', 0)
+				if current in owners:
+					owner_document, owner_node = owners[current]
+					owner_x, owner_y = offsets.get(owner_document, (0, 0))
+					bounds = self.bounds[owner_document].get(owner_node)
+					if bounds:
+						x, y = x + owner_x + bounds[0], y + owner_y + bounds[1]
+				offsets[current] = (x, y)
+
+		return [offsets[document_index] for document_index in range(len(self.documents))]
+
+	def get_frame_owner(self, frame_id: str) -> int | None:
+		"""Backend node id of the iframe element that contains the document of the frame"""
+		for document_index, document in enumerate(self.documents):
+			if self.strings[document['frameId']] != frame_id:
+				continue
+			for owner_document, content_documents in enumerate(self.content_documents):
+				for node_index, content_document in content_documents.items():
+					if content_document == document_index:
+						return self.documents[owner_document]['nodes']['backendNodeId'][node_index]
+		return None
+
+	def get_xpath(self, document_index: int, node_index: int) -> str:
+		"""xpath from the closest document or shadow root, like getXPathTree in buildDomTree.js"""
+		nodes = self.documents[document_index]['nodes']
+		positions = self.xpath_positions[document_index]
+		segments = []
+		current = node_index
+		while current >= 0 and nodes['nodeType'][current] == ELEMENT_NODE:
+			position = positions.get(current)
+			tag_name = self.strings[nodes['nodeName'][current]].lower()
+			segments.append(f'{tag_name}[{position}]' if position else tag_name)
+			current = nodes['parentIndex'][current]
+		return '/'.join(reversed(segments))
+
+	def get_attributes(self, document_index: int, node_index: int) -> dict[str, str]:
+		attributes = self.documents[document_index]['nodes']['attributes'][node_index]
+		return {self.strings[attributes[i]]: self.strings[attributes[i + 1]] for i in range(0, len(attributes) - 1, 2)}
+
+	def get_viewport_rect(self, document_index: int, node_index: int) -> tuple[float, float, float, float] | None:
+		bounds = self.bounds[document_index].get(node_index)
+		if not bounds or bounds[2] <= 0 or bounds[3] <= 0:
+			return None
+		offset_x, offset_y = self.document_offsets[document_index]
+		return bounds[0] + offset_x, bounds[1] + offset_y, bounds[2], bounds[3]
+
+	def is_in_viewport(self, rect: tuple[float, float, float, float]) -> bool:
+		if self.viewport_expansion == -1:
+			return True
+		x, y, width, height = rect
+		return (
+			y + height > -self.viewport_expansion
+			and y < self.viewport_info.height + self.viewport_expansion
+			and x + width > -self.viewport_expansion
+			and x < self.viewport_info.width + self.viewport_expansion
+		)
+
+	@staticmethod
+	def _coordinate_set(x: float, y: float, width: float, height: float) -> CoordinateSet:
+		x, y, width, height = int(x), int(y), int(width), int(height)
+		return CoordinateSet(
+			top_left=Coordinates(x=x, y=y),
+			top_right=Coordinates(x=x + width, y=y),
+			bottom_left=Coordinates(x=x, y=y + height),
+			bottom_right=Coordinates(x=x + width, y=y + height),
+			center=Coordinates(x=x + width // 2, y=y + height // 2),
+			width=width,
+			height=height,
+		)
+
+	@staticmethod
+	def _is_interactive(ax_node: dict, is_clickable: bool) -> bool:
+		role = ax_node.get('role', {}).get('value', '')
+		if role in DOCUMENT_ROLES:
+			return False
+		if role in INTERACTIVE_ROLES or is_clickable:
+			return True
+		return any(
+			prop.get('name') == 'focusable' and prop.get('value', {}).get('value') for prop in ax_node.get('properties', [])
+		)
+
+	def construct_dom_tree(self, ax_trees: dict[str, list[dict]], main_frame_id: str) -> tuple[DOMElementNode, SelectorMap]:
+		"""
+		ax_trees: the nodes of Accessibility.getFullAXTree per frame id.
+		The trees of child frames are attached below the iframe element that contains them.
+		"""
+		ax_nodes: dict[tuple[str, str], dict] = {}
+		frame_roots: dict[int, tuple[str, str]] = {}  # backend node id of the iframe -> root of the frame's tree
+		for frame_id, nodes in ax_trees.items():
+			if not nodes:
+				continue
+			for ax_node in nodes:
+				ax_nodes[(frame_id, ax_node['nodeId'])] = ax_node
+			if frame_id == main_frame_id:
+				continue
+			owner = self.get_frame_owner(frame_id)
+			if owner is not None:
+				frame_roots[owner] = (frame_id, nodes[0]['nodeId'])
+
+		root = DOMElementNode(
+			tag_name='html', xpath='html', attributes={}, children=[], is_visible=True, parent=None, is_top_element=True
+		)
+		selector_map: SelectorMap = {}
+		names: dict[int, str] = {}  # highlight index -> accessible name
+		if not ax_trees.get(main_frame_id):
+			return root, selector_map
+
+		# pre-order traversal so highlight indices follow the document order
+		stack: list[tuple[tuple[str, str], DOMElementNode]] = [((main_frame_id, ax_trees[main_frame_id][0]['nodeId']), root)]
+		while stack:
+			key, parent = stack.pop()
+			ax_node = ax_nodes.get(key)
+			if ax_node is None:
+				continue
+			frame_id = key[0]
+			role = ax_node.get('role', {}).get('value', '')
+			if role == 'InlineTextBox':
+				continue
+
+			location = self.node_locations.get(ax_node.get('backendDOMNodeId', -1))
+			node_parent = parent
+
+			if not ax_node.get('ignored') and location is not None:
+				document_index, node_index = location
+				rect = self.get_viewport_rect(document_index, node_index)
+				node_type = self.documents[document_index]['nodes']['nodeType'][node_index]
+
+				if role == 'StaticText':
+					text = ax_node.get('name', {}).get('value', '').strip()
+					if text:
+						is_visible = rect is not None and self.is_in_viewport(rect)
+						parent.children.append(DOMTextNode(text=text, is_visible=is_visible, parent=parent))
+					continue
+
+				tag_name = self.strings[self.documents[document_index]['nodes']['nodeName'][node_index]].lower()
+				if node_type == ELEMENT_NODE and tag_name not in ('html', 'body'):
+					node_parent = self._create_element(ax_node, document_index, node_index, tag_name, rect, parent, selector_map)
+					if node_parent.highlight_index is not None:
+						names[node_parent.highlight_index] = ax_node.get('name', {}).get('value', '').strip()
+
+			children = [(frame_id, child_id) for child_id in ax_node.get('childIds', [])]
+			frame_root = frame_roots.get(ax_node.get('backendDOMNodeId', -1))
+			if frame_root is not None:
+				children.append(frame_root)
+			stack.extend((child, node_parent) for child in reversed(children))
+
+		# elements named only by aria-label, title or alt have no text in the tree, show their accessible name instead
+		for highlight_index, element in selector_map.items():
+			if names[highlight_index] and not element.get_all_text_till_next_clickable_element():
+				element.children.append(DOMTextNode(text=names[highlight_index], is_visible=element.is_visible, parent=element))
+
+		return root, selector_map
+
+	def _create_element(
+		self,
+		ax_node: dict,
+		document_index: int,
+		node_index: int,
+		tag_name: str,
+		rect: tuple[float, float, float, float] | None,
+		parent: DOMElementNode,
+		selector_map: SelectorMap,
+	) -> DOMElementNode:
+		is_visible = rect is not None
+		is_in_viewport = is_visible and self.is_in_viewport(rect)
+		is_interactive = self._is_interactive(ax_node, node_index in self.clickable[document_index])
+
+		viewport_coordinates = page_coordinates = None
+		if rect is not None:
+			viewport_coordinates = self._coordinate_set(*rect)
+			page_coordinates = self._coordinate_set(
+				rect[0] + self.viewport_info.scroll_x, rect[1] + self.viewport_info.scroll_y, rect[2], rect[3]
+			)
+
+		element = DOMElementNode(
+			tag_name=tag_name,
+			xpath=self.get_xpath(document_index, node_index),
+			attributes=self.get_attributes(document_index, node_index),
+			children=[],
+			is_visible=is_visible,
+			is_interactive=is_interactive,
+			is_top_element=is_in_viewport,
+			is_in_viewport=is_in_viewport,
+			shadow_root=node_index in self.shadow_hosts[document_index],
+			parent=parent,
+			viewport_coordinates=viewport_coordinates,
+			page_coordinates=page_coordinates,
+			viewport_info=self.viewport_info,
+		)
+		if is_interactive and is_in_viewport:
+			element.highlight_index = len(selector_map)
+			selector_map[element.highlight_index] = element
+		parent.children.append(element)
+		return element
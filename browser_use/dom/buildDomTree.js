@@ -4,9 +4,26 @@
     focusHighlightIndex: -1,
     viewportExpansion: 0,
     debugMode: false,
+    extractionId: null,
+    highlightRenderer: 'dom',
+    viewportOffsetY: 0,
+    validateExtractionId: null,
+    expectedMutationEpoch: null,
+    highlightExtractionId: null,
+    highlightIndexOffset: 0,
+    maxNodes: 0,
+    timeBudgetMs: 0,
+    chunkSize: 0,
   }
 ) => {
-  const { doHighlightElements, focusHighlightIndex, viewportExpansion, debugMode } = args;
+  const { doHighlightElements, focusHighlightIndex, viewportExpansion, debugMode, extractionId, highlightRenderer } = args;
+  // Extracts the page as if it was scrolled down by this many pixels (negative: up), without scrolling it
+  const viewportOffsetY = args.viewportOffsetY || 0;
+  // Budgets of a single extraction (0: unlimited). Once one is used up the traversal stops and reports a truncation.
+  const maxNodes = args.maxNodes || 0;
+  const timeBudgetMs = args.timeBudgetMs || 0;
+  const hasBudget = maxNodes > 0 || timeBudgetMs > 0;
+  const BUDGET = { start: 0, visitedNodes: 0, skippedSubtrees: 0, reason: null, slotParents: [] };
   let highlightIndex = 0; // Reset highlight index
 
   // Add timing stack to handle recursion
@@ -53,6 +70,8 @@
       overallHitRate: 0,
       clientRectsCacheHits: 0,
       clientRectsCacheMisses: 0,
+      hitTestCacheHits: 0,
+      hitTestCacheMisses: 0,
     },
     nodeMetrics: {
       totalNodes: 0,
@@ -214,9 +233,35 @@
 
   const HIGHLIGHT_CONTAINER_ID = "playwright-highlight-container";
 
+  /**
+   * Highlighted nodes indexed by their highlight index. Kept on the window under the extraction id,
+   * so actions can resolve an element handle directly instead of regenerating a selector for it.
+   */
+  const NODE_REFS = [];
+  const NODE_REFS_KEY = "__browserUseNodeRefs";
+  // Older extractions are dropped, their node references would keep detached subtrees alive.
+  // Room for the current extraction, the prefetched viewport tiles next to it and one spare.
+  const MAX_NODE_REF_EXTRACTIONS = 4;
+  // Node maps kept for the caller to pull in batches instead of returning them at once (args.chunkSize)
+  const CHUNKS_KEY = "__browserUseExtractionChunks";
+
   // Add a WeakMap cache for XPath strings
   const xpathCache = new WeakMap();
 
+  const MUTATION_EPOCH_KEY = "__browserUseMutationEpoch";
+  const MUTATION_OBSERVER_OPTIONS = { childList: true, subtree: true, attributes: true, characterData: true };
+  // The observer is disconnected once no extraction used it for this long, the next one connects it again
+  const MUTATION_OBSERVER_IDLE_MS = 60000;
+  // Events of layout changes without DOM mutations (loaded images and fonts, finished transitions and animations)
+  const LAYOUT_CHANGE_EVENTS = ['scroll', 'load', 'transitionend', 'animationend'];
+  const HIT_TEST_CACHE_KEY = "__browserUseHitTestCache";
+  const MAX_CACHED_HIT_TEST_VIEWPORTS = 8;
+  // Hit test results by point, resolved lazily on the first top element check
+  let documentHitTests = null;
+  const shadowRootHitTests = new WeakMap();
+  // Viewport shift per element, only used when extracting an off-screen tile (see getViewportOffset)
+  const viewportOffsetCache = new WeakMap();
+
   // Initialize once and reuse
   const viewportObserver = new IntersectionObserver(
     (entries) => {
@@ -468,6 +513,175 @@
     if (container) container.remove();
   }
 
+  /**
+   * Highlights queued for the canvas renderer, drawn in one pass once the tree is built.
+   */
+  const CANVAS_HIGHLIGHTS = [];
+
+  const HIGHLIGHT_COLORS = [
+    "#FF0000",
+    "#00FF00",
+    "#0000FF",
+    "#FFA500",
+    "#800080",
+    "#008080",
+    "#FF69B4",
+    "#4B0082",
+    "#FF4500",
+    "#2E8B57",
+    "#DC143C",
+    "#4682B4",
+  ];
+
+  /**
+   * Queues an element for the canvas renderer, same signature as highlightElement.
+   */
+  function queueCanvasHighlight(element, index, parentIframe = null) {
+    if (!element) return index;
+    CANVAS_HIGHLIGHTS.push({ element, index, parentIframe });
+    return index + 1;
+  }
+
+  /**
+   * Draws all queued highlights onto a single canvas inside the highlight container.
+   *
+   * Compared to the DOM renderer (two or more positioned divs and two listeners per element),
+   * this adds one element to the page, redraws everything from one shared scroll/resize handler
+   * and is cleared by removing the container.
+   */
+  function renderCanvasHighlights() {
+    if (CANVAS_HIGHLIGHTS.length === 0) return;
+    pushTiming('highlighting');
+
+    try {
+      let container = document.getElementById(HIGHLIGHT_CONTAINER_ID);
+      if (!container) {
+        container = document.createElement("div");
+        container.id = HIGHLIGHT_CONTAINER_ID;
+        container.style.position = "fixed";
+        container.style.pointerEvents = "none";
+        container.style.top = "0";
+        container.style.left = "0";
+        container.style.width = "100%";
+        container.style.height = "100%";
+        container.style.zIndex = "2147483640";
+        container.style.backgroundColor = 'transparent';
+        document.body.appendChild(container);
+      }
+
+      const canvas = document.createElement("canvas");
+      canvas.style.position = "fixed";
+      canvas.style.top = "0";
+      canvas.style.left = "0";
+      canvas.style.pointerEvents = "none";
+      container.appendChild(canvas);
+      const ctx = canvas.getContext("2d");
+      if (!ctx) return;
+
+      const highlights = CANVAS_HIGHLIGHTS.slice();
+
+      const draw = () => {
+        const dpr = window.devicePixelRatio || 1;
+        const width = window.innerWidth;
+        const height = window.innerHeight;
+        if (canvas.width !== Math.round(width * dpr) || canvas.height !== Math.round(height * dpr)) {
+          canvas.width = Math.round(width * dpr);
+          canvas.height = Math.round(height * dpr);
+          canvas.style.width = `${width}px`;
+          canvas.style.height = `${height}px`;
+        }
+        ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+        ctx.clearRect(0, 0, width, height);
+
+        // Labels go on top of all boxes
+        const labels = [];
+        for (const { element, index, parentIframe } of highlights) {
+          const rects = element.getClientRects();
+          if (!rects || rects.length === 0) continue;
+
+          const baseColor = HIGHLIGHT_COLORS[index % HIGHLIGHT_COLORS.length];
+          const iframeOffset = { x: 0, y: 0 };
+          if (parentIframe) {
+            const iframeRect = parentIframe.getBoundingClientRect();
+            iframeOffset.x = iframeRect.left;
+            iframeOffset.y = iframeRect.top;
+          }
+
+          ctx.lineWidth = 2;
+          ctx.strokeStyle = baseColor;
+          ctx.fillStyle = baseColor + "1A"; // 10% opacity version of the color
+          for (const rect of rects) {
+            if (rect.width === 0 || rect.height === 0) continue; // Skip empty rects
+            const left = rect.left + iframeOffset.x;
+            const top = rect.top + iframeOffset.y;
+            if (top > height || left > width || top + rect.height < 0 || left + rect.width < 0) continue;
+            ctx.fillRect(left, top, rect.width, rect.height);
+            // border drawn inside the box, like the DOM renderer's border-box overlays
+            ctx.strokeRect(left + 1, top + 1, rect.width - 2, rect.height - 2);
+          }
+          labels.push({ rect: rects[0], index, baseColor, iframeOffset });
+        }
+
+        ctx.textBaseline = "top";
+        for (const { rect, index, baseColor, iframeOffset } of labels) {
+          const fontSize = Math.min(12, Math.max(8, rect.height / 2));
+          ctx.font = `${fontSize}px sans-serif`;
+          const labelWidth = ctx.measureText(String(index)).width + 8;
+          const labelHeight = fontSize + 4;
+
+          const rectTop = rect.top + iframeOffset.y;
+          const rectLeft = rect.left + iframeOffset.x;
+          let labelTop = rectTop + 2;
+          let labelLeft = rectLeft + rect.width - labelWidth - 2;
+
+          // Adjust label position if the rect is too small
+          if (rect.width < labelWidth + 4 || rect.height < labelHeight + 4) {
+            labelTop = rectTop - labelHeight - 2;
+            labelLeft = rectLeft + rect.width - labelWidth; // Align with right edge
+            if (labelLeft < iframeOffset.x) labelLeft = rectLeft; // Prevent going off-left
+          }
+
+          labelTop = Math.max(0, Math.min(labelTop, height - labelHeight));
+          labelLeft = Math.max(0, Math.min(labelLeft, width - labelWidth));
+
+          ctx.fillStyle = baseColor;
+          ctx.beginPath();
+          if (ctx.roundRect) {
+            ctx.roundRect(labelLeft, labelTop, labelWidth, labelHeight, 4);
+          } else {
+            ctx.rect(labelLeft, labelTop, labelWidth, labelHeight);
+          }
+          ctx.fill();
+          ctx.fillStyle = "white";
+          ctx.fillText(String(index), labelLeft + 4, labelTop + 2);
+        }
+      };
+
+      draw();
+
+      // One shared handler for all highlights, redrawing at most once per frame
+      let frameRequested = false;
+      const scheduleDraw = () => {
+        if (frameRequested) return;
+        frameRequested = true;
+        requestAnimationFrame(() => {
+          frameRequested = false;
+          if (canvas.isConnected) draw();
+        });
+      };
+      window.addEventListener('scroll', scheduleDraw, true);
+      window.addEventListener('resize', scheduleDraw);
+
+      (window._highlightCleanupFunctions = window._highlightCleanupFunctions || []).push(() => {
+        window.removeEventListener('scroll', scheduleDraw, true);
+        window.removeEventListener('resize', scheduleDraw);
+        canvas.remove();
+      });
+    } finally {
+      popTiming('highlighting');
+    }
+  }
+
   function getElementPosition(currentElement) {
     if (!currentElement.parentElement) {
       return 0; // No parent means no siblings
@@ -553,6 +767,7 @@
 
       let isAnyRectVisible = false;
       let isAnyRectInViewport = false;
+      const offsetY = getViewportOffset(textNode.parentElement);
 
       for (const rect of rects) {
         // Check size
@@ -560,12 +775,7 @@
           isAnyRectVisible = true;
 
           // Viewport check for this rect
-          if (!(
-            rect.bottom < -viewportExpansion ||
-            rect.top > window.innerHeight + viewportExpansion ||
-            rect.right < -viewportExpansion ||
-            rect.left > window.innerWidth + viewportExpansion
-          )) {
+          if (isRectInExpandedViewport(rect, offsetY)) {
             isAnyRectInViewport = true;
             break; // Found a visible rect in viewport, no need to check others
           }
@@ -636,6 +846,47 @@
     );
   }
 
+  /**
+   * Bits of the event types recorded by the event listener tracker injected with the browser context init script.
+   * Must stay in sync with the tracker (see BrowserContext._create_context).
+   */
+  const EVENT_LISTENER_BITS = {
+    click: 1, mousedown: 2, mouseup: 4, dblclick: 8,
+    pointerdown: 16, pointerup: 32, keydown: 64, keyup: 128,
+    submit: 256, change: 512, input: 1024, focus: 2048, blur: 4096,
+  };
+  const MOUSE_EVENT_LISTENER_MASK =
+    EVENT_LISTENER_BITS.click | EVENT_LISTENER_BITS.mousedown | EVENT_LISTENER_BITS.mouseup | EVENT_LISTENER_BITS.dblclick;
+  const DISTINCT_INTERACTION_EVENT_LISTENER_MASK =
+    EVENT_LISTENER_BITS.mousedown | EVENT_LISTENER_BITS.mouseup | EVENT_LISTENER_BITS.keydown | EVENT_LISTENER_BITS.keyup |
+    EVENT_LISTENER_BITS.submit | EVENT_LISTENER_BITS.change | EVENT_LISTENER_BITS.input |
+    EVENT_LISTENER_BITS.focus | EVENT_LISTENER_BITS.blur;
+
+  // Root containers of frameworks that delegate the events of the whole app to them (React, Vue, Angular, Next.js, Nuxt)
+  const DELEGATING_ROOT_SELECTOR = '#root, #app, #__next, #__nuxt, [data-reactroot], [data-v-app], [ng-version]';
+
+  /**
+   * Returns the bitmask of interaction event types the element listens to, 0 if unknown.
+   * Listeners of the containers frameworks delegate the events of the whole app to are left out, the descendants are
+   * the interactive elements - an interactive root would suppress their highlight indexes.
+   */
+  function getEventListenerMask(element) {
+    const getMask = window.getEventListenerMaskForNode;
+    if (typeof getMask !== 'function') return 0;
+    const mask = getMask(element);
+    if (!mask || isDelegatingRoot(element)) return 0;
+    return mask;
+  }
+
+  /**
+   * Only cheap checks of the element itself, the mask is read for every node of the page.
+   * Other elements with listeners and interactive descendants (a card that wraps a link) are real click targets.
+   */
+  function isDelegatingRoot(element) {
+    if (element === document.documentElement || element === document.body) return true;
+    return !!element._reactRootContainer || element.matches(DELEGATING_ROOT_SELECTOR);
+  }
+
   /**
    * Checks if an element is interactive.
    * 
@@ -825,25 +1076,13 @@
     if (hasInteractiveRole) return true;
 
     // check whether element has event listeners
-    try {
-      if (typeof getEventListeners === 'function') {
-        const listeners = getEventListeners(element);
-        const mouseEvents = ['click', 'mousedown', 'mouseup', 'dblclick'];
-        for (const eventType of mouseEvents) {
-          if (listeners[eventType] && listeners[eventType].length > 0) {
-            return true; // Found a mouse interaction listener
-          }
-        }
-      } else {
-        // Fallback: Check common event attributes if getEventListeners is not available
-        const commonMouseAttrs = ['onclick', 'onmousedown', 'onmouseup', 'ondblclick'];
-        if (commonMouseAttrs.some(attr => element.hasAttribute(attr))) {
-          return true;
-        }
-      }
-    } catch (e) {
-      // console.warn(`Could not check event listeners for ${element.tagName}:`, e);
-      // If checking listeners fails, rely on other checks
+    if (getEventListenerMask(element) & MOUSE_EVENT_LISTENER_MASK) {
+      return true; // Found a mouse interaction listener
+    }
+    // Inline handlers never go through addEventListener, check common event attributes as well
+    const commonMouseAttrs = ['onclick', 'onmousedown', 'onmouseup', 'ondblclick'];
+    if (commonMouseAttrs.some(attr => element.hasAttribute(attr))) {
+      return true;
     }
 
     return false
@@ -865,15 +1104,11 @@
       return false; // No geometry, cannot be top
     }
 
+    const offsetY = getViewportOffset(element);
     let isAnyRectInViewport = false;
     for (const rect of rects) {
       // Use the same logic as isInExpandedViewport check
-      if (rect.width > 0 && rect.height > 0 && !( // Only check non-empty rects
-        rect.bottom < -viewportExpansion ||
-        rect.top > window.innerHeight + viewportExpansion ||
-        rect.right < -viewportExpansion ||
-        rect.left > window.innerWidth + viewportExpansion
-      )) {
+      if (rect.width > 0 && rect.height > 0 && isRectInExpandedViewport(rect, offsetY)) { // Only check non-empty rects
         isAnyRectInViewport = true;
         break;
       }
@@ -883,6 +1118,11 @@
       return false; // All rects are outside the viewport area
     }
 
+    // Off-screen tiles can't be hit tested, they are checked once the page was actually scrolled there
+    if (offsetY !== 0) {
+      return true;
+    }
+
 
     // Find the correct document context and root element
     let doc = element.ownerDocument;
@@ -894,44 +1134,236 @@
 
     // For shadow DOM, we need to check within its own root context
     const shadowRoot = element.getRootNode();
-    if (shadowRoot instanceof ShadowRoot) {
-      const centerX = rects[Math.floor(rects.length / 2)].left + rects[Math.floor(rects.length / 2)].width / 2;
-      const centerY = rects[Math.floor(rects.length / 2)].top + rects[Math.floor(rects.length / 2)].height / 2;
+    const centerX = rects[Math.floor(rects.length / 2)].left + rects[Math.floor(rects.length / 2)].width / 2;
+    const centerY = rects[Math.floor(rects.length / 2)].top + rects[Math.floor(rects.length / 2)].height / 2;
 
-      try {
-        const topEl = measureDomOperation(
-          () => shadowRoot.elementFromPoint(centerX, centerY),
-          'elementFromPoint'
-        );
-        if (!topEl) return false;
-
-        let current = topEl;
-        while (current && current !== shadowRoot) {
-          if (current === element) return true;
-          current = current.parentElement;
+    try {
+      if (shadowRoot instanceof ShadowRoot) {
+        const topEl = getTopElementAt(shadowRoot, centerX, centerY);
+        // the top element is the element itself or one of its descendants
+        return !!topEl && element.contains(topEl);
+      }
+
+      // For elements in viewport, check if they're topmost
+      const topEl = getTopElementAt(document, centerX, centerY);
+      return !!topEl && topEl !== document.documentElement && element.contains(topEl);
+    } catch (e) {
+      return true;
+    }
+  }
+
+  /**
+   * Resolves the topmost element at a point of a document or shadow root.
+   *
+   * Nested wrappers mostly share their center point, so every point is hit tested only once.
+   * The document's results are kept on the window and reused by later extractions,
+   * as long as the scroll position, viewport size and DOM are unchanged (see getMutationEpoch).
+   */
+  function getTopElementAt(root, x, y) {
+    let points;
+    if (root === document) {
+      if (!documentHitTests) documentHitTests = getDocumentHitTestCache();
+      points = documentHitTests;
+    } else {
+      points = shadowRootHitTests.get(root);
+      if (!points) {
+        points = new Map();
+        shadowRootHitTests.set(root, points);
+      }
+    }
+
+    const pointKey = `${x},${y}`;
+    if (points.has(pointKey)) {
+      if (debugMode) PERF_METRICS.cacheMetrics.hitTestCacheHits++;
+      return points.get(pointKey);
+    }
+
+    if (debugMode) PERF_METRICS.cacheMetrics.hitTestCacheMisses++;
+    const topEl = measureDomOperation(() => root.elementFromPoint(x, y), 'elementFromPoint');
+    points.set(pointKey, topEl);
+    return topEl;
+  }
+
+  /**
+   * Returns the cached document hit tests for the current scroll position and viewport size.
+   */
+  function getDocumentHitTestCache() {
+    const epoch = getMutationEpoch();
+    let cache = window[HIT_TEST_CACHE_KEY];
+    if (!cache || cache.epoch !== epoch) {
+      cache = window[HIT_TEST_CACHE_KEY] = { epoch, viewports: new Map() };
+    }
+
+    const viewportKey = `${window.scrollX},${window.scrollY},${window.innerWidth},${window.innerHeight}`;
+    let points = cache.viewports.get(viewportKey);
+    if (!points) {
+      points = new Map();
+      cache.viewports.set(viewportKey, points);
+      while (cache.viewports.size > MAX_CACHED_HIT_TEST_VIEWPORTS) {
+        cache.viewports.delete(cache.viewports.keys().next().value);
+      }
+    }
+    return points;
+  }
+
+  /**
+   * Checks if a mutation record only comes from our own highlight overlay.
+   */
+  function isHighlightMutation(record) {
+    if (record.type === 'attributes' && record.attributeName === 'browser-user-highlight-id') return true;
+
+    const isHighlightNode = (node) => {
+      const element = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+      return !!element && (element.id === HIGHLIGHT_CONTAINER_ID || !!element.closest?.(`#${HIGHLIGHT_CONTAINER_ID}`));
+    };
+    if (isHighlightNode(record.target)) return true;
+
+    if (record.type === 'childList') {
+      const changedNodes = [...record.addedNodes, ...record.removedNodes];
+      return changedNodes.length > 0 && changedNodes.every(isHighlightNode);
+    }
+    return false;
+  }
+
+  /**
+   * Returns a counter that is bumped whenever the page DOM or its layout changed, or a scroll container scrolled.
+   *
+   * The observer is installed once per document and outlives the extraction, so later extractions
+   * can tell whether results computed by an earlier one are still valid. It is disconnected when idle
+   * (see MUTATION_OBSERVER_IDLE_MS) or on cleanup, which bumps the counter as changes are no longer tracked.
+   */
+  function getMutationEpoch() {
+    let state = window[MUTATION_EPOCH_KEY];
+    if (!state) {
+      state = window[MUTATION_EPOCH_KEY] = { value: 0, observer: null, observedRoots: null, idleTimer: null };
+      state.bump = () => { state.value++; };
+      // Scrolled containers move elements without mutating the DOM, the window scroll position is part of the cache keys
+      state.onLayoutChange = (event) => {
+        if (event.target !== document) state.bump();
+      };
+      state.disconnect = () => {
+        if (!state.observer) return;
+        state.observer.disconnect();
+        state.observer = null;
+        state.observedRoots = null;
+        clearTimeout(state.idleTimer);
+        for (const type of LAYOUT_CHANGE_EVENTS) {
+          document.removeEventListener(type, state.onLayoutChange, { capture: true });
         }
-        return false;
-      } catch (e) {
-        return true;
+        document.fonts?.removeEventListener('loadingdone', state.bump);
+        delete window[HIT_TEST_CACHE_KEY];
+        state.bump();
+      };
+    }
+
+    if (!state.observer) {
+      state.observer = new MutationObserver((records) => {
+        if (records.some(record => !isHighlightMutation(record))) state.bump();
+      });
+      state.observer.observe(document, MUTATION_OBSERVER_OPTIONS);
+      state.observedRoots = new WeakSet();
+      for (const type of LAYOUT_CHANGE_EVENTS) {
+        document.addEventListener(type, state.onLayoutChange, { capture: true, passive: true });
       }
+      document.fonts?.addEventListener('loadingdone', state.bump);
     }
+    clearTimeout(state.idleTimer);
+    state.idleTimer = setTimeout(state.disconnect, MUTATION_OBSERVER_IDLE_MS);
 
-    // For elements in viewport, check if they're topmost
-    const centerX = rects[Math.floor(rects.length / 2)].left + rects[Math.floor(rects.length / 2)].width / 2;
-    const centerY = rects[Math.floor(rects.length / 2)].top + rects[Math.floor(rects.length / 2)].height / 2;
+    // Records of mutations that happened right before this call were not delivered to the callback yet
+    if (state.observer.takeRecords().some(record => !isHighlightMutation(record))) state.bump();
+    return state.value;
+  }
 
-    try {
-      const topEl = document.elementFromPoint(centerX, centerY);
-      if (!topEl) return false;
+  /**
+   * Shadow roots are not covered by the document observer, observe them as they are discovered.
+   */
+  function observeShadowRoot(shadowRoot) {
+    const state = window[MUTATION_EPOCH_KEY];
+    if (!state || !state.observer || state.observedRoots.has(shadowRoot)) return;
+    state.observedRoots.add(shadowRoot);
+    state.observer.observe(shadowRoot, MUTATION_OBSERVER_OPTIONS);
+  }
+
+  /**
+   * Checks if a client rect is within the expanded viewport, shifted down by offsetY pixels.
+   */
+  function isRectInExpandedViewport(rect, offsetY) {
+    return !(
+      rect.bottom < offsetY - viewportExpansion ||
+      rect.top > offsetY + window.innerHeight + viewportExpansion ||
+      rect.right < -viewportExpansion ||
+      rect.left > window.innerWidth + viewportExpansion
+    );
+  }
 
-      let current = topEl;
-      while (current && current !== document.documentElement) {
-        if (current === element) return true;
-        current = current.parentElement;
+  /**
+   * Returns how far the viewport is shifted for an element when extracting an off-screen tile.
+   * Fixed and sticky elements (and everything inside them) move along with the viewport, they are not shifted.
+   */
+  function getViewportOffset(element) {
+    if (viewportOffsetY === 0 || !element) return 0;
+
+    // Walk up until an ancestor with a known offset, without recursion (pages can be very deep)
+    const uncached = [];
+    let current = element;
+    let offsetY = viewportOffsetY;
+    while (current) {
+      if (viewportOffsetCache.has(current)) {
+        offsetY = viewportOffsetCache.get(current);
+        break;
       }
-      return false;
-    } catch (e) {
-      return true;
+      uncached.push(current);
+      const style = getCachedComputedStyle(current);
+      if (style && (style.position === 'fixed' || style.position === 'sticky')) {
+        offsetY = 0;
+        break;
+      }
+      current = current.parentElement || current.getRootNode()?.host;
+    }
+
+    for (const node of uncached) {
+      viewportOffsetCache.set(node, offsetY);
+    }
+    return offsetY;
+  }
+
+  /**
+   * Checks whether the highlighted nodes of an earlier extraction (a prefetched viewport tile)
+   * are still valid now that the page is scrolled to that tile, and highlights them if requested.
+   * The DOM must be unchanged since the extraction and every highlighted node must be the top element now.
+   */
+  function validateExtraction(id, mutationEpoch) {
+    const nodeRefs = window[NODE_REFS_KEY]?.get(id);
+    if (!nodeRefs || getMutationEpoch() !== mutationEpoch) {
+      return { valid: false };
+    }
+
+    for (const node of nodeRefs) {
+      if (!node || !node.isConnected || !isTopElement(node)) {
+        return { valid: false };
+      }
+    }
+
+    if (doHighlightElements) {
+      highlightExtraction(nodeRefs);
+    }
+
+    return { valid: true };
+  }
+
+  /**
+   * Highlights the nodes of an earlier extraction, numbered from the given offset on.
+   * Frames extracted on their own only learn their offset in the global highlight index space once all frames are done.
+   */
+  function highlightExtraction(nodeRefs, indexOffset = 0) {
+    nodeRefs.forEach((node, index) => {
+      if (!node || !node.isConnected) return;
+      if (focusHighlightIndex >= 0 && focusHighlightIndex !== index + indexOffset) return;
+      highlightElement(node, index + indexOffset, node.ownerDocument.defaultView?.frameElement || null);
+    });
+    if (highlightRenderer === 'canvas') {
+      renderCanvasHighlights();
     }
   }
 
@@ -944,6 +1376,7 @@
     }
 
     const rects = element.getClientRects(); // Use getClientRects
+    const offsetY = getViewportOffset(element);
 
     if (!rects || rects.length === 0) {
       // Fallback to getBoundingClientRect if getClientRects is empty,
@@ -952,24 +1385,14 @@
       if (!boundingRect || boundingRect.width === 0 || boundingRect.height === 0) {
         return false;
       }
-      return !(
-        boundingRect.bottom < -viewportExpansion ||
-        boundingRect.top > window.innerHeight + viewportExpansion ||
-        boundingRect.right < -viewportExpansion ||
-        boundingRect.left > window.innerWidth + viewportExpansion
-      );
+      return isRectInExpandedViewport(boundingRect, offsetY);
     }
 
     // Check if *any* client rect is within the viewport
     for (const rect of rects) {
       if (rect.width === 0 || rect.height === 0) continue; // Skip empty rects
 
-      if (!(
-        rect.bottom < -viewportExpansion ||
-        rect.top > window.innerHeight + viewportExpansion ||
-        rect.right < -viewportExpansion ||
-        rect.left > window.innerWidth + viewportExpansion
-      )) {
+      if (isRectInExpandedViewport(rect, offsetY)) {
         return true; // Found at least one rect in the viewport
       }
     }
@@ -1071,26 +1494,13 @@
       return true;
     }
     // Check for other common interaction event listeners
-    try {
-      const getEventListeners = window.getEventListenersForNode;
-      if (typeof getEventListeners === 'function') {
-        const listeners = getEventListeners(element);
-        const interactionEvents = ['mousedown', 'mouseup', 'keydown', 'keyup', 'submit', 'change', 'input', 'focus', 'blur'];
-        for (const eventType of interactionEvents) {
-          if (listeners[eventType] && listeners[eventType].length > 0) {
-            return true; // Found a common interaction listener
-          }
-        }
-      } else {
-        // Fallback: Check common event attributes if getEventListeners is not available
-        const commonEventAttrs = ['onmousedown', 'onmouseup', 'onkeydown', 'onkeyup', 'onsubmit', 'onchange', 'oninput', 'onfocus', 'onblur'];
-        if (commonEventAttrs.some(attr => element.hasAttribute(attr))) {
-          return true;
-        }
-      }
-    } catch (e) {
-      // console.warn(`Could not check event listeners for ${element.tagName}:`, e);
-      // If checking listeners fails, rely on other checks
+    if (getEventListenerMask(element) & DISTINCT_INTERACTION_EVENT_LISTENER_MASK) {
+      return true; // Found a common interaction listener
+    }
+    // Inline handlers never go through addEventListener, check common event attributes as well
+    const commonEventAttrs = ['onmousedown', 'onmouseup', 'onkeydown', 'onkeyup', 'onsubmit', 'onchange', 'oninput', 'onfocus', 'onblur'];
+    if (commonEventAttrs.some(attr => element.hasAttribute(attr))) {
+      return true;
     }
 
 
@@ -1100,6 +1510,35 @@
   }
   // --- End distinct interaction check ---
 
+  /**
+   * Records where a highlighted element is, relative to the top viewport and to the page,
+   * so highlights can also be drawn outside of the page (e.g. onto the screenshot).
+   */
+  function addCoordinates(nodeData, node, parentIframe) {
+    const rect = getCachedBoundingRect(node);
+    if (!rect) return;
+
+    let x = rect.left;
+    let y = rect.top;
+    if (parentIframe) {
+      const iframeRect = getCachedBoundingRect(parentIframe);
+      if (iframeRect) {
+        x += iframeRect.left;
+        y += iframeRect.top;
+      }
+    }
+
+    const offsetY = getViewportOffset(node);
+    nodeData.viewportCoordinates = { x, y: y - offsetY, width: rect.width, height: rect.height };
+    nodeData.pageCoordinates = { x: x + window.scrollX, y: y + window.scrollY, width: rect.width, height: rect.height };
+    nodeData.viewport = {
+      scrollX: window.scrollX,
+      scrollY: window.scrollY + viewportOffsetY,
+      width: window.innerWidth,
+      height: window.innerHeight,
+    };
+  }
+
   /**
    * Handles the logic for deciding whether to highlight an element and performing the highlight.
    */
@@ -1128,6 +1567,8 @@
       // regardless of viewport status
       if (nodeData.isInViewport || viewportExpansion === -1) {
         nodeData.highlightIndex = highlightIndex++;
+        NODE_REFS[nodeData.highlightIndex] = node;
+        addCoordinates(nodeData, node, parentIframe);
 
         if (doHighlightElements) {
           if (focusHighlightIndex >= 0) {
@@ -1137,90 +1578,127 @@
           } else {
             highlightElement(node, nodeData.highlightIndex, parentIframe);
           }
-          return true; // Successfully highlighted
         }
+        // The children are suppressed whether or not the highlights are drawn, so extractions without drawing
+        // (highlight_elements=False, the screenshot renderer, the prefetched viewport tiles) get the same indexes
+        return true;
       } else {
         // console.log(`Skipping highlight for ${nodeData.tagName} (outside viewport)`);
       }
     }
 
-    return false; // Did not highlight
+    return false; // Did not get an index
   }
 
   /**
-   * Creates a node data object for a given node and its descendants.
+   * Returns the XPath segments of all element children of a parent, in a single pass over its children.
+   * Same result as getElementPosition for every child, without rescanning the siblings per child.
    */
-  function buildDomTree(node, parentIframe = null, isParentHighlighted = false) {
-    // Fast rejection checks first
-    if (!node || node.id === HIGHLIGHT_CONTAINER_ID || 
-        (node.nodeType !== Node.ELEMENT_NODE && node.nodeType !== Node.TEXT_NODE)) {
-      if (debugMode) PERF_METRICS.nodeMetrics.skippedNodes++;
-      return null;
+  function getChildXPathSegments(parent) {
+    const segments = new Map();
+    if (!parent) return segments;
+
+    const counts = Object.create(null);
+    for (const child of parent.children) {
+      const tagName = child.nodeName.toLowerCase();
+      counts[tagName] = (counts[tagName] || 0) + 1;
     }
 
-    if (debugMode) PERF_METRICS.nodeMetrics.totalNodes++;
-
-    if (!node || node.id === HIGHLIGHT_CONTAINER_ID) {
-      if (debugMode) PERF_METRICS.nodeMetrics.skippedNodes++;
-      return null;
+    const positions = Object.create(null);
+    for (const child of parent.children) {
+      const tagName = child.nodeName.toLowerCase();
+      if (counts[tagName] === 1) {
+        segments.set(child, tagName);
+      } else {
+        positions[tagName] = (positions[tagName] || 0) + 1;
+        segments.set(child, `${tagName}[${positions[tagName]}]`);
+      }
     }
+    return segments;
+  }
 
-    // Special handling for root node (body)
-    if (node === document.body) {
-      const nodeData = {
-        tagName: 'body',
-        attributes: {},
-        xpath: '/body',
-        children: [],
-      };
-
-      // Process children of body
-      for (const child of node.childNodes) {
-        const domElement = buildDomTree(child, parentIframe, false); // Body's children have no highlighted parent initially
-        if (domElement) nodeData.children.push(domElement);
+  /**
+   * Pushes the visit tasks of a node's children in reverse order, so they are popped in document order.
+   * The XPath of every child is derived from its parent's XPath instead of walking up the ancestors again.
+   */
+  function pushChildTasks(stack, childNodes, parentData, parentIframe, isParentHighlighted, xpathPrefix, segments) {
+    for (let i = childNodes.length - 1; i >= 0; i--) {
+      const child = childNodes[i];
+      let xpath = null;
+      if (child.nodeType === Node.ELEMENT_NODE) {
+        if (child.parentNode instanceof ShadowRoot || child.parentNode instanceof HTMLIFrameElement) {
+          // XPaths restart below shadow roots and iframes
+          xpath = "";
+        } else {
+          const segment = segments.get(child) || child.nodeName.toLowerCase();
+          xpath = xpathPrefix ? `${xpathPrefix}/${segment}` : segment;
+        }
       }
+      stack.push({ node: child, parentData, parentIframe, isParentHighlighted, xpath });
+    }
+  }
 
-      const id = `${ID.current++}`;
-      DOM_HASH_MAP[id] = nodeData;
-      if (debugMode) PERF_METRICS.nodeMetrics.processedNodes++;
-      return id;
+  /**
+   * Registers finished node data and attaches it to its parent.
+   */
+  function commitNode(nodeData, parentData, slotIndex) {
+    const id = `${ID.current++}`;
+    DOM_HASH_MAP[id] = nodeData;
+    if (debugMode) PERF_METRICS.nodeMetrics.processedNodes++;
+    if (parentData) {
+      // Deferred subtrees are committed after their parent, into the slot reserved in document order
+      if (slotIndex === undefined) {
+        parentData.children.push(id);
+      } else {
+        parentData.children[slotIndex] = id;
+      }
     }
+    return id;
+  }
 
-    // Early bailout for non-element nodes except text
-    if (node.nodeType !== Node.ELEMENT_NODE && node.nodeType !== Node.TEXT_NODE) {
+  /**
+   * Visits a single node: creates its node data and schedules its children.
+   * Text nodes are committed right away, elements once all their children are done (children before parents).
+   */
+  function visitNode(task, stack) {
+    const { node, parentData, parentIframe, isParentHighlighted, xpath } = task;
+
+    // Fast rejection checks first
+    if (!node || node.id === HIGHLIGHT_CONTAINER_ID ||
+        (node.nodeType !== Node.ELEMENT_NODE && node.nodeType !== Node.TEXT_NODE)) {
       if (debugMode) PERF_METRICS.nodeMetrics.skippedNodes++;
-      return null;
+      return;
     }
 
+    if (debugMode) PERF_METRICS.nodeMetrics.totalNodes++;
+
     // Process text nodes
     if (node.nodeType === Node.TEXT_NODE) {
       const textContent = node.textContent.trim();
       if (!textContent) {
         if (debugMode) PERF_METRICS.nodeMetrics.skippedNodes++;
-        return null;
+        return;
       }
 
       // Only check visibility for text nodes that might be visible
       const parentElement = node.parentElement;
       if (!parentElement || parentElement.tagName.toLowerCase() === 'script') {
         if (debugMode) PERF_METRICS.nodeMetrics.skippedNodes++;
-        return null;
+        return;
       }
 
-      const id = `${ID.current++}`;
-      DOM_HASH_MAP[id] = {
+      commitNode({
         type: "TEXT_NODE",
         text: textContent,
         isVisible: isTextNodeVisible(node),
-      };
-      if (debugMode) PERF_METRICS.nodeMetrics.processedNodes++;
-      return id;
+      }, parentData);
+      return;
     }
 
     // Quick checks for element nodes
-    if (node.nodeType === Node.ELEMENT_NODE && !isElementAccepted(node)) {
+    if (!isElementAccepted(node)) {
       if (debugMode) PERF_METRICS.nodeMetrics.skippedNodes++;
-      return null;
+      return;
     }
 
     // Early viewport check - only filter out elements clearly outside viewport
@@ -1236,28 +1714,24 @@
 
       // Use getBoundingClientRect for the quick OUTSIDE check.
       // isInExpandedViewport will do the more accurate check later if needed.
-      if (!rect || (!isFixedOrSticky && !hasSize && (
-        rect.bottom < -viewportExpansion ||
-        rect.top > window.innerHeight + viewportExpansion ||
-        rect.right < -viewportExpansion ||
-        rect.left > window.innerWidth + viewportExpansion
-      ))) {
+      if (!rect || (!isFixedOrSticky && !hasSize && !isRectInExpandedViewport(rect, getViewportOffset(node)))) {
         // console.log("Skipping node outside viewport (quick check):", node.tagName, rect);
         if (debugMode) PERF_METRICS.nodeMetrics.skippedNodes++;
-        return null;
+        return;
       }
     }
 
     // Process element node
+    const tagName = node.tagName.toLowerCase();
     const nodeData = {
-      tagName: node.tagName.toLowerCase(),
+      tagName,
       attributes: {},
-      xpath: getXPathTree(node, true),
+      xpath,
       children: [],
     };
 
     // Get attributes for interactive elements or potential text containers
-    if (isInteractiveCandidate(node) || node.tagName.toLowerCase() === 'iframe' || node.tagName.toLowerCase() === 'body') {
+    if (isInteractiveCandidate(node) || tagName === 'iframe' || tagName === 'body') {
       const attributeNames = node.getAttributeNames?.() || [];
       for (const name of attributeNames) {
         nodeData.attributes[name] = node.getAttribute(name);
@@ -1266,68 +1740,60 @@
 
     let nodeWasHighlighted = false;
     // Perform visibility, interactivity, and highlighting checks
-    if (node.nodeType === Node.ELEMENT_NODE) {
-      nodeData.isVisible = isElementVisible(node); // isElementVisible uses offsetWidth/Height, which is fine
-      if (nodeData.isVisible) {
-        nodeData.isTopElement = isTopElement(node);
-        if (nodeData.isTopElement) {
-          nodeData.isInteractive = isInteractiveElement(node);
-          // Call the dedicated highlighting function
-          nodeWasHighlighted = handleHighlighting(nodeData, node, parentIframe, isParentHighlighted);
-        }
+    nodeData.isVisible = isElementVisible(node); // isElementVisible uses offsetWidth/Height, which is fine
+    if (nodeData.isVisible) {
+      nodeData.isTopElement = isTopElement(node);
+      if (nodeData.isTopElement) {
+        nodeData.isInteractive = isInteractiveElement(node);
+        // Call the dedicated highlighting function
+        nodeWasHighlighted = handleHighlighting(nodeData, node, parentIframe, isParentHighlighted);
       }
     }
 
-    // Process children, with special handling for iframes and rich text editors
-    if (node.tagName) {
-      const tagName = node.tagName.toLowerCase();
+    // The node is committed after all of its children, they are pushed on top of this task
+    stack.push({ finish: nodeData, parentData, slotIndex: task.slotIndex });
 
-      // Handle iframes
-      if (tagName === "iframe") {
-        try {
-          const iframeDoc = node.contentDocument || node.contentWindow?.document;
-          if (iframeDoc) {
-            for (const child of iframeDoc.childNodes) {
-              const domElement = buildDomTree(child, node, false);
-              if (domElement) nodeData.children.push(domElement);
-            }
-          }
-        } catch (e) {
-          console.warn("Unable to access iframe:", e);
-        }
-      }
-      // Handle rich text editors and contenteditable elements
-      else if (
-        node.isContentEditable ||
-        node.getAttribute("contenteditable") === "true" ||
-        node.id === "tinymce" ||
-        node.classList.contains("mce-content-body") ||
-        (tagName === "body" && node.getAttribute("data-id")?.startsWith("mce_"))
-      ) {
-        // Process all child nodes to capture formatted text
-        for (const child of node.childNodes) {
-          const domElement = buildDomTree(child, parentIframe, nodeWasHighlighted);
-          if (domElement) nodeData.children.push(domElement);
+    // Process children, with special handling for iframes and rich text editors
+    if (tagName === "iframe") {
+      try {
+        const iframeDoc = node.contentDocument || node.contentWindow?.document;
+        if (iframeDoc) {
+          pushChildTasks(stack, iframeDoc.childNodes, nodeData, node, false, "", getChildXPathSegments(null));
         }
+      } catch (e) {
+        console.warn("Unable to access iframe:", e);
       }
-      else {
-        // Handle shadow DOM
-        if (node.shadowRoot) {
-          nodeData.shadowRoot = true;
-          for (const child of node.shadowRoot.childNodes) {
-            const domElement = buildDomTree(child, parentIframe, nodeWasHighlighted);
-            if (domElement) nodeData.children.push(domElement);
-          }
-        }
-        // Handle regular elements
-        for (const child of node.childNodes) {
-          // Pass the highlighted status of the *current* node to its children
-          const passHighlightStatusToChild = nodeWasHighlighted || isParentHighlighted;
-          const domElement = buildDomTree(child, parentIframe, passHighlightStatusToChild);
-          if (domElement) nodeData.children.push(domElement);
-        }
+    }
+    // Handle rich text editors and contenteditable elements
+    else if (
+      node.isContentEditable ||
+      node.getAttribute("contenteditable") === "true" ||
+      node.id === "tinymce" ||
+      node.classList.contains("mce-content-body") ||
+      (tagName === "body" && node.getAttribute("data-id")?.startsWith("mce_"))
+    ) {
+      // Process all child nodes to capture formatted text
+      pushChildTasks(stack, node.childNodes, nodeData, parentIframe, nodeWasHighlighted, xpath, getChildXPathSegments(node));
+    }
+    else {
+      // Pass the highlighted status of the *current* node to its children
+      const passHighlightStatusToChild = nodeWasHighlighted || isParentHighlighted;
+      // Handle regular elements, pushed first so the shadow DOM children are visited before them
+      pushChildTasks(stack, node.childNodes, nodeData, parentIframe, passHighlightStatusToChild, xpath, getChildXPathSegments(node));
+      // Handle shadow DOM
+      if (node.shadowRoot) {
+        nodeData.shadowRoot = true;
+        observeShadowRoot(node.shadowRoot);
+        pushChildTasks(stack, node.shadowRoot.childNodes, nodeData, parentIframe, nodeWasHighlighted, "", getChildXPathSegments(null));
       }
     }
+  }
+
+  /**
+   * Finishes an element once all of its children were visited.
+   */
+  function finishNode(task) {
+    const { finish: nodeData, parentData, slotIndex } = task;
 
     // Skip empty anchor tags
     if (nodeData.tagName === 'a' && nodeData.children.length === 0 && !nodeData.attributes.href) {
@@ -1335,14 +1801,126 @@
       return null;
     }
 
-    const id = `${ID.current++}`;
-    DOM_HASH_MAP[id] = nodeData;
-    if (debugMode) PERF_METRICS.nodeMetrics.processedNodes++;
-    return id;
+    return commitNode(nodeData, parentData, slotIndex);
+  }
+
+  /**
+   * How far an element lies outside the viewport, 0 if it overlaps it (or moves along with it).
+   */
+  function getViewportDistance(element) {
+    const rect = getCachedBoundingRect(element);
+    if (!rect || (rect.width === 0 && rect.height === 0)) return 0;
+
+    const offsetY = getViewportOffset(element);
+    const distance = Math.max(
+      offsetY - rect.bottom,
+      rect.top - (offsetY + window.innerHeight),
+      -rect.right,
+      rect.left - window.innerWidth,
+      0
+    );
+    if (distance === 0) return 0;
+
+    const style = getCachedComputedStyle(element);
+    return style && (style.position === 'fixed' || style.position === 'sticky') ? 0 : distance;
+  }
+
+  /**
+   * Checks the node and time budgets, the time only every 32 nodes.
+   */
+  function isBudgetExhausted() {
+    if (BUDGET.reason) return true;
+    if (maxNodes > 0 && BUDGET.visitedNodes >= maxNodes) {
+      BUDGET.reason = 'nodes';
+    } else if (timeBudgetMs > 0 && (BUDGET.visitedNodes & 31) === 0 && performance.now() - BUDGET.start > timeBudgetMs) {
+      BUDGET.reason = 'time';
+    }
+    return BUDGET.reason !== null;
+  }
+
+  /**
+   * Runs the visit and finish tasks on the stack until it is empty.
+   * With a budget, element subtrees outside the viewport are moved to the deferred list (if given) instead of being visited,
+   * and once the budget is used up the remaining visits are skipped - the finish tasks still run, so the started elements are complete.
+   */
+  function runTasks(stack, deferred) {
+    while (stack.length > 0) {
+      const task = stack.pop();
+      if (task.finish) {
+        finishNode(task);
+        continue;
+      }
+
+      if (hasBudget) {
+        if (isBudgetExhausted()) {
+          BUDGET.skippedSubtrees++;
+          continue;
+        }
+        if (deferred && task.node?.nodeType === Node.ELEMENT_NODE) {
+          const distance = getViewportDistance(task.node);
+          if (distance > 0) {
+            task.slotIndex = task.parentData.children.length;
+            task.parentData.children.push(null);
+            BUDGET.slotParents.push(task.parentData);
+            deferred.push({ task, distance });
+            continue;
+          }
+        }
+        BUDGET.visitedNodes++;
+      }
+
+      visitNode(task, stack);
+    }
+  }
+
+  /**
+   * Builds the node data of the whole tree below the given root.
+   *
+   * Walks the DOM with an explicit stack instead of recursion: deep pages can't overflow the call stack,
+   * and every XPath is built incrementally from its parent's XPath.
+   * Node ids are still assigned children before parents, highlight indices in document order.
+   */
+  function buildDomTree(root) {
+    // Special handling for root node (body)
+    const rootData = {
+      tagName: 'body',
+      attributes: {},
+      xpath: '/body',
+      children: [],
+    };
+
+    const stack = [];
+    // Body's children have no highlighted parent initially
+    pushChildTasks(stack, root.childNodes, rootData, null, false, getXPathTree(root, true), getChildXPathSegments(root));
+
+    // With a budget the viewport comes first, then the deferred subtrees closest to it
+    BUDGET.start = performance.now();
+    const deferred = hasBudget ? [] : null;
+    runTasks(stack, deferred);
+    if (deferred && deferred.length > 0) {
+      deferred.sort((a, b) => a.distance - b.distance);
+      for (let i = 0; i < deferred.length; i++) {
+        if (isBudgetExhausted()) {
+          BUDGET.skippedSubtrees += deferred.length - i;
+          break;
+        }
+        stack.push(deferred[i].task);
+        runTasks(stack, null);
+      }
+    }
+    // Drop the slots of deferred subtrees that were skipped or produced no node
+    for (const parentData of BUDGET.slotParents) {
+      parentData.children = parentData.children.filter((id) => id !== null);
+    }
+
+    return commitNode(rootData, null);
   }
 
   // After all functions are defined, wrap them with performance measurement
   // Remove buildDomTree from here as we measure it separately
+  if (highlightRenderer === 'canvas') {
+    highlightElement = queueCanvasHighlight;
+  }
   highlightElement = measureTime(highlightElement);
   isInteractiveElement = measureTime(isInteractiveElement);
   isElementVisible = measureTime(isElementVisible);
@@ -1351,11 +1929,43 @@
   isTextNodeVisible = measureTime(isTextNodeVisible);
   getEffectiveScroll = measureTime(getEffectiveScroll);
 
+  if (args.validateExtractionId) {
+    return validateExtraction(args.validateExtractionId, args.expectedMutationEpoch);
+  }
+
+  if (args.highlightExtractionId) {
+    const nodeRefs = window[NODE_REFS_KEY]?.get(args.highlightExtractionId);
+    if (nodeRefs && doHighlightElements) {
+      highlightExtraction(nodeRefs, args.highlightIndexOffset || 0);
+    }
+    return { highlighted: Boolean(nodeRefs) };
+  }
+
   const rootId = buildDomTree(document.body);
+  // Lets the caller tell later whether this result is still valid for the page
+  const mutationEpoch = viewportExpansion === -1 ? null : getMutationEpoch();
+  const truncation = BUDGET.reason === null ? null : {
+    reason: BUDGET.reason,
+    visitedNodes: BUDGET.visitedNodes,
+    skippedSubtrees: BUDGET.skippedSubtrees,
+    elapsedMs: performance.now() - BUDGET.start,
+  };
+
+  if (highlightRenderer === 'canvas') {
+    renderCanvasHighlights();
+  }
 
   // Clear the cache before starting
   DOM_CACHE.clearCache();
 
+  if (extractionId) {
+    const nodeRefs = window[NODE_REFS_KEY] || (window[NODE_REFS_KEY] = new Map());
+    nodeRefs.set(extractionId, NODE_REFS);
+    while (nodeRefs.size > MAX_NODE_REF_EXTRACTIONS) {
+      nodeRefs.delete(nodeRefs.keys().next().value);
+    }
+  }
+
   // Only process metrics in debug mode
   if (debugMode && PERF_METRICS) {
     // Convert timings to seconds and add useful derived metrics
@@ -1406,7 +2016,21 @@
     }
   }
 
+  if (args.chunkSize > 0 && extractionId) {
+    // Huge maps are not serialized into one message, the caller pulls the nodes in batches of chunkSize
+    // and builds the tree while the next batch is transferred. Ids are numeric, so keys come in commit order.
+    const chunks = window[CHUNKS_KEY] || (window[CHUNKS_KEY] = new Map());
+    const ids = Object.keys(DOM_HASH_MAP);
+    chunks.set(extractionId, { ids, map: DOM_HASH_MAP, cursor: 0 });
+    while (chunks.size > MAX_NODE_REF_EXTRACTIONS) {
+      chunks.delete(chunks.keys().next().value);
+    }
+    return debugMode ?
+      { rootId, chunked: true, nodeCount: ids.length, mutationEpoch, truncation, perfMetrics: PERF_METRICS } :
+      { rootId, chunked: true, nodeCount: ids.length, mutationEpoch, truncation };
+  }
+
   return debugMode ?
-    { rootId, map: DOM_HASH_MAP, perfMetrics: PERF_METRICS } :
-    { rootId, map: DOM_HASH_MAP };
+    { rootId, map: DOM_HASH_MAP, mutationEpoch, truncation, perfMetrics: PERF_METRICS } :
+    { rootId, map: DOM_HASH_MAP, mutationEpoch, truncation };
 };
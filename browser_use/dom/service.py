@@ -1,16 +1,24 @@
+import asyncio
+import contextlib
 import json
 import logging
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from importlib import resources
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 from urllib.parse import urlparse
 
 if TYPE_CHECKING:
-	from patchright.async_api import Page
+	from patchright.async_api import Frame, Page
 
+from browser_use.dom.accessibility_tree_processor.service import AccessibilityTreeProcessor
+from browser_use.dom.history_tree_processor.view import Coordinates, CoordinateSet, ViewportInfo
 from browser_use.dom.views import (
 	DOMBaseNode,
 	DOMElementNode,
+	DOMElementRef,
+	DOMExtractionTruncation,
 	DOMState,
 	DOMTextNode,
 	SelectorMap,
@@ -19,16 +27,81 @@ from browser_use.utils import time_execution_async
 
 logger = logging.getLogger(__name__)
 
+DOMProcessingExecutor = Literal['event_loop', 'thread', 'process']
+
+# shared by all browser contexts of the process, so many agents don't each start their own pool
+_dom_processing_executors: dict[str, Executor] = {}
+
+
+def get_dom_processing_executor(kind: DOMProcessingExecutor) -> Executor | None:
+	"""Executor for turning extraction payloads into element trees, None to do it directly on the event loop"""
+	if kind == 'event_loop':
+		return None
+	if kind not in _dom_processing_executors:
+		if kind == 'thread':
+			_dom_processing_executors[kind] = ThreadPoolExecutor(thread_name_prefix='browser_use_dom')
+		else:
+			_dom_processing_executors[kind] = ProcessPoolExecutor()
+	return _dom_processing_executors[kind]
+
+
+# xpath of the iframe element in its parent frame, like getXPathTree in buildDomTree.js
+FRAME_XPATH_JS = """(element) => {
+	const segments = [];
+	let current = element;
+	while (current && current.nodeType === Node.ELEMENT_NODE) {
+		if (current.parentNode instanceof ShadowRoot || current.parentNode instanceof HTMLIFrameElement) break;
+		const tagName = current.nodeName.toLowerCase();
+		const siblings = current.parentElement
+			? Array.from(current.parentElement.children).filter((sibling) => sibling.nodeName.toLowerCase() === tagName)
+			: [];
+		segments.unshift(siblings.length > 1 ? `${tagName}[${siblings.indexOf(current) + 1}]` : tagName);
+		current = current.parentNode;
+	}
+	return segments.join('/');
+}"""
+
+# next batch of nodes of an extraction buildDomTree.js kept page-side for chunked transfer (args.chunkSize)
+PULL_CHUNK_JS = """([extractionId, chunkSize]) => {
+	const extraction = window.__browserUseExtractionChunks?.get(extractionId);
+	if (!extraction) return null;
+	const end = Math.min(extraction.cursor + chunkSize, extraction.ids.length);
+	const nodes = {};
+	for (let i = extraction.cursor; i < end; i++) {
+		nodes[extraction.ids[i]] = extraction.map[extraction.ids[i]];
+	}
+	extraction.cursor = end;
+	const done = end >= extraction.ids.length;
+	if (done) window.__browserUseExtractionChunks.delete(extractionId);
+	return { nodes, done };
+}"""
+
+# releases the nodes of an extraction kept page-side that were not pulled to the end
+DROP_CHUNKS_JS = '(extractionId) => window.__browserUseExtractionChunks?.delete(extractionId)'
+
+# stops tracking the changes of a document for the cached results of buildDomTree.js (see getMutationEpoch)
+DISCONNECT_MUTATION_OBSERVER_JS = '() => window.__browserUseMutationEpoch?.disconnect?.()'
+
 
 @dataclass
-class ViewportInfo:
-	width: int
-	height: int
+class FrameExtraction:
+	"""Result of buildDomTree.js in a frame the extractor of its parent frame cannot descend into"""
+
+	frame: 'Frame'
+	extraction_id: str
+	eval_page: dict
+	iframe_xpath: str
+	iframe_x: float
+	iframe_y: float
 
 
 class DomService:
-	def __init__(self, page: 'Page'):
+	def __init__(self, page: 'Page', executor: Executor | None = None):
+		"""
+		executor: builds the element trees from the extraction payloads off the event loop (see get_dom_processing_executor)
+		"""
 		self.page = page
+		self.executor = executor
 		self.xpath_cache = {}
 
 		self.js_code = resources.files('browser_use.dom').joinpath('buildDomTree.js').read_text()
@@ -40,42 +113,126 @@ class DomService:
 		highlight_elements: bool = True,
 		focus_element: int = -1,
 		viewport_expansion: int = 0,
+		highlight_renderer: str = 'dom',
+		viewport_offset: int = 0,
+		extraction_mode: str = 'dom',
+		extract_cross_origin_iframes: bool = False,
+		max_parallel_frame_extractions: int = 4,
+		max_nodes: int | None = None,
+		time_budget_ms: int | None = None,
+		chunk_size: int | None = None,
 	) -> DOMState:
-		element_tree, selector_map = await self._build_dom_tree(highlight_elements, focus_element, viewport_expansion)
-		return DOMState(element_tree=element_tree, selector_map=selector_map)
+		"""
+		viewport_offset: extract the page as if it was scrolled down by this many pixels (negative: up), without scrolling it.
+			Elements in such an off-screen tile are not checked for occlusion, see validate_dom_state.
+		extraction_mode: 'dom' walks the DOM with buildDomTree.js, 'accessibility' builds the elements from the accessibility tree
+			(Chromium only, does not highlight elements on the page and ignores viewport_offset).
+		extract_cross_origin_iframes: also run the extractor in cross-origin iframes, at most max_parallel_frame_extractions at once,
+			and attach their trees below their iframe elements.
+		max_nodes, time_budget_ms: stop the extraction after visiting this many DOM nodes or after this many milliseconds.
+			With a budget the viewport is extracted first, then the rest of the page closest to the viewport first,
+			and DOMState.truncation tells what was left out.
+		chunk_size: transfer the extraction of the page in batches of this many nodes instead of one message,
+			building the tree from each batch while the next one is transferred.
+		"""
+		if extraction_mode == 'accessibility':
+			return await self._build_accessibility_tree(viewport_expansion)
+		return await self._build_dom_tree(
+			highlight_elements,
+			focus_element,
+			viewport_expansion,
+			highlight_renderer,
+			viewport_offset,
+			extract_cross_origin_iframes,
+			max_parallel_frame_extractions,
+			max_nodes,
+			time_budget_ms,
+			chunk_size,
+		)
+
+	@time_execution_async('--validate_dom_state')
+	async def validate_dom_state(
+		self,
+		dom_state: DOMState,
+		highlight_elements: bool = True,
+		focus_element: int = -1,
+		highlight_renderer: str = 'dom',
+	) -> bool:
+		"""
+		Checks whether an earlier extraction (e.g. a prefetched viewport tile) still matches the page:
+		the DOM is unchanged since and all highlighted elements are the topmost elements at their position now.
+		Highlights the elements of the extraction if it is still valid.
+		"""
+		if dom_state.extraction_id is None or dom_state.mutation_epoch is None:
+			return False
+
+		args = {
+			'doHighlightElements': highlight_elements,
+			'focusHighlightIndex': focus_element,
+			'viewportExpansion': 0,
+			'debugMode': False,
+			'highlightRenderer': highlight_renderer,
+			'validateExtractionId': dom_state.extraction_id,
+			'expectedMutationEpoch': dom_state.mutation_epoch,
+		}
+		try:
+			result: dict = await self.page.evaluate(self.js_code, args)
+		except Exception as e:
+			logger.debug(f'Failed to validate DOM state: {e}')
+			return False
+		return bool(result.get('valid'))
 
 	@time_execution_async('--get_cross_origin_iframes')
 	async def get_cross_origin_iframes(self) -> list[str]:
 		# invisible cross-origin iframes are used for ads and tracking, dont open those
 		hidden_frame_urls = await self.page.locator('iframe').filter(visible=False).evaluate_all('e => e.map(e => e.src)')
 
-		is_ad_url = lambda url: any(
-			domain in urlparse(url).netloc for domain in ('doubleclick.net', 'adroll.com', 'googletagmanager.com')
-		)
-
 		return [
 			frame.url
 			for frame in self.page.frames
 			if urlparse(frame.url).netloc  # exclude data:urls and about:blank
 			and urlparse(frame.url).netloc != urlparse(self.page.url).netloc  # exclude same-origin iframes
 			and frame.url not in hidden_frame_urls  # exclude hidden frames
-			and not is_ad_url(frame.url)  # exclude most common ad network tracker frame URLs
+			and not self._is_ad_url(frame.url)  # exclude most common ad network tracker frame URLs
 		]
 
+	@staticmethod
+	def _is_ad_url(url: str) -> bool:
+		return any(domain in urlparse(url).netloc for domain in ('doubleclick.net', 'adroll.com', 'googletagmanager.com'))
+
+	def _get_unreachable_frames(self) -> list['Frame']:
+		"""Frames the extractor cannot descend into from their parent frame, because they are cross-origin to it"""
+		frames = []
+		for frame in self.page.frames:
+			if frame.parent_frame is None or self._is_ad_url(frame.url):
+				continue
+			netloc = urlparse(frame.url).netloc
+			# data:urls and about:blank have no origin of their own, same-origin frames are extracted with their parent
+			if netloc and netloc != urlparse(frame.parent_frame.url).netloc:
+				frames.append(frame)
+		return frames
+
 	@time_execution_async('--build_dom_tree')
 	async def _build_dom_tree(
 		self,
 		highlight_elements: bool,
 		focus_element: int,
 		viewport_expansion: int,
-	) -> tuple[DOMElementNode, SelectorMap]:
+		highlight_renderer: str = 'dom',
+		viewport_offset: int = 0,
+		extract_cross_origin_iframes: bool = False,
+		max_parallel_frame_extractions: int = 4,
+		max_nodes: int | None = None,
+		time_budget_ms: int | None = None,
+		chunk_size: int | None = None,
+	) -> DOMState:
 		if await self.page.evaluate('1+1') != 2:
 			raise ValueError('The page cannot evaluate javascript code properly')
 
 		if self.page.url == 'about:blank':
 			# short-circuit if the page is a new empty tab for speed, no need to inject buildDomTree.js
-			return (
-				DOMElementNode(
+			return DOMState(
+				element_tree=DOMElementNode(
 					tag_name='body',
 					xpath='',
 					attributes={},
@@ -83,22 +240,38 @@ class DomService:
 					is_visible=False,
 					parent=None,
 				),
-				{},
+				selector_map={},
 			)
 
 		# NOTE: We execute JS code in the browser to extract important DOM information.
 		#       The returned hash map contains information about the DOM tree and the
 		#       relationship between the DOM elements.
 		debug_mode = logger.getEffectiveLevel() == logging.DEBUG
+		extraction_id = uuid.uuid4().hex[:12]
 		args = {
 			'doHighlightElements': highlight_elements,
 			'focusHighlightIndex': focus_element,
 			'viewportExpansion': viewport_expansion,
 			'debugMode': debug_mode,
+			'extractionId': extraction_id,
+			'highlightRenderer': highlight_renderer,
+			'viewportOffsetY': viewport_offset,
+			'maxNodes': max_nodes or 0,
+			'timeBudgetMs': time_budget_ms or 0,
+			'chunkSize': chunk_size or 0,
 		}
 
+		# frames are only highlighted once all of them are extracted and their highlight indices are known
+		frames = self._get_unreachable_frames() if extract_cross_origin_iframes and viewport_offset == 0 else []
+		semaphore = asyncio.Semaphore(max_parallel_frame_extractions)
+		# frames are small, their extractions are transferred at once
+		frame_args = {**args, 'doHighlightElements': False, 'focusHighlightIndex': -1, 'chunkSize': 0}
+
 		try:
-			eval_page: dict = await self.page.evaluate(self.js_code, args)
+			eval_page, *frame_extractions = await asyncio.gather(
+				self.page.evaluate(self.js_code, args),
+				*(self._extract_frame(frame, frame_args, semaphore) for frame in frames),
+			)
 		except Exception as e:
 			logger.error('Error evaluating JavaScript: %s', e)
 			raise
@@ -111,56 +284,284 @@ class DomService:
 				json.dumps(eval_page['perfMetrics'], indent=2),
 			)
 
-		return await self._construct_dom_tree(eval_page)
-
-	@time_execution_async('--construct_dom_tree')
-	async def _construct_dom_tree(
-		self,
-		eval_page: dict,
-	) -> tuple[DOMElementNode, SelectorMap]:
-		js_node_map = eval_page['map']
-		js_root_id = eval_page['rootId']
+		if eval_page.get('chunked'):
+			element_tree, selector_map = await self._construct_dom_tree_from_chunks(
+				extraction_id, eval_page['rootId'], chunk_size or 0
+			)
+		else:
+			element_tree, selector_map = await self._construct_dom_tree(eval_page)
+
+		truncation = None
+		if eval_page.get('truncation'):
+			truncation = DOMExtractionTruncation(
+				reason=eval_page['truncation']['reason'],
+				visited_nodes=eval_page['truncation']['visitedNodes'],
+				skipped_subtrees=eval_page['truncation']['skippedSubtrees'],
+				elapsed_ms=eval_page['truncation']['elapsedMs'],
+			)
+			logger.info(
+				f'✂️  DOM extraction stopped early ({truncation.reason} budget used up) after {truncation.visited_nodes} nodes '
+				f'in {truncation.elapsed_ms:.0f}ms, {truncation.skipped_subtrees} parts of the page left out'
+			)
 
-		selector_map = {}
-		node_map = {}
+		# the extractor keeps the highlighted nodes page-side, remember where to find them again
+		for highlight_index, node in selector_map.items():
+			node.node_ref = DOMElementRef(extraction_id=extraction_id, index=highlight_index)
 
-		for id, node_data in js_node_map.items():
-			node, children_ids = self._parse_node(node_data)
-			if node is None:
-				continue
+		extracted_frames = [frame_extraction for frame_extraction in frame_extractions if frame_extraction is not None]
+		if extracted_frames:
+			await self._attach_frames(
+				element_tree, selector_map, extracted_frames, highlight_elements, focus_element, highlight_renderer
+			)
 
-			node_map[id] = node
+		return DOMState(
+			element_tree=element_tree,
+			selector_map=selector_map,
+			extraction_id=extraction_id,
+			mutation_epoch=eval_page.get('mutationEpoch'),
+			truncation=truncation,
+		)
 
-			if isinstance(node, DOMElementNode) and node.highlight_index is not None:
-				selector_map[node.highlight_index] = node
+	@time_execution_async('--build_accessibility_tree')
+	async def _build_accessibility_tree(self, viewport_expansion: int) -> DOMState:
+		if self.page.url == 'about:blank':
+			return DOMState(
+				element_tree=DOMElementNode(
+					tag_name='body',
+					xpath='',
+					attributes={},
+					children=[],
+					is_visible=False,
+					parent=None,
+				),
+				selector_map={},
+			)
 
-			# NOTE: We know that we are building the tree bottom up
-			#       and all children are already processed.
-			if isinstance(node, DOMElementNode):
-				for child_id in children_ids:
-					if child_id not in node_map:
-						continue
+		cdp_session = await self.page.context.new_cdp_session(self.page)
+		try:
+			frame_tree, snapshot, layout_metrics = await asyncio.gather(
+				cdp_session.send('Page.getFrameTree'),
+				cdp_session.send('DOMSnapshot.captureSnapshot', {'computedStyles': []}),
+				cdp_session.send('Page.getLayoutMetrics'),
+			)
 
-					child_node = node_map[child_id]
+			frame_ids = []
+			frame_trees = [frame_tree['frameTree']]
+			while frame_trees:
+				current = frame_trees.pop()
+				frame_ids.append(current['frame']['id'])
+				frame_trees.extend(current.get('childFrames', []))
+
+			# cross-origin iframes running out of process have no tree in this session, they are left out
+			ax_trees = await asyncio.gather(
+				*(cdp_session.send('Accessibility.getFullAXTree', {'frameId': frame_id}) for frame_id in frame_ids),
+				return_exceptions=True,
+			)
+		finally:
+			await cdp_session.detach()
 
-					child_node.parent = node
-					node.children.append(child_node)
+		ax_trees_by_frame = {}
+		for frame_id, ax_tree in zip(frame_ids, ax_trees):
+			if isinstance(ax_tree, BaseException):
+				logger.debug(f'Failed to get the accessibility tree of frame {frame_id}: {ax_tree}')
+				continue
+			ax_trees_by_frame[frame_id] = ax_tree['nodes']
+
+		viewport = layout_metrics['cssLayoutViewport']
+		viewport_info = ViewportInfo(
+			scroll_x=int(viewport['pageX']),
+			scroll_y=int(viewport['pageY']),
+			width=viewport['clientWidth'],
+			height=viewport['clientHeight'],
+		)
 
-		html_to_dict = node_map[str(js_root_id)]
+		processor = AccessibilityTreeProcessor(snapshot, viewport_info, viewport_expansion)
+		element_tree, selector_map = processor.construct_dom_tree(ax_trees_by_frame, main_frame_id=frame_ids[0])
+		return DOMState(element_tree=element_tree, selector_map=selector_map)
 
-		del node_map
-		del js_node_map
-		del js_root_id
+	async def _extract_frame(self, frame: 'Frame', args: dict, semaphore: asyncio.Semaphore) -> FrameExtraction | None:
+		async with semaphore:
+			try:
+				iframe = await frame.frame_element()
+				box = await iframe.bounding_box()
+				if not box or not box['width'] or not box['height']:
+					return None  # invisible cross-origin iframes are used for ads and tracking
+				iframe_xpath = await iframe.evaluate(FRAME_XPATH_JS)
+
+				extraction_id = uuid.uuid4().hex[:12]
+				eval_page: dict = await frame.evaluate(self.js_code, {**args, 'extractionId': extraction_id})
+			except Exception as e:
+				logger.debug(f'Failed to extract frame {frame.url}: {e}')
+				return None
+
+		return FrameExtraction(
+			frame=frame,
+			extraction_id=extraction_id,
+			eval_page=eval_page,
+			iframe_xpath=iframe_xpath,
+			iframe_x=box['x'],
+			iframe_y=box['y'],
+		)
 
-		if html_to_dict is None or not isinstance(html_to_dict, DOMElementNode):
-			raise ValueError('Failed to parse HTML to dictionary')
+	@time_execution_async('--attach_frames')
+	async def _attach_frames(
+		self,
+		element_tree: DOMElementNode,
+		selector_map: SelectorMap,
+		frame_extractions: list[FrameExtraction],
+		highlight_elements: bool,
+		focus_element: int,
+		highlight_renderer: str,
+	) -> None:
+		"""
+		Attaches the trees of separately extracted frames below their iframe elements and continues the highlight indices
+		of the page with their elements, in the order of page.frames (parents before children).
+		"""
+		frame_trees: dict['Frame', DOMElementNode] = {self.page.main_frame: element_tree}
+		highlight_tasks = []
+
+		for frame_extraction in frame_extractions:
+			frame = frame_extraction.frame
+			frame_tree, frame_selector_map = await self._construct_dom_tree(frame_extraction.eval_page)
+
+			# the iframe element is part of the tree of the closest frame that was extracted on its own
+			parent_frame = frame.parent_frame
+			while parent_frame is not None and parent_frame not in frame_trees:
+				parent_frame = parent_frame.parent_frame
+			parent_tree = frame_trees.get(parent_frame, element_tree) if parent_frame else element_tree
+			iframe = self._find_iframe(parent_tree, frame_extraction.iframe_xpath) or parent_tree
+			frame_tree.parent = iframe
+			iframe.children.append(frame_tree)
+			frame_trees[frame] = frame_tree
+
+			stack: list[DOMElementNode] = [frame_tree]
+			while stack:
+				node = stack.pop()
+				node.frame_url = frame.url
+				# coordinates are relative to the viewport of the frame, make them relative to the viewport of the page
+				if node.viewport_coordinates is not None:
+					node.viewport_coordinates = self._offset_coordinate_set(
+						node.viewport_coordinates, frame_extraction.iframe_x, frame_extraction.iframe_y
+					)
+				stack.extend(child for child in node.children if isinstance(child, DOMElementNode))
+
+			# a budgeted extraction can leave gaps in the indexes, the frame's ones go after the highest
+			index_offset = max(selector_map, default=-1) + 1
+			for frame_highlight_index, node in frame_selector_map.items():
+				node.highlight_index = index_offset + frame_highlight_index
+				node.node_ref = DOMElementRef(extraction_id=frame_extraction.extraction_id, index=frame_highlight_index)
+				selector_map[node.highlight_index] = node
 
-		return html_to_dict, selector_map
+			if highlight_elements and frame_selector_map:
+				args = {
+					'doHighlightElements': True,
+					'focusHighlightIndex': focus_element,
+					'highlightRenderer': highlight_renderer,
+					'highlightExtractionId': frame_extraction.extraction_id,
+					'highlightIndexOffset': index_offset,
+				}
+				highlight_tasks.append(frame.evaluate(self.js_code, args))
+
+		for result in await asyncio.gather(*highlight_tasks, return_exceptions=True):
+			if isinstance(result, Exception):
+				logger.debug(f'Failed to highlight frame elements: {result}')
+
+	@staticmethod
+	def _find_iframe(tree: DOMElementNode, xpath: str) -> DOMElementNode | None:
+		stack = [tree]
+		while stack:
+			node = stack.pop()
+			if node.tag_name == 'iframe' and node.xpath == xpath and not node.children:
+				return node
+			stack.extend(child for child in reversed(node.children) if isinstance(child, DOMElementNode))
+		return None
+
+	@classmethod
+	def _offset_coordinate_set(cls, coordinates: CoordinateSet, x: float, y: float) -> CoordinateSet:
+		return cls._parse_coordinate_set(
+			{
+				'x': coordinates.top_left.x + x,
+				'y': coordinates.top_left.y + y,
+				'width': coordinates.width,
+				'height': coordinates.height,
+			}
+		)
 
-	def _parse_node(
+	@time_execution_async('--construct_dom_tree')
+	async def _construct_dom_tree(
 		self,
+		eval_page: dict,
+	) -> tuple[DOMElementNode, SelectorMap]:
+		if self.executor is None:
+			return self._build_element_tree(eval_page)
+		if isinstance(self.executor, ProcessPoolExecutor):
+			builder = ElementTreeBuilder()
+			builder.add_parsed_nodes(await self._parse_nodes_in_process(eval_page['map']))
+			return builder.finish(eval_page['rootId'])
+		# pure CPU work, with a pool the event loop stays free for the other agents in the meantime
+		return await asyncio.get_running_loop().run_in_executor(self.executor, self._build_element_tree, eval_page)
+
+	@time_execution_async('--construct_dom_tree_from_chunks')
+	async def _construct_dom_tree_from_chunks(
+		self,
+		extraction_id: str,
+		root_id: str,
+		chunk_size: int,
+	) -> tuple[DOMElementNode, SelectorMap]:
+		"""Builds the element tree from the batches of an extraction kept page-side, while the next batch is transferred"""
+		builder = ElementTreeBuilder()
+		# closed right away when a batch fails, so that the rest of the extraction is released on the page
+		async with contextlib.aclosing(self._pull_chunks(extraction_id, chunk_size)) as chunks:
+			async for nodes in chunks:
+				if self.executor is None:
+					builder.add_nodes(nodes)
+				elif isinstance(self.executor, ProcessPoolExecutor):
+					builder.add_parsed_nodes(await self._parse_nodes_in_process(nodes))
+				else:
+					await asyncio.get_running_loop().run_in_executor(self.executor, builder.add_nodes, nodes)
+		return builder.finish(root_id)
+
+	async def _parse_nodes_in_process(self, js_node_map: dict) -> list[tuple[str, DOMBaseNode, list[str]]]:
+		"""Parses the nodes in a worker process, they come back unlinked and are linked in this process"""
+		# NOTE: A linked tree is pickled recursively through the parents and children of its nodes, which exceeds the
+		#       recursion limit on deeply nested pages. The flat table of nodes pickles at any depth.
+		return await asyncio.get_running_loop().run_in_executor(self.executor, ElementTreeBuilder.parse_nodes, js_node_map)
+
+	async def _pull_chunks(self, extraction_id: str, chunk_size: int):
+		"""Yields the batches of nodes of an extraction, the next one is already requested while the caller processes one"""
+		next_chunk = asyncio.ensure_future(self.page.evaluate(PULL_CHUNK_JS, [extraction_id, chunk_size]))
+		done = False
+		try:
+			while True:
+				chunk = await next_chunk
+				if chunk is None:
+					raise ValueError(f'Extraction {extraction_id} is no longer available on the page')
+				done = chunk['done']
+				if not done:
+					next_chunk = asyncio.ensure_future(self.page.evaluate(PULL_CHUNK_JS, [extraction_id, chunk_size]))
+				yield chunk['nodes']
+				if done:
+					return
+		finally:
+			if not next_chunk.done():
+				next_chunk.cancel()
+			if not done:
+				try:
+					await self.page.evaluate(DROP_CHUNKS_JS, extraction_id)
+				except Exception as e:
+					logger.debug(f'Failed to release extraction {extraction_id} on the page: {type(e).__name__}: {e}')
+
+	@classmethod
+	def _build_element_tree(cls, eval_page: dict) -> tuple[DOMElementNode, SelectorMap]:
+		builder = ElementTreeBuilder()
+		builder.add_nodes(eval_page['map'])
+		return builder.finish(eval_page['rootId'])
+
+	@classmethod
+	def _parse_node(
+		cls,
 		node_data: dict,
-	) -> tuple[DOMBaseNode | None, list[int]]:
+	) -> tuple[DOMBaseNode | None, list[str]]:
 		if not node_data:
 			return None, []
 
@@ -174,11 +575,18 @@ class DomService:
 			return text_node, []
 
 		# Process coordinates if they exist for element nodes
-
+		viewport_coordinates = None
+		page_coordinates = None
 		viewport_info = None
 
+		if 'viewportCoordinates' in node_data:
+			viewport_coordinates = cls._parse_coordinate_set(node_data['viewportCoordinates'])
+		if 'pageCoordinates' in node_data:
+			page_coordinates = cls._parse_coordinate_set(node_data['pageCoordinates'])
 		if 'viewport' in node_data:
 			viewport_info = ViewportInfo(
+				scroll_x=int(node_data['viewport']['scrollX']),
+				scroll_y=int(node_data['viewport']['scrollY']),
 				width=node_data['viewport']['width'],
 				height=node_data['viewport']['height'],
 			)
@@ -195,9 +603,83 @@ class DomService:
 			highlight_index=node_data.get('highlightIndex'),
 			shadow_root=node_data.get('shadowRoot', False),
 			parent=None,
+			viewport_coordinates=viewport_coordinates,
+			page_coordinates=page_coordinates,
 			viewport_info=viewport_info,
 		)
 
 		children_ids = node_data.get('children', [])
 
 		return element_node, children_ids
+
+	@staticmethod
+	def _parse_coordinate_set(rect: dict) -> CoordinateSet:
+		x, y = int(rect['x']), int(rect['y'])
+		width, height = int(rect['width']), int(rect['height'])
+		return CoordinateSet(
+			top_left=Coordinates(x=x, y=y),
+			top_right=Coordinates(x=x + width, y=y),
+			bottom_left=Coordinates(x=x, y=y + height),
+			bottom_right=Coordinates(x=x + width, y=y + height),
+			center=Coordinates(x=x + width // 2, y=y + height // 2),
+			width=width,
+			height=height,
+		)
+
+
+class ElementTreeBuilder:
+	"""Builds the element tree from the node map of buildDomTree.js, one batch of nodes at a time"""
+
+	def __init__(self):
+		self.node_map: dict[str, DOMBaseNode] = {}
+		self.selector_map: SelectorMap = {}
+		# parents committed before some of their children, linked once all nodes exist
+		self.unlinked: list[tuple[DOMElementNode, list[str]]] = []
+
+	def add_nodes(self, js_node_map: dict) -> None:
+		self.add_parsed_nodes(self.parse_nodes(js_node_map))
+
+	@staticmethod
+	def parse_nodes(js_node_map: dict) -> list[tuple[str, DOMBaseNode, list[str]]]:
+		"""The nodes of the node map with the ids of their children, not linked to each other yet"""
+		nodes = []
+		for id, node_data in js_node_map.items():
+			node, children_ids = DomService._parse_node(node_data)
+			if node is not None:
+				nodes.append((id, node, children_ids))
+		return nodes
+
+	def add_parsed_nodes(self, nodes: list[tuple[str, DOMBaseNode, list[str]]]) -> None:
+		for id, node, children_ids in nodes:
+			self.node_map[id] = node
+
+			if not isinstance(node, DOMElementNode):
+				continue
+			if node.highlight_index is not None:
+				self.selector_map[node.highlight_index] = node
+
+			# NOTE: Children are usually committed before their parents, but subtrees deferred by a budgeted
+			#       extraction come after them.
+			if all(child_id in self.node_map for child_id in children_ids):
+				self._link(node, children_ids)
+			else:
+				self.unlinked.append((node, children_ids))
+
+	def finish(self, root_id: str) -> tuple[DOMElementNode, SelectorMap]:
+		for node, children_ids in self.unlinked:
+			self._link(node, children_ids)
+
+		root = self.node_map.get(str(root_id))
+		if root is None or not isinstance(root, DOMElementNode):
+			raise ValueError('Failed to parse HTML to dictionary')
+
+		return root, self.selector_map
+
+	def _link(self, node: DOMElementNode, children_ids: list[str]) -> None:
+		for child_id in children_ids:
+			child_node = self.node_map.get(child_id)
+			if child_node is None:
+				continue
+
+			child_node.parent = node
+			node.children.append(child_node)
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark for buildDomTree.js on synthetic pages.
+
+Usage:
+	python browser_use/dom/tests/build_dom_tree_benchmark.py
+	python browser_use/dom/tests/build_dom_tree_benchmark.py --js /tmp/buildDomTree_old.js --nodes 50000
+
+Pass an older copy of the script (e.g. `git show HEAD~1:browser_use/dom/buildDomTree.js > /tmp/old.js`)
+with --js to compare both versions on the same pages.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from importlib import resources
+
+from patchright.async_api import async_playwright
+
+# Each generator fills document.body with roughly `nodes` DOM nodes
+SYNTHETIC_PAGES = {
+	# long flat product list, the common case for search results and feeds
+	'wide': """(nodes) => {
+		const list = document.createElement('ul');
+		for (let i = 0; i * 5 < nodes; i++) {
+			const item = document.createElement('li');
+			item.innerHTML = `<div class="card"><a href="/item/${i}">Item ${i}</a><span>$${i}.99</span><button>Add</button></div>`;
+			list.appendChild(item);
+		}
+		document.body.appendChild(list);
+	}""",
+	# deeply nested wrappers, stresses the traversal and XPath generation
+	'deep': """(nodes) => {
+		let parent = document.body;
+		for (let i = 0; i < nodes / 4; i++) {
+			const wrapper = document.createElement('div');
+			wrapper.innerHTML = `<span>level ${i}</span><a href="#${i}">link ${i}</a>`;
+			parent.appendChild(wrapper);
+			if (i % 8 === 0) parent = wrapper;
+		}
+	}""",
+	# big data grid with many same-tag siblings
+	'grid': """(nodes) => {
+		const table = document.createElement('table');
+		const columns = 10;
+		for (let row = 0; row * columns * 2 < nodes; row++) {
+			const tr = table.insertRow();
+			for (let col = 0; col < columns; col++) {
+				tr.insertCell().innerHTML = `<input value="${row}:${col}">`;
+			}
+		}
+		document.body.appendChild(table);
+	}""",
+}
+
+
+def load_scripts(js_paths: list[str]) -> dict[str, str]:
+	scripts = {'current': resources.files('browser_use.dom').joinpath('buildDomTree.js').read_text()}
+	for path in js_paths:
+		with open(path) as f:
+			scripts[path] = f.read()
+	return scripts
+
+
+async def benchmark(scripts: dict[str, str], nodes: int, runs: int, viewport_expansions: list[int]):
+	async with async_playwright() as p:
+		browser = await p.chromium.launch(headless=True)
+		page = await browser.new_page(viewport={'width': 1280, 'height': 1100})
+
+		for page_name, generator in SYNTHETIC_PAGES.items():
+			await page.set_content('<html><body></body></html>')
+			await page.evaluate(generator, nodes)
+			node_count = await page.evaluate('document.querySelectorAll("*").length')
+
+			for viewport_expansion in viewport_expansions:
+				for script_name, js_code in scripts.items():
+					args = {
+						'doHighlightElements': False,
+						'focusHighlightIndex': -1,
+						'viewportExpansion': viewport_expansion,
+						'debugMode': False,
+					}
+					timings = []
+					for _ in range(runs):
+						start = time.perf_counter()
+						result = await page.evaluate(js_code, args)
+						timings.append(time.perf_counter() - start)
+
+					print(
+						f'{page_name:>5} | {node_count:>6} nodes | expansion {viewport_expansion:>4} | {script_name:<30} | '
+						f'median {statistics.median(timings) * 1000:8.1f}ms | min {min(timings) * 1000:8.1f}ms | '
+						f'{len(result["map"])} extracted'
+					)
+
+		await browser.close()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--js', action='append', default=[], help='other buildDomTree.js versions to compare against')
+	parser.add_argument('--nodes', type=int, default=50_000)
+	parser.add_argument('--runs', type=int, default=5)
+	parser.add_argument('--viewport-expansion', type=int, action='append', dest='viewport_expansions')
+	cli_args = parser.parse_args()
+
+	asyncio.run(benchmark(load_scripts(cli_args.js), cli_args.nodes, cli_args.runs, cli_args.viewport_expansions or [0, -1]))
@@ -0,0 +1,109 @@
+"""
+Benchmark of the event loop lag while many agents process page states in one process.
+
+Every simulated agent repeatedly builds the element tree from a synthetic extraction payload and renders it
+for the LLM, like a step does after buildDomTree.js returned. Meanwhile a ticker measures how late the event
+loop wakes it up - this is the delay every other agent's network handling sees.
+
+Usage:
+	python browser_use/dom/tests/event_loop_lag_benchmark.py
+	python browser_use/dom/tests/event_loop_lag_benchmark.py --agents 20 --nodes 50000 --executor thread --executor process
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from browser_use.dom.service import DomService, get_dom_processing_executor
+
+TICK_INTERVAL = 0.005
+
+
+def make_payload(nodes: int) -> dict:
+	"""Extraction payload of a long product list, children before parents like buildDomTree.js returns it"""
+	node_map = {}
+	item_ids = []
+	highlight_index = 0
+	for i in range(nodes // 4):
+		base = len(node_map)
+		node_map[str(base)] = {'type': 'TEXT_NODE', 'text': f'Item {i}', 'isVisible': True}
+		node_map[str(base + 1)] = {
+			'tagName': 'a',
+			'xpath': f'html/body/ul/li[{i + 1}]/a',
+			'attributes': {'href': f'/item/{i}', 'title': f'Item {i}'},
+			'isVisible': True,
+			'isInteractive': True,
+			'isTopElement': True,
+			'isInViewport': True,
+			'highlightIndex': highlight_index,
+			'viewportCoordinates': {'x': 0, 'y': i * 20, 'width': 200, 'height': 20},
+			'children': [str(base)],
+		}
+		node_map[str(base + 2)] = {'type': 'TEXT_NODE', 'text': f'${i}.99', 'isVisible': True}
+		node_map[str(base + 3)] = {
+			'tagName': 'li',
+			'xpath': f'html/body/ul/li[{i + 1}]',
+			'attributes': {},
+			'isVisible': True,
+			'children': [str(base + 1), str(base + 2)],
+		}
+		item_ids.append(str(base + 3))
+		highlight_index += 1
+
+	list_id, body_id = str(len(node_map)), str(len(node_map) + 1)
+	node_map[list_id] = {'tagName': 'ul', 'xpath': 'html/body/ul', 'attributes': {}, 'isVisible': True, 'children': item_ids}
+	node_map[body_id] = {'tagName': 'body', 'xpath': 'html/body', 'attributes': {}, 'isVisible': True, 'children': [list_id]}
+	return {'rootId': body_id, 'map': node_map}
+
+
+async def run_agent(dom_service: DomService, payload: dict, iterations: int, offload_rendering: bool):
+	for _ in range(iterations):
+		element_tree, _ = await dom_service._construct_dom_tree(payload)
+		if offload_rendering:
+			await asyncio.to_thread(element_tree.clickable_elements_to_string)
+		else:
+			element_tree.clickable_elements_to_string()
+		await asyncio.sleep(0.01)  # the LLM call and browser actions of the step
+
+
+async def measure_lag(lags: list[float], stop: asyncio.Event):
+	while not stop.is_set():
+		start = time.perf_counter()
+		await asyncio.sleep(TICK_INTERVAL)
+		lags.append(time.perf_counter() - start - TICK_INTERVAL)
+
+
+async def benchmark(executor_kind: str, agents: int, nodes: int, iterations: int):
+	payload = make_payload(nodes)
+	dom_service = DomService(None, get_dom_processing_executor(executor_kind))  # type: ignore[arg-type]
+	# warm up the pool (process workers import browser_use on their first task)
+	await dom_service._construct_dom_tree(make_payload(100))
+
+	lags: list[float] = []
+	stop = asyncio.Event()
+	ticker = asyncio.create_task(measure_lag(lags, stop))
+	start = time.perf_counter()
+	await asyncio.gather(*(run_agent(dom_service, payload, iterations, executor_kind != 'event_loop') for _ in range(agents)))
+	elapsed = time.perf_counter() - start
+	stop.set()
+	await ticker
+
+	lags_ms = sorted(lag * 1000 for lag in lags)
+	p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+	print(
+		f'{executor_kind:>10} | {agents} agents x {iterations} states of {len(payload["map"])} nodes | '
+		f'total {elapsed:6.2f}s | loop lag median {statistics.median(lags_ms):7.1f}ms | p99 {p99:7.1f}ms | max {lags_ms[-1]:7.1f}ms'
+	)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--agents', type=int, default=20)
+	parser.add_argument('--nodes', type=int, default=20_000)
+	parser.add_argument('--iterations', type=int, default=3)
+	parser.add_argument('--executor', action='append', dest='executors', choices=['event_loop', 'thread', 'process'])
+	cli_args = parser.parse_args()
+
+	for kind in cli_args.executors or ['event_loop', 'thread', 'process']:
+		asyncio.run(benchmark(kind, cli_args.agents, cli_args.nodes, cli_args.iterations))
@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from collections.abc import Callable
+from dataclasses import dataclass, field
 from functools import cached_property
 from typing import TYPE_CHECKING, Optional
 
@@ -52,6 +53,14 @@ class DOMTextNode(DOMBaseNode):
 		}
 
 
+@dataclass(frozen=True)
+class DOMElementRef:
+	"""Reference to a highlighted node kept page-side by the extractor run that produced it"""
+
+	extraction_id: str
+	index: int
+
+
 @dataclass(frozen=False)
 class DOMElementNode(DOMBaseNode):
 	"""
@@ -71,6 +80,9 @@ class DOMElementNode(DOMBaseNode):
 	viewport_coordinates: CoordinateSet | None = None
 	page_coordinates: CoordinateSet | None = None
 	viewport_info: ViewportInfo | None = None
+	node_ref: DOMElementRef | None = None
+	# url of the frame the element was extracted from, only set for elements of separately extracted (cross-origin) frames
+	frame_url: str | None = None
 
 	"""
 	### State injected by the browser context.
@@ -90,8 +102,8 @@ class DOMElementNode(DOMBaseNode):
 			'is_in_viewport': self.is_in_viewport,
 			'shadow_root': self.shadow_root,
 			'highlight_index': self.highlight_index,
-			'viewport_coordinates': self.viewport_coordinates,
-			'page_coordinates': self.page_coordinates,
+			'viewport_coordinates': self.viewport_coordinates.model_dump() if self.viewport_coordinates else None,
+			'page_coordinates': self.page_coordinates.model_dump() if self.page_coordinates else None,
 			'children': [child.__json__() for child in self.children],
 		}
 
@@ -150,75 +162,95 @@ class DOMElementNode(DOMBaseNode):
 		return '\n'.join(text_parts).strip()
 
 	@time_execution_sync('--clickable_elements_to_string')
-	def clickable_elements_to_string(self, include_attributes: list[str] | None = None) -> str:
-		"""Convert the processed DOM content to HTML."""
-		formatted_text = []
+	def clickable_elements_to_string(
+		self,
+		include_attributes: list[str] | None = None,
+		token_budget: int | None = None,
+		count_tokens: Callable[[str], int] | None = None,
+		compact_repeated_elements: int | None = None,
+		left_out: list[DOMBaseNode] | None = None,
+	) -> str:
+		"""Convert the processed DOM content to HTML.
+
+		token_budget: stop rendering lines once they would exceed this many tokens, counted with count_tokens
+			(the tokenizer of the model, by default 3 characters per token).
+			Lines are rendered by priority: closest to the viewport first, then interactive elements before text,
+			then new elements before known ones. The rendered lines keep their document order
+			and are followed by a note about what was left out.
+		compact_repeated_elements: of runs of siblings with the same structure (product cards, search results, table rows),
+			render only the first N in full and the others as one compact row each, listing their indices and texts.
+		left_out: collects the element and text nodes the token budget left out.
+		"""
+		if compact_repeated_elements is not None and compact_repeated_elements < 1:
+			raise ValueError(f'compact_repeated_elements must be at least 1, got {compact_repeated_elements}')
+
+		entries: list[_StateLine] = []
+		structures: dict[int, tuple[int, bool]] = {}
+
+		def get_structure(node: DOMBaseNode) -> tuple[int, bool]:
+			"""Hash of the tag names, attribute names and highlights of a subtree, and whether it contains a highlight"""
+			if not isinstance(node, DOMElementNode):
+				return hash('#text'), False
+			if id(node) not in structures:
+				children = [get_structure(child) for child in node.children]
+				structure_hash = hash(
+					(
+						node.tag_name,
+						tuple(sorted(node.attributes)),
+						node.highlight_index is not None,
+						tuple(h for h, _ in children),
+					)
+				)
+				has_highlight = node.highlight_index is not None or any(highlighted for _, highlighted in children)
+				structures[id(node)] = (structure_hash, has_highlight)
+			return structures[id(node)]
+
+		def collect_children(children: list[DOMBaseNode], depth: int, lines: list[_StateLine]) -> None:
+			if compact_repeated_elements is None:
+				for child in children:
+					collect_entries(child, depth, lines)
+				return
 
-		def process_node(node: DOMBaseNode, depth: int) -> None:
+			i = 0
+			while i < len(children):
+				# Find the run of siblings with the same structure as this one
+				j = i + 1
+				structure_hash, has_highlight = get_structure(children[i])
+				if isinstance(children[i], DOMElementNode) and has_highlight:
+					while j < len(children) and get_structure(children[j])[0] == structure_hash:
+						j += 1
+
+				run = children[i:j]
+				full = run if len(run) <= compact_repeated_elements else run[:compact_repeated_elements]
+				for child in full:
+					collect_entries(child, depth, lines)
+
+				rows: list[_StateLine] = []
+				for child in run[len(full) :]:
+					row: list[_StateLine] = []
+					collect_entries(child, depth, row)
+					if row:
+						rows.append(_StateLine(node=child, depth=depth, row=row))
+				if rows:
+					template: list[_StateLine] = []
+					collect_entries(full[-1], depth, template)
+					for row_line in rows:
+						row_line.template = template
+					lines.append(_StateLine(node=rows[0].node, depth=depth, repeated=len(rows)))
+					lines.extend(rows)
+				i = j
+
+		def collect_entries(node: DOMBaseNode, depth: int, lines: list[_StateLine]) -> None:
 			next_depth = int(depth)
-			depth_str = depth * '\t'
 
 			if isinstance(node, DOMElementNode):
 				# Add element with highlight_index
 				if node.highlight_index is not None:
 					next_depth += 1
-
-					text = node.get_all_text_till_next_clickable_element()
-					attributes_html_str = ''
-					if include_attributes:
-						attributes_to_include = {
-							key: str(value) for key, value in node.attributes.items() if key in include_attributes
-						}
-
-						# Easy LLM optimizations
-						# if tag == role attribute, don't include it
-						if node.tag_name == attributes_to_include.get('role'):
-							del attributes_to_include['role']
-
-						# if aria-label == text of the node, don't include it
-						if (
-							attributes_to_include.get('aria-label')
-							and attributes_to_include.get('aria-label', '').strip() == text.strip()
-						):
-							del attributes_to_include['aria-label']
-
-						# if placeholder == text of the node, don't include it
-						if (
-							attributes_to_include.get('placeholder')
-							and attributes_to_include.get('placeholder', '').strip() == text.strip()
-						):
-							del attributes_to_include['placeholder']
-
-						if attributes_to_include:
-							# Format as key1='value1' key2='value2'
-							attributes_html_str = ' '.join(f"{key}='{value}'" for key, value in attributes_to_include.items())
-
-					# Build the line
-					if node.is_new:
-						highlight_indicator = f'*[{node.highlight_index}]*'
-					else:
-						highlight_indicator = f'[{node.highlight_index}]'
-
-					line = f'{depth_str}{highlight_indicator}<{node.tag_name}'
-
-					if attributes_html_str:
-						line += f' {attributes_html_str}'
-
-					if text:
-						# Add space before >text only if there were NO attributes added before
-						if not attributes_html_str:
-							line += ' '
-						line += f'>{text}'
-					# Add space before /> only if neither attributes NOR text were added
-					elif not attributes_html_str:
-						line += ' '
-
-					line += ' />'  # 1 token
-					formatted_text.append(line)
+					lines.append(_StateLine(node=node, depth=depth))
 
 				# Process children regardless
-				for child in node.children:
-					process_node(child, next_depth)
+				collect_children(node.children, next_depth, lines)
 
 			elif isinstance(node, DOMTextNode):
 				# Add text only if it doesn't have a highlighted parent
@@ -228,11 +260,154 @@ class DOMElementNode(DOMBaseNode):
 					and node.parent.is_visible
 					and node.parent.is_top_element
 				):  # and node.is_parent_top_element()
-					formatted_text.append(f'{depth_str}{node.text}')
+					lines.append(_StateLine(node=node, depth=depth))
+
+		collect_entries(self, 0, entries)
+
+		if token_budget is None:
+			return '\n'.join(entry.format(include_attributes) for entry in entries)
+
+		# Text has no coordinates, it is placed where the previous element is
+		distances: list[float] = []
+		distance = 0.0
+		for entry in entries:
+			for element in entry.elements():
+				element_distance = element.viewport_distance()
+				if element_distance is not None:
+					distance = element_distance
+					break
+			distances.append(distance)
+
+		def priority(i: int) -> tuple:
+			elements = entries[i].elements()
+			is_new = any(element.is_new for element in elements)
+			return (distances[i], not elements, not is_new, i)
+
+		# Headers of repeated rows are shown with their first shown row
+		ranking = sorted((i for i, entry in enumerate(entries) if not entry.repeated), key=priority)
+
+		if count_tokens is None:
+			count_tokens = _estimate_tokens
+
+		lines: dict[int, str] = {}
+		used_tokens = 0
+		for i in ranking:
+			line = entries[i].format(include_attributes)
+			line_tokens = count_tokens(line) + 1  # + newline
+			if used_tokens + line_tokens > token_budget:
+				break
+			lines[i] = line
+			used_tokens += line_tokens
+
+		for i, entry in enumerate(entries):
+			if entry.repeated and any(row in lines for row in range(i + 1, i + 1 + entry.repeated)):
+				lines[i] = entry.format(include_attributes)
+
+		formatted_text = [lines[i] for i in sorted(lines)]
+
+		if left_out is not None:
+			for i, entry in enumerate(entries):
+				if i in lines or entry.repeated:
+					continue
+				if entry.row is not None:
+					left_out.extend(line.node for line in entry.row)
+				else:
+					left_out.append(entry.node)
+
+		elided_indices = [
+			element.highlight_index
+			for i, entry in enumerate(entries)
+			if i not in lines
+			for element in entry.elements()
+			if element.highlight_index is not None
+		]
+		elided_texts = sum(1 for i, entry in enumerate(entries) if i not in lines and isinstance(entry.node, DOMTextNode))
+		if elided_indices or elided_texts:
+			left_out = []
+			if elided_indices:
+				left_out.append(f'{len(elided_indices)} interactive elements ({_format_index_ranges(elided_indices)})')
+			if elided_texts:
+				left_out.append(f'{elided_texts} text lines')
+			formatted_text.append(
+				f'... {" and ".join(left_out)} left out to save tokens - scroll or extract content to see more ...'
+			)
 
-		process_node(self, 0)
 		return '\n'.join(formatted_text)
 
+	def get_visible_texts(self) -> list[str]:
+		"""Texts clickable_elements_to_string shows outside of interactive elements, in document order"""
+		texts = []
+		stack: list[DOMBaseNode] = [self]
+		while stack:
+			node = stack.pop()
+			if isinstance(node, DOMElementNode):
+				stack.extend(reversed(node.children))
+			elif (
+				isinstance(node, DOMTextNode)
+				and not node.has_parent_with_highlight_index()
+				and node.parent
+				and node.parent.is_visible
+				and node.parent.is_top_element
+			):
+				texts.append(node.text)
+		return texts
+
+	def viewport_distance(self) -> float | None:
+		"""Vertical distance in pixels between the element and the viewport it was extracted in, 0 if it is inside"""
+		if self.viewport_coordinates is None or self.viewport_info is None:
+			return None
+		top = self.viewport_coordinates.top_left.y
+		bottom = self.viewport_coordinates.bottom_left.y
+		return max(0, top - self.viewport_info.height, -bottom)
+
+	def format_line(self, depth: int = 0, include_attributes: list[str] | None = None, mark_new: bool = True) -> str:
+		"""Line of the element in clickable_elements_to_string"""
+		depth_str = depth * '\t'
+		text = self.get_all_text_till_next_clickable_element()
+		attributes_html_str = ''
+		if include_attributes:
+			attributes_to_include = {key: str(value) for key, value in self.attributes.items() if key in include_attributes}
+
+			# Easy LLM optimizations
+			# if tag == role attribute, don't include it
+			if self.tag_name == attributes_to_include.get('role'):
+				del attributes_to_include['role']
+
+			# if aria-label == text of the node, don't include it
+			if attributes_to_include.get('aria-label') and attributes_to_include.get('aria-label', '').strip() == text.strip():
+				del attributes_to_include['aria-label']
+
+			# if placeholder == text of the node, don't include it
+			if attributes_to_include.get('placeholder') and attributes_to_include.get('placeholder', '').strip() == text.strip():
+				del attributes_to_include['placeholder']
+
+			if attributes_to_include:
+				# Format as key1='value1' key2='value2'
+				attributes_html_str = ' '.join(f"{key}='{value}'" for key, value in attributes_to_include.items())
+
+		# Build the line
+		if self.is_new and mark_new:
+			highlight_indicator = f'*[{self.highlight_index}]*'
+		else:
+			highlight_indicator = f'[{self.highlight_index}]'
+
+		line = f'{depth_str}{highlight_indicator}<{self.tag_name}'
+
+		if attributes_html_str:
+			line += f' {attributes_html_str}'
+
+		if text:
+			# Add space before >text only if there were NO attributes added before
+			if not attributes_html_str:
+				line += ' '
+			line += f'>{text}'
+		# Add space before /> only if neither attributes NOR text were added
+		elif not attributes_html_str:
+			line += ' '
+
+		line += ' />'  # 1 token
+		return line
+
 	def get_file_upload_element(self, check_siblings: bool = True) -> Optional['DOMElementNode']:
 		# Check if current element is a file input
 		if self.tag_name == 'input' and self.attributes.get('type') == 'file':
@@ -256,10 +431,99 @@ class DOMElementNode(DOMBaseNode):
 		return None
 
 
+@dataclass
+class _StateLine:
+	"""One line of DOMElementNode.clickable_elements_to_string"""
+
+	node: DOMElementNode | DOMTextNode
+	depth: int
+	# Compact row of a repeated sibling structure: the lines of the sibling and of the last one rendered in full
+	row: list['_StateLine'] | None = None
+	template: list['_StateLine'] | None = None
+	# Header announcing this many compact rows
+	repeated: int = 0
+
+	def elements(self) -> list[DOMElementNode]:
+		"""Highlighted elements shown in this line"""
+		if self.row is not None:
+			return [line.node for line in self.row if isinstance(line.node, DOMElementNode)]
+		if isinstance(self.node, DOMElementNode) and not self.repeated:
+			return [self.node]
+		return []
+
+	def format(self, include_attributes: list[str] | None) -> str:
+		depth_str = self.depth * '\t'
+
+		if self.repeated:
+			tag_name = self.node.tag_name if isinstance(self.node, DOMElementNode) else 'text'
+			return f'{depth_str}... {self.repeated} more <{tag_name}> with the same structure, one per line:'
+
+		if self.row is not None:
+			return depth_str + ' | '.join(self._format_cell(line, i, include_attributes) for i, line in enumerate(self.row))
+
+		if isinstance(self.node, DOMTextNode):
+			return f'{depth_str}{self.node.text}'
+
+		return self.node.format_line(self.depth, include_attributes)
+
+	def _format_cell(self, line: '_StateLine', position: int, include_attributes: list[str] | None) -> str:
+		"""Index and text of an element, plus the attributes differing from the same element in the template"""
+		if isinstance(line.node, DOMTextNode):
+			return ' '.join(line.node.text.split())
+
+		element = line.node
+		cell = f'*[{element.highlight_index}]*' if element.is_new else f'[{element.highlight_index}]'
+		text = ' '.join(element.get_all_text_till_next_clickable_element().split())
+		cell += text
+
+		template = self.template[position].node if self.template and position < len(self.template) else None
+		template_attributes = template.attributes if isinstance(template, DOMElementNode) else {}
+		for key, value in element.attributes.items():
+			if not include_attributes or key not in include_attributes or value.strip() == text:
+				continue
+			if template_attributes.get(key) != value:
+				cell += f" {key}='{value}'"
+		return cell
+
+
+def _format_index_ranges(indices: list[int]) -> str:
+	"""Formats sorted indices compactly, e.g. [1, 2, 3, 7] -> '1-3, 7'"""
+	ranges = []
+	start = end = indices[0]
+	for index in indices[1:]:
+		if index == end + 1:
+			end = index
+			continue
+		ranges.append(f'{start}-{end}' if end > start else f'{start}')
+		start = end = index
+	ranges.append(f'{start}-{end}' if end > start else f'{start}')
+	return ', '.join(ranges)
+
+
+def _estimate_tokens(text: str) -> int:
+	"""Rough token count for budgets without a tokenizer"""
+	return len(text) // 3
+
+
 SelectorMap = dict[int, DOMElementNode]
 
 
+@dataclass
+class DOMExtractionTruncation:
+	"""Why and where an extraction stopped early, the viewport is extracted first and the rest of the page closest first"""
+
+	reason: str  # 'nodes' or 'time'
+	visited_nodes: int
+	skipped_subtrees: int
+	elapsed_ms: float
+
+
 @dataclass
 class DOMState:
 	element_tree: DOMElementNode
 	selector_map: SelectorMap
+	# Page-side extraction this state was built from, used to check later whether it is still valid
+	extraction_id: str | None = field(default=None, kw_only=True)
+	mutation_epoch: int | None = field(default=None, kw_only=True)
+	# Set if the extraction ran out of its node or time budget and left parts of the page out
+	truncation: DOMExtractionTruncation | None = field(default=None, kw_only=True)
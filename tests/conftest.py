@@ -23,8 +23,15 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
+from langchain_core.messages import SystemMessage
+
+from browser_use.agent.message_manager.service import MessageManager, MessageManagerSettings
+from browser_use.agent.message_manager.tokenizers import Tokenizer
+from browser_use.agent.views import MessageManagerState
 from browser_use.browser.browser import Browser, BrowserConfig
 from browser_use.browser.context import BrowserContext
+from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMElementNode, DOMTextNode
 
 
 @pytest.fixture(scope='session')
@@ -57,3 +64,51 @@ async def browser_context(browser):
 	context = BrowserContext(browser=browser)
 	yield context
 	await context.close()
+
+
+@pytest.fixture
+def make_state():
+	"""
+	Fixture to provide a factory of page states, with one button per label.
+	"""
+
+	def make(url: str = 'https://example.com', buttons: list[str] | None = None) -> BrowserState:
+		body = DOMElementNode(
+			tag_name='body', xpath='html/body', attributes={}, children=[], is_visible=True, parent=None, is_top_element=True
+		)
+		selector_map = {}
+		for index, label in enumerate(buttons or []):
+			button = DOMElementNode(
+				tag_name='button',
+				xpath=f'html/body/button[{index + 1}]',
+				attributes={'name': label.lower()},
+				children=[],
+				is_visible=True,
+				parent=body,
+				is_top_element=True,
+				highlight_index=index,
+			)
+			button.children.append(DOMTextNode(text=label, is_visible=True, parent=button))
+			body.children.append(button)
+			selector_map[index] = button
+		return BrowserState(element_tree=body, selector_map=selector_map, url=url, title='Example', tabs=[])
+
+	return make
+
+
+@pytest.fixture
+def make_message_manager():
+	"""
+	Fixture to provide a factory of message managers with the given settings.
+	"""
+
+	def make(tokenizer: Tokenizer | None = None, **settings) -> MessageManager:
+		return MessageManager(
+			task='Test task',
+			system_message=SystemMessage(content='System message'),
+			settings=MessageManagerSettings(**settings),
+			state=MessageManagerState(),
+			tokenizer=tokenizer,
+		)
+
+	return make
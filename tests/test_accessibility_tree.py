@@ -0,0 +1,147 @@
+from browser_use.dom.accessibility_tree_processor.service import AccessibilityTreeProcessor
+from browser_use.dom.history_tree_processor.view import ViewportInfo
+from browser_use.dom.views import DOMElementNode
+
+
+class SnapshotBuilder:
+	"""Builds a minimal DOMSnapshot.captureSnapshot payload"""
+
+	def __init__(self):
+		self.strings: list[str] = []
+		self.documents: list[dict] = []
+		self.next_backend_id = 1
+
+	def string(self, value: str) -> int:
+		if value not in self.strings:
+			self.strings.append(value)
+		return self.strings.index(value)
+
+	def document(self, frame_id: str, scroll_y: float = 0) -> int:
+		self.documents.append(
+			{
+				'frameId': self.string(frame_id),
+				'scrollOffsetX': 0,
+				'scrollOffsetY': scroll_y,
+				'nodes': {
+					'parentIndex': [],
+					'nodeType': [],
+					'nodeName': [],
+					'backendNodeId': [],
+					'attributes': [],
+					'contentDocumentIndex': {'index': [], 'value': []},
+				},
+				'layout': {'nodeIndex': [], 'bounds': []},
+			}
+		)
+		return len(self.documents) - 1
+
+	def node(
+		self, document: int, parent: int, name: str, node_type: int = 1, bounds=None, attributes: dict | None = None
+	) -> tuple[int, int]:
+		nodes = self.documents[document]['nodes']
+		nodes['parentIndex'].append(parent)
+		nodes['nodeType'].append(node_type)
+		nodes['nodeName'].append(self.string(name))
+		nodes['backendNodeId'].append(self.next_backend_id)
+		nodes['attributes'].append([self.string(part) for item in (attributes or {}).items() for part in item])
+		node_index = len(nodes['parentIndex']) - 1
+		if bounds is not None:
+			self.documents[document]['layout']['nodeIndex'].append(node_index)
+			self.documents[document]['layout']['bounds'].append(bounds)
+		self.next_backend_id += 1
+		return node_index, self.next_backend_id - 1
+
+	def snapshot(self) -> dict:
+		return {'documents': self.documents, 'strings': self.strings}
+
+
+def ax_node(node_id: str, role: str, backend_id: int, name: str = '', children: list[str] | None = None, **extra) -> dict:
+	return {
+		'nodeId': node_id,
+		'role': {'type': 'role', 'value': role},
+		'name': {'type': 'computedString', 'value': name},
+		'backendDOMNodeId': backend_id,
+		'childIds': children or [],
+		**extra,
+	}
+
+
+def build_page():
+	builder = SnapshotBuilder()
+	main = builder.document('main')
+	document, document_id = builder.node(main, -1, '#document', node_type=9)
+	html, _ = builder.node(main, document, 'HTML', bounds=[0, 0, 1000, 3000])
+	body, _ = builder.node(main, html, 'BODY', bounds=[0, 0, 1000, 3000])
+	div, div_id = builder.node(main, body, 'DIV', bounds=[0, 0, 1000, 100])
+	wrapper, wrapper_id = builder.node(main, div, 'DIV', bounds=[0, 0, 1000, 100])
+	button, button_id = builder.node(main, wrapper, 'BUTTON', bounds=[10, 10, 80, 20], attributes={'type': 'submit'})
+	text, text_id = builder.node(main, button, '#text', node_type=3, bounds=[12, 12, 30, 16])
+	link_1, link_1_id = builder.node(main, div, 'A', bounds=[100, 10, 20, 20], attributes={'href': '/cart', 'aria-label': 'Cart'})
+	link_2, link_2_id = builder.node(main, div, 'A', bounds=[100, 2500, 20, 20], attributes={'href': '/far-away'})
+	iframe, iframe_id = builder.node(main, body, 'IFRAME', bounds=[0, 200, 500, 300])
+
+	frame = builder.document('child')
+	builder.documents[main]['nodes']['contentDocumentIndex'] = {'index': [iframe], 'value': [frame]}
+	frame_document, frame_document_id = builder.node(frame, -1, '#document', node_type=9)
+	frame_html, _ = builder.node(frame, frame_document, 'HTML', bounds=[0, 0, 500, 300])
+	input_, input_id = builder.node(frame, frame_html, 'INPUT', bounds=[5, 5, 100, 20], attributes={'name': 'q'})
+
+	ax_trees = {
+		'main': [
+			ax_node('1', 'RootWebArea', document_id, children=['2', '7']),
+			ax_node('2', 'generic', div_id, children=['3', '5', '6']),
+			ax_node('3', 'generic', wrapper_id, children=['4'], ignored=True),
+			ax_node('4', 'button', button_id, name='Buy', children=['8']),
+			ax_node('8', 'StaticText', text_id, name='Buy'),
+			ax_node('5', 'link', link_1_id, name='Cart'),
+			ax_node('6', 'link', link_2_id),
+			ax_node('7', 'Iframe', iframe_id),
+		],
+		'child': [
+			ax_node('1', 'RootWebArea', frame_document_id, children=['2']),
+			ax_node('2', 'textbox', input_id, name='Search'),
+		],
+	}
+	viewport_info = ViewportInfo(scroll_x=0, scroll_y=0, width=1000, height=800)
+	return builder.snapshot(), ax_trees, viewport_info
+
+
+def test_builds_selector_map_from_accessibility_tree():
+	snapshot, ax_trees, viewport_info = build_page()
+
+	_, selector_map = AccessibilityTreeProcessor(snapshot, viewport_info).construct_dom_tree(ax_trees, main_frame_id='main')
+
+	# the far away link is outside of the viewport, the ignored wrapper is skipped
+	assert [node.tag_name for node in selector_map.values()] == ['button', 'a', 'input']
+	button, link, input_ = selector_map.values()
+	assert button.xpath == 'html/body/div/div/button'
+	assert button.attributes == {'type': 'submit'}
+	assert button.parent is not None and button.parent.tag_name == 'div'
+	assert link.xpath == 'html/body/div/a[1]'
+	assert button.viewport_coordinates is not None and button.viewport_coordinates.center.y == 20
+
+
+def test_frames_are_attached_below_their_iframe():
+	snapshot, ax_trees, viewport_info = build_page()
+
+	_, selector_map = AccessibilityTreeProcessor(snapshot, viewport_info).construct_dom_tree(ax_trees, main_frame_id='main')
+
+	input_ = selector_map[2]
+	assert isinstance(input_.parent, DOMElementNode) and input_.parent.tag_name == 'iframe'
+	assert input_.xpath == 'html/input'
+	assert input_.viewport_coordinates is not None and input_.viewport_coordinates.top_left.y == 205
+
+
+def test_uses_accessible_name_for_elements_without_text():
+	snapshot, ax_trees, viewport_info = build_page()
+
+	element_tree, _ = AccessibilityTreeProcessor(snapshot, viewport_info, viewport_expansion=-1).construct_dom_tree(
+		ax_trees, main_frame_id='main'
+	)
+
+	assert element_tree.clickable_elements_to_string(include_attributes=['href']).split('\n') == [
+		'[0]<button >Buy />',
+		"[1]<a href='/cart'>Cart />",
+		"[2]<a href='/far-away' />",
+		'[3]<input >Search />',
+	]
@@ -303,3 +303,32 @@ class TestActionFilters:
 		assert 'domain_filter_action' in non_matching_page_model.model_fields
 		assert 'page_filter_action' not in non_matching_page_model.model_fields
 		assert 'both_filters_action' not in non_matching_page_model.model_fields
+
+	def test_action_models_are_reused_per_action_set(self):
+		"""Test that pages with the same available actions share one action model"""
+		registry = Registry()
+
+		@registry.action(description='No filter action')
+		def no_filter_action():
+			pass
+
+		@registry.action(description='Domain filter action', domains=['example.com'])
+		def domain_filter_action():
+			pass
+
+		mock_page = MagicMock(spec=Page)
+		mock_page.url = 'https://example.com/first'
+		page_model = registry.create_action_model(page=mock_page)
+
+		mock_page.url = 'https://example.com/second'
+		assert registry.create_action_model(page=mock_page) is page_model
+		assert registry.create_action_model() is not page_model
+
+		# registering an action builds the models again
+		@registry.action(description='Another action')
+		def another_action():
+			pass
+
+		new_page_model = registry.create_action_model(page=mock_page)
+		assert new_page_model is not page_model
+		assert 'another_action' in new_page_model.model_fields
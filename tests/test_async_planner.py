@@ -0,0 +1,69 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from browser_use.agent.service import Agent
+from browser_use.browser.browser import Browser, BrowserConfig
+from browser_use.browser.context import BrowserContext, BrowserContextConfig
+from browser_use.browser.views import BrowserState
+
+
+def make_agent() -> Agent:
+	browser = Mock(spec=Browser)
+	browser.config = BrowserConfig()
+	browser_context = Mock(spec=BrowserContext)
+	browser_context.config = BrowserContextConfig()
+	browser_context.get_state = AsyncMock()
+	return Agent(
+		task='Test task',
+		llm=Mock(spec=BaseChatModel),
+		browser=browser,
+		browser_context=browser_context,
+		planner_llm=Mock(spec=BaseChatModel),
+		async_planner=True,
+		enable_memory=False,
+	)
+
+
+def plan_messages(agent: Agent) -> list[str]:
+	messages = agent.message_manager.state.history.messages
+	return [m.message.content for m in messages if m.message.type == 'ai' and m.message.content]  # type: ignore[misc]
+
+
+async def start_planning(agent: Agent, state: BrowserState, plan: asyncio.Future) -> None:
+	agent._get_planner_messages = AsyncMock(return_value=[])  # type: ignore[method-assign]
+
+	async def run_planner(planner_messages):
+		return await plan
+
+	agent._run_planner = run_planner  # type: ignore[method-assign]
+	await agent._start_planner(state)
+
+
+async def test_plan_is_added_once_it_is_done_if_the_page_did_not_change_much(make_state):
+	agent = make_agent()
+	plan: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+	await start_planning(agent, make_state('https://example.com', [str(i) for i in range(10)]), plan)
+
+	# the executor does not wait for the plan
+	agent._add_finished_plan(make_state('https://example.com', [str(i) for i in range(1, 11)]))
+	assert plan_messages(agent) == []
+
+	plan.set_result('Click the first button')
+	await asyncio.wait_for(asyncio.shield(agent._planning), timeout=1)  # type: ignore[arg-type]
+	agent._add_finished_plan(make_state('https://example.com', [str(i) for i in range(1, 11)]))
+	assert plan_messages(agent) == ['Click the first button']
+
+
+async def test_plan_is_dropped_when_the_page_changed(make_state):
+	agent = make_agent()
+	plan: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+	plan.set_result('Click the first button')
+	await start_planning(agent, make_state('https://example.com', [str(i) for i in range(10)]), plan)
+	await asyncio.wait_for(asyncio.shield(agent._planning), timeout=1)  # type: ignore[arg-type]
+
+	agent._add_finished_plan(make_state('https://example.com/checkout', [str(i) for i in range(10)]))
+
+	assert plan_messages(agent) == []
+	assert agent._planning is None
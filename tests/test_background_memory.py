@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from browser_use.agent.memory.service import Memory
+from browser_use.agent.message_manager.service import MessageManager
+from browser_use.agent.views import ActionResult, AgentBrain, AgentOutput
+
+
+class SlowMemory(Memory):
+	"""Memory whose creation blocks until it is released, like a slow mem0.add"""
+
+	def __init__(self, message_manager: MessageManager):
+		self.message_manager = message_manager
+		self._consolidation = None
+		self._consolidated_messages = []
+		self.release = threading.Event()
+
+	def _create(self, messages: list[BaseMessage], current_step: int) -> str | None:
+		self.release.wait(timeout=5)
+		return f'Consolidated {len(messages)} messages at step {current_step}'
+
+
+async def test_memory_is_created_in_the_background_and_swapped_in_between_steps(make_message_manager):
+	message_manager = make_message_manager()
+	for i in range(3):
+		message_manager._add_message_with_tokens(HumanMessage(content=f'Action result: {i}'))
+	memory = SlowMemory(message_manager)
+
+	memory.start_procedural_memory(current_step=3)
+	await asyncio.sleep(0.05)
+	# the event loop is free and the agent keeps adding messages meanwhile
+	assert not memory.apply_procedural_memory()
+	message_manager._add_message_with_tokens(HumanMessage(content='Action result: 3'))
+
+	memory.release.set()
+	await asyncio.wait_for(asyncio.shield(memory._consolidation), timeout=5)  # type: ignore[arg-type]
+	assert memory.apply_procedural_memory()
+
+	history = message_manager.state.history
+	contents = [m.message.content for m in history.messages if m.metadata.message_type != 'init']
+	assert contents == ['Consolidated 4 messages at step 3', 'Action result: 3']
+	assert history.current_tokens == sum(m.metadata.tokens for m in history.messages)
+
+
+def test_memory_replaces_the_model_outputs_of_the_steps_as_well(make_state, make_message_manager):
+	message_manager = make_message_manager()
+	state = make_state()
+	for step in range(4):
+		result = [ActionResult(extracted_content=f'Found item {step}', include_in_memory=True)] if step else None
+		message_manager.add_state_message(state, result)
+		message_manager._remove_last_state_message()
+		brain = AgentBrain(evaluation_previous_goal='', memory='', next_goal=f'Find item {step}')
+		message_manager.add_model_output(AgentOutput(current_state=brain, action=[]))
+	memory = SlowMemory(message_manager)
+	memory.release.set()
+
+	memory.create_procedural_memory(current_step=4)
+
+	history = message_manager.state.history
+	assert [m.message.content for m in history.messages if m.metadata.message_type != 'init'] == [
+		'Consolidated 4 messages at step 4'
+	]
+	assert history.current_tokens == sum(m.metadata.tokens for m in history.messages)
@@ -0,0 +1,64 @@
+from pytest_httpserver import HTTPServer
+
+from browser_use.browser.context import BrowserContext
+from browser_use.dom.service import DomService
+
+DELEGATING_APP_PAGE = """<html><body>
+	<div id="root">
+		<div class="list">
+			<div class="row"><button>Add to cart</button></div>
+			<div class="row"><span class="like">Like</span></div>
+		</div>
+	</div>
+	<script>
+		// like React, the app handles the events of all its elements on the root container
+		const root = document.getElementById('root');
+		for (const type of ['click', 'mousedown', 'keydown', 'input', 'focus']) root.addEventListener(type, () => {});
+		document.querySelector('.like').addEventListener('click', () => {});
+	</script>
+</body></html>"""
+
+CARD_PAGE = """<html><body>
+	<div class="card">
+		<h2>Blue shoes</h2>
+		<a href="/reviews">12 reviews</a>
+	</div>
+	<script>
+		document.querySelector('.card').addEventListener('click', () => {});
+	</script>
+</body></html>"""
+
+NESTED_PAGE = """<html><body>
+	<a href="/account"><div style="cursor: pointer">My account</div></a>
+	<div onclick="void 0"><span style="cursor: pointer">Menu</span><button>Close</button></div>
+</body></html>"""
+
+
+async def get_selector_map(browser_context: BrowserContext, httpserver: HTTPServer, html: str, highlight_elements: bool = False):
+	httpserver.expect_request('/page').respond_with_data(html, content_type='text/html')
+	page = await browser_context.get_current_page()
+	await page.goto(httpserver.url_for('/page'))
+	dom_state = await DomService(page).get_clickable_elements(highlight_elements=highlight_elements)
+	return dom_state.selector_map
+
+
+async def test_listeners_of_the_app_root_do_not_hide_its_elements(browser_context, httpserver):
+	selector_map = await get_selector_map(browser_context, httpserver, DELEGATING_APP_PAGE)
+
+	elements = {(node.tag_name, node.get_all_text_till_next_clickable_element()) for node in selector_map.values()}
+	assert elements == {('button', 'Add to cart'), ('span', 'Like')}
+
+
+async def test_a_card_with_a_click_listener_and_a_link_keeps_both(browser_context, httpserver):
+	selector_map = await get_selector_map(browser_context, httpserver, CARD_PAGE)
+
+	assert [node.tag_name for node in selector_map.values()] == ['div', 'a']
+	assert selector_map[0].attributes['class'] == 'card'
+
+
+async def test_the_same_elements_get_indexes_with_and_without_highlights(browser_context, httpserver):
+	highlighted = await get_selector_map(browser_context, httpserver, NESTED_PAGE, highlight_elements=True)
+	plain = await get_selector_map(browser_context, httpserver, NESTED_PAGE, highlight_elements=False)
+
+	assert {index: node.xpath for index, node in plain.items()} == {index: node.xpath for index, node in highlighted.items()}
+	assert [node.tag_name for node in plain.values()] == ['a', 'div', 'button']
@@ -0,0 +1,78 @@
+import pytest
+
+from browser_use.dom.service import DROP_CHUNKS_JS, DomService, get_dom_processing_executor
+
+
+class ChunkServingPage:
+	"""Serves an extraction kept page-side in batches, like PULL_CHUNK_JS"""
+
+	def __init__(self, node_map: dict):
+		self.ids = list(node_map)
+		self.node_map = node_map
+		self.cursor = 0
+		self.pulls = 0
+		self.dropped: list[str] = []
+
+	async def evaluate(self, script: str, args):
+		if script == DROP_CHUNKS_JS:
+			self.dropped.append(args)
+			return True
+		extraction_id, chunk_size = args
+		self.pulls += 1
+		end = min(self.cursor + chunk_size, len(self.ids))
+		nodes = {id: self.node_map[id] for id in self.ids[self.cursor : end]}
+		self.cursor = end
+		return {'nodes': nodes, 'done': end >= len(self.ids)}
+
+
+def make_node_map() -> dict:
+	# the second section was deferred by a budget and is committed after the body
+	return {
+		'0': {'type': 'TEXT_NODE', 'text': 'Buy', 'isVisible': True},
+		'1': {
+			'tagName': 'button',
+			'xpath': 'html/body/div[1]/button',
+			'attributes': {},
+			'isVisible': True,
+			'highlightIndex': 0,
+			'children': ['0'],
+		},
+		'2': {'tagName': 'div', 'xpath': 'html/body/div[1]', 'attributes': {}, 'isVisible': True, 'children': ['1']},
+		'3': {'tagName': 'body', 'xpath': 'html/body', 'attributes': {}, 'isVisible': True, 'children': ['2', '5']},
+		'4': {
+			'tagName': 'a',
+			'xpath': 'html/body/div[2]/a',
+			'attributes': {},
+			'isVisible': True,
+			'highlightIndex': 1,
+			'children': [],
+		},
+		'5': {'tagName': 'div', 'xpath': 'html/body/div[2]', 'attributes': {}, 'isVisible': True, 'children': ['4']},
+	}
+
+
+@pytest.mark.parametrize('executor_kind', ['event_loop', 'thread', 'process'])
+async def test_chunked_transfer_builds_the_same_tree(executor_kind):
+	expected_tree, _ = await DomService(None)._construct_dom_tree({'rootId': '3', 'map': make_node_map()})  # type: ignore[arg-type]
+	page = ChunkServingPage(make_node_map())
+	dom_service = DomService(page, get_dom_processing_executor(executor_kind))  # type: ignore[arg-type]
+
+	element_tree, selector_map = await dom_service._construct_dom_tree_from_chunks('extraction', '3', chunk_size=2)
+
+	assert page.pulls == 3
+	assert page.dropped == []
+	assert element_tree.__json__() == expected_tree.__json__()
+	assert selector_map[1].parent is element_tree.children[1]
+	assert selector_map[0].get_all_text_till_next_clickable_element() == 'Buy'
+
+
+async def test_an_interrupted_transfer_releases_the_extraction_on_the_page():
+	node_map = make_node_map()
+	node_map['1']['viewportCoordinates'] = 'not coordinates'
+	page = ChunkServingPage(node_map)
+	dom_service = DomService(page)  # type: ignore[arg-type]
+
+	with pytest.raises(TypeError):
+		await dom_service._construct_dom_tree_from_chunks('extraction', '3', chunk_size=2)
+
+	assert page.dropped == ['extraction']
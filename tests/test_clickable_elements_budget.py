@@ -0,0 +1,128 @@
+import pytest
+from pydantic import ValidationError
+
+from browser_use.agent.message_manager.service import MessageManagerSettings
+from browser_use.dom.history_tree_processor.view import Coordinates, CoordinateSet, ViewportInfo
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+
+def make_button(parent: DOMElementNode, highlight_index: int, y: int, is_new: bool | None = None) -> DOMElementNode:
+	button = DOMElementNode(
+		tag_name='button',
+		xpath=f'html/body/button[{highlight_index + 1}]',
+		attributes={},
+		children=[],
+		is_visible=True,
+		parent=parent,
+		is_top_element=True,
+		highlight_index=highlight_index,
+		viewport_coordinates=CoordinateSet(
+			top_left=Coordinates(x=0, y=y),
+			top_right=Coordinates(x=100, y=y),
+			bottom_left=Coordinates(x=0, y=y + 20),
+			bottom_right=Coordinates(x=100, y=y + 20),
+			center=Coordinates(x=50, y=y + 10),
+			width=100,
+			height=20,
+		),
+		viewport_info=ViewportInfo(scroll_x=0, scroll_y=0, width=1000, height=800),
+	)
+	button.is_new = is_new
+	button.children.append(DOMTextNode(text=f'Button {highlight_index}', is_visible=True, parent=button))
+	parent.children.append(button)
+	return button
+
+
+def make_page(button_ys: list[int]) -> DOMElementNode:
+	body = DOMElementNode(
+		tag_name='body', xpath='', attributes={}, children=[], is_visible=True, parent=None, is_top_element=True
+	)
+	for highlight_index, y in enumerate(button_ys):
+		make_button(body, highlight_index, y)
+	return body
+
+
+def test_without_budget_renders_everything():
+	body = make_page([-500, 100, 2000])
+	assert body.clickable_elements_to_string() == body.clickable_elements_to_string(token_budget=10_000)
+	assert body.clickable_elements_to_string().count('<button') == 3
+
+
+def test_budget_keeps_elements_closest_to_viewport_in_document_order():
+	body = make_page([-2000, 100, 300, 1500, 5000])
+	line_tokens = len('[0]<button >Button 0 />') // 3 + 1
+
+	result = body.clickable_elements_to_string(token_budget=3 * line_tokens)
+
+	lines = result.split('\n')
+	assert lines[:3] == ['[1]<button >Button 1 />', '[2]<button >Button 2 />', '[3]<button >Button 3 />']
+	assert lines[3] == '... 2 interactive elements (0, 4) left out to save tokens - scroll or extract content to see more ...'
+
+
+def test_budget_prefers_new_elements_and_interactive_over_text():
+	body = make_page([100, 100, 100])
+	body.children[2].is_new = True
+	body.children.insert(0, DOMTextNode(text='Some long paragraph text', is_visible=True, parent=body))
+	line_tokens = len('*[2]*<button >Button 2 />') // 3 + 1
+
+	result = body.clickable_elements_to_string(token_budget=line_tokens)
+
+	assert result.split('\n') == [
+		'*[2]*<button >Button 2 />',
+		'... 2 interactive elements (0-1) and 1 text lines left out to save tokens - scroll or extract content to see more ...',
+	]
+
+
+def make_listing(items: int) -> DOMElementNode:
+	body = DOMElementNode(
+		tag_name='body', xpath='', attributes={}, children=[], is_visible=True, parent=None, is_top_element=True
+	)
+	highlight_index = 0
+	for i in range(items):
+		item = DOMElementNode(
+			tag_name='li', xpath='', attributes={}, children=[], is_visible=True, parent=body, is_top_element=True
+		)
+		body.children.append(item)
+		link = DOMElementNode(
+			tag_name='a',
+			xpath='',
+			attributes={'title': f'Product {i}', 'type': 'link'},
+			children=[],
+			is_visible=True,
+			parent=item,
+			is_top_element=True,
+			highlight_index=highlight_index,
+		)
+		link.children.append(DOMTextNode(text=f'Item {i}', is_visible=True, parent=link))
+		item.children.append(link)
+		item.children.append(DOMTextNode(text=f'${i}.99', is_visible=True, parent=item))
+		highlight_index += 1
+	return body
+
+
+def test_compact_repeated_elements_lists_varying_fields():
+	body = make_listing(4)
+
+	result = body.clickable_elements_to_string(include_attributes=['title', 'type'], compact_repeated_elements=2)
+
+	assert result.split('\n') == [
+		"[0]<a title='Product 0' type='link'>Item 0 />",
+		'$0.99',
+		"[1]<a title='Product 1' type='link'>Item 1 />",
+		'$1.99',
+		'... 2 more <li> with the same structure, one per line:',
+		"[2]Item 2 title='Product 2' | $2.99",
+		"[3]Item 3 title='Product 3' | $3.99",
+	]
+
+
+def test_compact_repeated_elements_keeps_short_runs():
+	body = make_listing(2)
+	assert body.clickable_elements_to_string(compact_repeated_elements=2) == body.clickable_elements_to_string()
+
+
+def test_compact_repeated_elements_must_keep_one_element_in_full():
+	with pytest.raises(ValueError):
+		make_listing(4).clickable_elements_to_string(compact_repeated_elements=0)
+	with pytest.raises(ValidationError):
+		MessageManagerSettings(compact_repeated_elements=0)
@@ -0,0 +1,57 @@
+import pytest
+
+from browser_use.dom.service import DomService, get_dom_processing_executor
+
+EVAL_PAGE = {
+	'rootId': '3',
+	'map': {
+		'0': {'type': 'TEXT_NODE', 'text': 'Buy', 'isVisible': True},
+		'1': {
+			'tagName': 'button',
+			'xpath': 'html/body/div/button',
+			'attributes': {'type': 'submit'},
+			'isVisible': True,
+			'isTopElement': True,
+			'highlightIndex': 0,
+			'viewportCoordinates': {'x': 10, 'y': 20, 'width': 100, 'height': 30},
+			'children': ['0'],
+		},
+		'2': {'tagName': 'div', 'xpath': 'html/body/div', 'attributes': {}, 'isVisible': True, 'children': ['1']},
+		'3': {'tagName': 'body', 'xpath': 'html/body', 'attributes': {}, 'isVisible': True, 'children': ['2']},
+	},
+}
+
+
+@pytest.mark.parametrize('executor_kind', ['thread', 'process'])
+async def test_executor_builds_the_same_tree_as_the_event_loop(executor_kind):
+	expected_tree, _ = await DomService(None)._construct_dom_tree(EVAL_PAGE)  # type: ignore[arg-type]
+
+	dom_service = DomService(None, get_dom_processing_executor(executor_kind))  # type: ignore[arg-type]
+	element_tree, selector_map = await dom_service._construct_dom_tree(EVAL_PAGE)
+
+	assert element_tree.__json__() == expected_tree.__json__()
+	assert selector_map[0].parent is element_tree.children[0]
+	assert selector_map[0].get_all_text_till_next_clickable_element() == 'Buy'
+
+
+async def test_process_executor_builds_deeply_nested_trees():
+	depth = 2000
+	node_map = {
+		str(i): {'tagName': 'div', 'xpath': 'div', 'attributes': {}, 'isVisible': True, 'children': [str(i + 1)]}
+		for i in range(depth)
+	}
+	node_map[str(depth)] = {'type': 'TEXT_NODE', 'text': 'Deep', 'isVisible': True}
+
+	dom_service = DomService(None, get_dom_processing_executor('process'))  # type: ignore[arg-type]
+	element_tree, _ = await dom_service._construct_dom_tree({'rootId': '0', 'map': node_map})
+
+	node = element_tree
+	for _ in range(depth):
+		assert node.children[0].parent is node
+		node = node.children[0]
+	assert node.text == 'Deep'  # type: ignore[attr-defined]
+
+
+def test_executors_are_shared():
+	assert get_dom_processing_executor('event_loop') is None
+	assert get_dom_processing_executor('thread') is get_dom_processing_executor('thread')
@@ -0,0 +1,52 @@
+from browser_use.agent.prompts import AgentMessagePrompt
+from browser_use.browser.views import BrowserState
+from browser_use.dom.service import DomService
+from browser_use.dom.views import DOMElementNode, DOMExtractionTruncation
+
+
+class FakePage:
+	url = 'https://example.com'
+
+
+def make_button(xpath: str, highlight_index: int) -> dict:
+	return {'tagName': 'button', 'xpath': xpath, 'attributes': {}, 'isVisible': True, 'highlightIndex': highlight_index}
+
+
+async def test_deferred_subtrees_are_linked_in_document_order():
+	# the second section was deferred by the budget: committed after the body, into the slot reserved for it
+	eval_page = {
+		'rootId': '2',
+		'map': {
+			'0': {**make_button('html/body/div[1]/button', 0), 'children': []},
+			'1': {'tagName': 'div', 'xpath': 'html/body/div[1]', 'attributes': {}, 'isVisible': True, 'children': ['0']},
+			'2': {'tagName': 'body', 'xpath': 'html/body', 'attributes': {}, 'isVisible': True, 'children': ['1', '4']},
+			'3': {**make_button('html/body/div[2]/button', 1), 'children': []},
+			'4': {'tagName': 'div', 'xpath': 'html/body/div[2]', 'attributes': {}, 'isVisible': True, 'children': ['3']},
+		},
+	}
+
+	element_tree, selector_map = await DomService(FakePage())._construct_dom_tree(eval_page)  # type: ignore[arg-type]
+
+	assert [child.xpath for child in element_tree.children] == ['html/body/div[1]', 'html/body/div[2]']
+	assert selector_map[1].parent is element_tree.children[1]
+
+
+def test_truncated_state_tells_the_llm_what_is_missing():
+	body = DOMElementNode(tag_name='body', xpath='html/body', attributes={}, children=[], is_visible=True, parent=None)
+	button = DOMElementNode(
+		tag_name='button', xpath='html/body/button', attributes={}, children=[], is_visible=True, parent=body, highlight_index=0
+	)
+	body.children.append(button)
+	state = BrowserState(
+		element_tree=body,
+		selector_map={0: button},
+		url='https://example.com',
+		title='Example',
+		tabs=[],
+		truncation=DOMExtractionTruncation(reason='nodes', visited_nodes=5000, skipped_subtrees=12, elapsed_ms=80),
+	)
+
+	elements_text = AgentMessagePrompt(state).get_elements_text()
+
+	assert '[0]<button' in elements_text
+	assert '12 parts furthest from the viewport left out' in elements_text
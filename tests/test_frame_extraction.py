@@ -0,0 +1,117 @@
+from browser_use.dom.service import DomService, FrameExtraction
+from browser_use.dom.views import DOMElementNode
+
+
+class FakeFrame:
+	def __init__(self, url: str, parent_frame: 'FakeFrame | None' = None):
+		self.url = url
+		self.parent_frame = parent_frame
+		self.evaluated: list[dict] = []
+
+	async def evaluate(self, script: str, args: dict):
+		self.evaluated.append(args)
+		return {'highlighted': True}
+
+
+class FakePage:
+	def __init__(self, frames: list[FakeFrame]):
+		self.frames = frames
+		self.main_frame = frames[0]
+		self.url = frames[0].url
+
+
+def make_frame_result() -> dict:
+	return {
+		'rootId': '1',
+		'map': {
+			'0': {
+				'tagName': 'button',
+				'xpath': 'html/body/button',
+				'attributes': {},
+				'isVisible': True,
+				'isTopElement': True,
+				'isInViewport': True,
+				'highlightIndex': 0,
+				'viewportCoordinates': {'x': 10, 'y': 20, 'width': 100, 'height': 30},
+				'children': [],
+			},
+			'1': {'tagName': 'body', 'xpath': 'html/body', 'attributes': {}, 'isVisible': True, 'children': ['0']},
+		},
+	}
+
+
+def make_page_tree() -> tuple[DOMElementNode, dict]:
+	body = DOMElementNode(tag_name='body', xpath='html/body', attributes={}, children=[], is_visible=True, parent=None)
+	button = DOMElementNode(
+		tag_name='button', xpath='html/body/button', attributes={}, children=[], is_visible=True, parent=body, highlight_index=0
+	)
+	iframe = DOMElementNode(tag_name='iframe', xpath='html/body/iframe', attributes={}, children=[], is_visible=True, parent=body)
+	body.children.extend([button, iframe])
+	return body, {0: button}
+
+
+def test_only_cross_origin_frames_are_extracted_separately():
+	main = FakeFrame('https://shop.example.com/')
+	widget = FakeFrame('https://widget.vendor.com/embed', parent_frame=main)
+	frames = [
+		main,
+		FakeFrame('https://shop.example.com/reviews', parent_frame=main),
+		widget,
+		FakeFrame('https://widget.vendor.com/inner', parent_frame=widget),
+		FakeFrame('https://payments.vendor.com/card', parent_frame=widget),
+		FakeFrame('https://ad.doubleclick.net/ad', parent_frame=main),
+		FakeFrame('about:blank', parent_frame=main),
+	]
+
+	unreachable = DomService(FakePage(frames))._get_unreachable_frames()  # type: ignore[arg-type]
+
+	assert [frame.url for frame in unreachable] == ['https://widget.vendor.com/embed', 'https://payments.vendor.com/card']
+
+
+async def test_frame_trees_continue_the_highlight_indices_of_the_page():
+	main = FakeFrame('https://shop.example.com/')
+	widget = FakeFrame('https://widget.vendor.com/embed', parent_frame=main)
+	dom_service = DomService(FakePage([main, widget]))  # type: ignore[arg-type]
+	element_tree, selector_map = make_page_tree()
+	frame_extraction = FrameExtraction(
+		frame=widget,  # type: ignore[arg-type]
+		extraction_id='widget',
+		eval_page=make_frame_result(),
+		iframe_xpath='html/body/iframe',
+		iframe_x=200,
+		iframe_y=300,
+	)
+
+	await dom_service._attach_frames(element_tree, selector_map, [frame_extraction], True, -1, 'dom')
+
+	button = selector_map[1]
+	assert button.frame_url == 'https://widget.vendor.com/embed'
+	assert button.node_ref is not None and (button.node_ref.extraction_id, button.node_ref.index) == ('widget', 0)
+	assert button.parent is not None and button.parent.parent is element_tree.children[1]
+	assert button.viewport_coordinates is not None and button.viewport_coordinates.top_left.y == 320
+	assert widget.evaluated[0]['highlightExtractionId'] == 'widget'
+	assert widget.evaluated[0]['highlightIndexOffset'] == 1
+	assert '[1]<button' in element_tree.clickable_elements_to_string()
+
+
+async def test_frame_trees_continue_after_the_highest_page_index():
+	main = FakeFrame('https://shop.example.com/')
+	widget = FakeFrame('https://widget.vendor.com/embed', parent_frame=main)
+	dom_service = DomService(FakePage([main, widget]))  # type: ignore[arg-type]
+	element_tree, selector_map = make_page_tree()
+	# a budgeted extraction left a gap between the page's indexes
+	selector_map[4] = selector_map[0]
+	frame_extraction = FrameExtraction(
+		frame=widget,  # type: ignore[arg-type]
+		extraction_id='widget',
+		eval_page=make_frame_result(),
+		iframe_xpath='html/body/iframe',
+		iframe_x=0,
+		iframe_y=0,
+	)
+
+	await dom_service._attach_frames(element_tree, selector_map, [frame_extraction], True, -1, 'dom')
+
+	assert sorted(selector_map) == [0, 4, 5]
+	assert selector_map[5].frame_url == 'https://widget.vendor.com/embed'
+	assert widget.evaluated[0]['highlightIndexOffset'] == 5
@@ -0,0 +1,108 @@
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from browser_use.agent.message_manager.service import MessageManager
+from browser_use.agent.views import ActionResult, AgentBrain, AgentOutput
+
+
+def run_steps(message_manager: MessageManager, make_state, steps: range) -> None:
+	for step in steps:
+		result = [ActionResult(extracted_content=f'Found item {step - 1}', include_in_memory=True)] if step > 1 else None
+		message_manager.add_state_message(make_state(), result)
+		message_manager._remove_last_state_message()
+		output = AgentOutput(
+			current_state=AgentBrain(evaluation_previous_goal='', memory=f'{step} items found', next_goal=f'Find item {step}'),
+			action=[],
+		)
+		message_manager.add_model_output(output)
+
+
+def get_summary(message_manager: MessageManager) -> str:
+	return next(
+		str(m.message.content) for m in message_manager.state.history.messages if m.metadata.message_type == 'history_summary'
+	)
+
+
+def test_older_steps_are_folded_into_the_summary_in_batches(make_state, make_message_manager):
+	message_manager = make_message_manager(history_compaction=True, history_keep_steps=3, history_fold_steps=5)
+	run_steps(message_manager, make_state, range(1, 10))
+
+	summary = get_summary(message_manager)
+	assert summary.startswith('[Summary of steps 1-5 of the task history')
+	assert 'Step 1: Find item 1' in summary
+	assert 'Action result: Found item 5' in summary
+	assert 'Memory after step 5: 5 items found' in summary
+
+	# the history is unchanged until the next batch is complete
+	history = list(message_manager.state.history.messages)
+	run_steps(message_manager, make_state, range(10, 14))
+	assert message_manager.state.history.messages[: len(history)] == history
+
+	message_manager.add_state_message(make_state(), [ActionResult(extracted_content='Found item 13', include_in_memory=True)])
+	assert len(message_manager._get_history_steps()) == 3
+	assert get_summary(message_manager).startswith('[Summary of steps 1-10 of the task history')
+	assert message_manager.state.history.current_tokens == sum(m.metadata.tokens for m in message_manager.state.history.messages)
+
+
+def test_history_is_kept_under_the_token_target(make_state, make_message_manager):
+	message_manager = make_message_manager(history_compaction=True, history_keep_steps=50)
+	run_steps(message_manager, make_state, range(1, 6))
+	target = message_manager.state.history.current_tokens
+
+	message_manager.settings.history_token_target = target
+	run_steps(message_manager, make_state, range(6, 200))
+	message_manager.compact_history()
+
+	assert message_manager.state.history.current_tokens <= target
+	assert message_manager.state.history_summary.folded_steps + len(message_manager._get_history_steps()) == 199
+	assert 'were left out' in get_summary(message_manager)
+
+
+async def test_llm_rewrites_the_folded_steps(make_state, make_message_manager):
+	message_manager = make_message_manager(
+		history_compaction=True, history_keep_steps=2, history_fold_steps=1, history_summary_min_steps=3
+	)
+	run_steps(message_manager, make_state, range(1, 6))
+	llm = GenericFakeChatModel(messages=iter([AIMessage(content='Found items 1 to 3.')]))
+
+	await message_manager.acompact_history(llm)
+
+	summary = message_manager.state.history_summary
+	assert summary.text == 'Found items 1 to 3.'
+	assert summary.steps == [] and summary.summarized_steps == 3
+	assert 'Found items 1 to 3.' in get_summary(message_manager)
+
+
+async def test_llm_waits_for_enough_folded_steps(make_state, make_message_manager):
+	message_manager = make_message_manager(
+		history_compaction=True, history_keep_steps=2, history_fold_steps=1, history_summary_min_steps=4
+	)
+	run_steps(message_manager, make_state, range(1, 6))
+	llm = GenericFakeChatModel(messages=iter([AIMessage(content='Found items 1 to 4.')]))
+
+	await message_manager.acompact_history(llm)
+	assert message_manager.state.history_summary.text == ''
+	assert len(message_manager.state.history_summary.steps) == 3
+
+	run_steps(message_manager, make_state, range(6, 7))
+	await message_manager.acompact_history(llm)
+	assert message_manager.state.history_summary.text == 'Found items 1 to 4.'
+
+
+def test_superseded_full_states_are_folded_with_their_steps(make_state, make_message_manager):
+	message_manager = make_message_manager(history_compaction=True, history_keep_steps=2, history_fold_steps=1, state_delta=True)
+	for step in range(1, 6):
+		message_manager.add_state_message(make_state(f'https://example.com/{step}'))
+		message_manager._remove_last_state_message()
+		output = AgentOutput(
+			current_state=AgentBrain(evaluation_previous_goal='', memory='', next_goal=f'Open page {step}'), action=[]
+		)
+		message_manager.add_model_output(output)
+	message_manager.add_state_message(make_state())
+
+	contents = [str(m.message.content) for m in message_manager.state.history.messages]
+	# the full states up to step 4 came before the model outputs of the folded steps 1-3
+	full_states = [content for content in contents if content.startswith('[Full page state')]
+	assert len(full_states) == 2
+	assert 'https://example.com/5' in full_states[0]
+	assert '[Full page state' not in get_summary(message_manager)
@@ -0,0 +1,68 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from browser_use.agent.llm_cache import DiskCacheBackend, LLMCacheMissError, LLMResponseCache, MemoryCacheBackend
+from browser_use.agent.service import Agent
+from browser_use.browser.browser import Browser, BrowserConfig
+from browser_use.browser.context import BrowserContext, BrowserContextConfig
+
+
+def make_llm(cache: LLMResponseCache, *answers: str) -> GenericFakeChatModel:
+	return GenericFakeChatModel(messages=iter([AIMessage(content=answer) for answer in answers]), cache=cache)
+
+
+def test_identical_calls_are_answered_from_the_cache(tmp_path):
+	cache = LLMResponseCache(DiskCacheBackend(tmp_path))
+	messages = [HumanMessage(content='Current url: https://example.com\nCurrent date and time: 2025-01-01 10:00')]
+	later_messages = [HumanMessage(content='Current url: https://example.com\nCurrent date and time: 2025-01-02 18:30')]
+
+	first = make_llm(cache, 'click 3', 'scroll down').invoke(messages)
+	# a new run at another time, with a fresh cache instance on the same directory
+	rerun = make_llm(LLMResponseCache(DiskCacheBackend(tmp_path)), 'should not be used').invoke(later_messages)
+	other_page = make_llm(cache, 'go back').invoke([HumanMessage(content='Current url: https://example.org')])
+
+	assert first.content == rerun.content == 'click 3'
+	assert other_page.content == 'go back'
+
+
+def test_replay_never_queries_the_llm():
+	cache = LLMResponseCache(MemoryCacheBackend(), mode='replay')
+
+	with pytest.raises(LLMCacheMissError):
+		make_llm(cache, 'click 3').invoke([HumanMessage(content='Find red shoes')])
+
+
+def test_expired_and_evicted_responses_are_not_used():
+	messages = [HumanMessage(content='Find red shoes')]
+	expiring = LLMResponseCache(ttl_seconds=-1)
+	make_llm(expiring, 'click 3').invoke(messages)
+	evicting = LLMResponseCache(MemoryCacheBackend(max_entries=1))
+	make_llm(evicting, 'click 3').invoke(messages)
+	make_llm(evicting, 'go back').invoke([HumanMessage(content='Find blue shoes')])
+
+	assert make_llm(expiring, 'click 4').invoke(messages).content == 'click 4'
+	assert make_llm(evicting, 'click 4').invoke(messages).content == 'click 4'
+
+
+def test_agent_binds_the_cache_on_copies_of_its_models():
+	browser = Mock(spec=Browser)
+	browser.config = BrowserConfig()
+	browser_context = Mock(spec=BrowserContext)
+	browser_context.config = BrowserContextConfig()
+	browser_context.get_state = AsyncMock()
+	answers = iter([AIMessage(content='Paris')])
+	llm = GenericFakeChatModel(messages=answers)
+	cache = LLMResponseCache(mode='replay')
+
+	agent = Agent(
+		task='Test task', llm=llm, browser=browser, browser_context=browser_context, llm_cache=cache, enable_memory=False
+	)
+
+	assert llm.cache is None
+	assert agent.llm.cache is cache
+	assert agent.settings.page_extraction_llm is agent.llm
+	# the connection check is skipped in replay mode
+	assert next(answers).content == 'Paris'
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from mem0 import Memory as Mem0Memory
+from mem0.embeddings.base import EmbeddingBase
+from mem0.utils.factory import EmbedderFactory, VectorStoreFactory
+
+from browser_use.agent.memory import registry
+from browser_use.agent.memory.registry import SharedEmbeddings, get_shared_embeddings, shared_vector_stores
+from browser_use.agent.memory.views import MemoryConfig
+
+
+class CountingModel:
+	def __init__(self):
+		self.batches: list[list[str]] = []
+
+	def encode(self, texts: list[str], convert_to_numpy: bool = True):
+		self.batches.append(texts)
+		return _Array([[float(len(text))] for text in texts])
+
+
+class _Array(list):
+	def tolist(self):
+		return list(self)
+
+
+class CountingEmbedder(EmbeddingBase):
+	def __init__(self):
+		super().__init__()
+		self.model = CountingModel()
+
+	def embed(self, text, memory_action=None):
+		raise AssertionError('texts should be embedded in batches')
+
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch):
+	monkeypatch.setattr(registry, '_embeddings', {})
+	monkeypatch.setattr(registry, '_vector_stores', {})
+	monkeypatch.setattr(EmbedderFactory, 'create', lambda provider, config, vector_config: CountingEmbedder())
+
+
+def test_texts_that_arrive_while_embedding_are_embedded_in_one_batch():
+	embedder = CountingEmbedder()
+	embeddings = SharedEmbeddings(embedder)
+	encode = embedder.model.encode
+
+	def slow_encode(texts: list[str], convert_to_numpy: bool = True):
+		# the first text is embedded right away, the others arrive in the meantime
+		if not embedder.model.batches:
+			while len(embeddings._pending) < 4:
+				time.sleep(0.01)
+		return encode(texts, convert_to_numpy)
+
+	embedder.model.encode = slow_encode  # type: ignore[method-assign]
+	results: dict[str, list[float]] = {}
+
+	def embed(text: str):
+		results[text] = embeddings.embed_query(text)
+
+	first = threading.Thread(target=embed, args=('x',))
+	first.start()
+	while not embeddings._embedding:
+		time.sleep(0.01)
+	threads = [threading.Thread(target=embed, args=('x' * i,)) for i in range(2, 6)]
+	for thread in threads:
+		thread.start()
+	for thread in [first, *threads]:
+		thread.join()
+
+	assert [len(batch) for batch in embedder.model.batches] == [1, 4]
+	assert results == {'x' * i: [float(i)] for i in range(1, 6)}
+	assert embeddings.embed_query('alone') == [5.0]
+	assert embedder.model.batches[-1] == ['alone']
+
+
+def test_agents_with_the_same_config_share_embedder_and_vector_store():
+	config = MemoryConfig(embedder_provider='openai', embedder_model='text-embedding-3-small', embedder_dims=1536)
+	other_config = MemoryConfig(embedder_provider='openai', embedder_model='text-embedding-3-large', embedder_dims=3072)
+
+	assert get_shared_embeddings(config) is get_shared_embeddings(config.model_copy())
+	assert get_shared_embeddings(config) is not get_shared_embeddings(other_config)
+
+
+def test_mem0_memories_open_each_vector_store_once(monkeypatch, tmp_path):
+	opened: list[tuple[str, str]] = []
+	monkeypatch.setattr(
+		VectorStoreFactory, 'create', lambda provider, config: opened.append((config.collection_name, config.path)) or object()
+	)
+	config = MemoryConfig(vector_store_base_path=str(tmp_path / 'mem0'))
+
+	memories = []
+	for _ in range(2):
+		config_dict = {
+			'embedder': {'provider': 'langchain', 'config': {'model': get_shared_embeddings(config), 'embedding_dims': 384}},
+			'llm': {'provider': 'langchain', 'config': {'model': GenericFakeChatModel(messages=iter([]))}},
+			'vector_store': config.vector_store_config_dict,
+			'history_db_path': str(tmp_path / 'history.db'),
+		}
+		with shared_vector_stores():
+			memories.append(Mem0Memory.from_config(config_dict=config_dict))
+
+	# the memories of the agents and the telemetry of mem0 are different collections
+	assert [collection for collection, _ in opened] == ['mem0', 'mem0_migrations']
+	assert memories[0].vector_store is memories[1].vector_store
+	assert memories[0]._telemetry_vector_store is memories[1]._telemetry_vector_store
+	assert memories[0].vector_store is not memories[0]._telemetry_vector_store
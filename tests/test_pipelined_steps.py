@@ -0,0 +1,45 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from browser_use.agent.service import Agent
+from browser_use.browser.browser import Browser, BrowserConfig
+from browser_use.browser.context import BrowserContext, BrowserContextConfig
+
+
+def make_agent() -> Agent:
+	browser = Mock(spec=Browser)
+	browser.config = BrowserConfig()
+	browser_context = Mock(spec=BrowserContext)
+	browser_context.config = BrowserContextConfig()
+	browser_context.get_state = AsyncMock(return_value='fresh state')
+	return Agent(
+		task='Test task',
+		llm=Mock(spec=BaseChatModel),
+		browser=browser,
+		browser_context=browser_context,
+		pipeline_steps=True,
+		enable_memory=False,
+	)
+
+
+async def test_step_uses_the_state_captured_ahead():
+	agent = make_agent()
+	agent._next_state = asyncio.create_task(asyncio.sleep(0, result='captured ahead'))
+
+	assert await agent._get_step_state() == 'captured ahead'
+	assert await agent._get_step_state() == 'fresh state'
+	agent.browser_context.get_state.assert_awaited_once()  # type: ignore[attr-defined]
+
+
+async def test_stopping_discards_the_state_captured_ahead():
+	agent = make_agent()
+	next_state = asyncio.create_task(asyncio.sleep(10, result='captured ahead'))
+	agent._next_state = next_state
+
+	agent.stop()
+	await asyncio.sleep(0)
+
+	assert next_state.cancelled()
+	assert await agent._get_step_state() == 'fresh state'
@@ -0,0 +1,48 @@
+from browser_use.agent.message_manager.service import MessageManager
+from browser_use.agent.views import ActionResult, AgentBrain, AgentOutput
+
+
+def run_step(
+	message_manager: MessageManager,
+	make_state,
+	url: str,
+	page_actions: str | None,
+	result: list[ActionResult] | None = None,
+):
+	message_manager.add_state_message(make_state(url), result, page_actions=page_actions)
+	messages = message_manager.get_messages()
+	message_manager._remove_last_state_message()
+	output = AgentOutput(current_state=AgentBrain(evaluation_previous_goal='', memory='', next_goal=''), action=[])
+	message_manager.add_model_output(output)
+	return messages
+
+
+def test_only_the_state_message_changes_between_steps(make_state, make_message_manager):
+	message_manager = make_message_manager()
+
+	first = run_step(message_manager, make_state, 'https://docs.google.com', 'save_as_pdf: Save the document')
+	second = run_step(message_manager, make_state, 'https://example.com', None)
+
+	assert second[: len(first) - 1] == first[:-1]
+	assert 'save_as_pdf' in str(first[-1].content)
+	assert not any('save_as_pdf' in str(message.content) for message in second)
+
+
+def test_cache_markers_end_the_stable_prefix_without_changing_the_history(make_state, make_message_manager):
+	message_manager = make_message_manager(prompt_cache_markers=True)
+	run_step(message_manager, make_state, 'https://example.com', None)
+
+	messages = run_step(
+		message_manager,
+		make_state,
+		'https://example.com',
+		None,
+		[ActionResult(extracted_content='Clicked', include_in_memory=True)],
+	)
+
+	marked = [
+		i for i, message in enumerate(messages) if isinstance(message.content, list) and 'cache_control' in message.content[-1]
+	]
+	assert marked == [0, len(messages) - 2]
+	assert messages[-2].content[-1]['text'] == 'Action result: Clicked'  # type: ignore[index]
+	assert all(isinstance(m.message.content, str) for m in message_manager.state.history.messages)
@@ -0,0 +1,68 @@
+import base64
+import io
+
+import pytest
+
+from browser_use.browser.utils.screenshot_highlights import HIGHLIGHT_COLORS, draw_highlights_on_screenshot
+from browser_use.dom.history_tree_processor.view import Coordinates, CoordinateSet, ViewportInfo
+from browser_use.dom.views import DOMElementNode
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def make_screenshot(width: int, height: int) -> str:
+	buffer = io.BytesIO()
+	Image.new('RGB', (width, height), (255, 255, 255)).save(buffer, format='PNG')
+	return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def make_element(highlight_index: int, x: int, y: int, width: int, height: int) -> DOMElementNode:
+	return DOMElementNode(
+		tag_name='button',
+		xpath=f'html/body/button[{highlight_index + 1}]',
+		attributes={},
+		children=[],
+		is_visible=True,
+		parent=None,
+		highlight_index=highlight_index,
+		viewport_coordinates=CoordinateSet(
+			top_left=Coordinates(x=x, y=y),
+			top_right=Coordinates(x=x + width, y=y),
+			bottom_left=Coordinates(x=x, y=y + height),
+			bottom_right=Coordinates(x=x + width, y=y + height),
+			center=Coordinates(x=x + width // 2, y=y + height // 2),
+			width=width,
+			height=height,
+		),
+		viewport_info=ViewportInfo(scroll_x=0, scroll_y=0, width=400, height=300),
+	)
+
+
+def decode(screenshot_b64: str):
+	return Image.open(io.BytesIO(base64.b64decode(screenshot_b64))).convert('RGB')
+
+
+def test_draws_outline_in_highlight_color():
+	screenshot = make_screenshot(400, 300)
+	result = decode(draw_highlights_on_screenshot(screenshot, {0: make_element(0, 50, 100, 200, 100)}))
+
+	assert result.size == (400, 300)
+	assert result.getpixel((50, 150)) == HIGHLIGHT_COLORS[0]  # left border
+	assert result.getpixel((0, 0)) == (255, 255, 255)  # outside of the box
+
+
+def test_scales_css_pixels_to_device_pixels():
+	# device pixel ratio 2: the screenshot is twice as large as the viewport
+	screenshot = make_screenshot(800, 600)
+	result = decode(draw_highlights_on_screenshot(screenshot, {1: make_element(1, 50, 100, 200, 100)}))
+
+	assert result.getpixel((100, 300)) == HIGHLIGHT_COLORS[1]
+	assert result.getpixel((50, 150)) == (255, 255, 255)
+
+
+def test_returns_screenshot_unchanged_without_coordinates():
+	screenshot = make_screenshot(400, 300)
+	element = make_element(0, 50, 100, 200, 100)
+	element.viewport_coordinates = None
+
+	assert draw_highlights_on_screenshot(screenshot, {0: element}) == screenshot
@@ -0,0 +1,127 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+from browser_use.agent.message_manager.service import SUPERSEDED_STATE_BASE, MessageManager
+
+
+@pytest.fixture
+def message_manager(make_message_manager):
+	return make_message_manager(state_delta=True)
+
+
+def get_state_message(message_manager: MessageManager) -> str:
+	message = message_manager.get_messages()[-1]
+	assert isinstance(message, HumanMessage) and isinstance(message.content, str)
+	return message.content
+
+
+def get_base_messages(message_manager: MessageManager) -> list[str]:
+	return [str(m.message.content) for m in message_manager.state.history.messages if m.metadata.message_type == 'state_base']
+
+
+def test_first_state_is_kept_in_full(message_manager, make_state):
+	message_manager.add_state_message(make_state(buttons=['A', 'B', 'C']), use_vision=False)
+
+	base_messages = get_base_messages(message_manager)
+	assert len(base_messages) == 1
+	assert '[0]<button >A />' in base_messages[0]
+	assert 'No changes since the full page state above.' in get_state_message(message_manager)
+
+
+def test_only_changes_are_sent(message_manager, make_state):
+	message_manager.add_state_message(make_state(buttons=['A', 'B', 'C', 'D']), use_vision=False)
+	message_manager._remove_last_state_message()
+
+	message_manager.add_state_message(make_state(buttons=['A', 'B', 'C', 'E']), use_vision=False)
+
+	state_message = get_state_message(message_manager)
+	assert '[3]<button >E />' in state_message
+	assert '[0]<button >A />' not in state_message
+	assert len(get_base_messages(message_manager)) == 1
+
+
+def test_full_state_again_after_navigation(message_manager, make_state):
+	message_manager.add_state_message(make_state(buttons=['A', 'B']), use_vision=False)
+	message_manager._remove_last_state_message()
+
+	message_manager.add_state_message(make_state('https://example.com/other', ['A', 'B']), use_vision=False)
+
+	base_messages = get_base_messages(message_manager)
+	assert len(base_messages) == 1
+	assert 'https://example.com/other' in base_messages[0]
+
+
+async def test_history_is_only_changed_on_the_event_loop(message_manager, make_state):
+	message_manager.add_state_message(make_state(buttons=['A', 'B', 'C', 'D']), use_vision=False)
+	message_manager._remove_last_state_message()
+	history = message_manager.state.history
+	render_state_message = message_manager._render_state_message
+	rendered_with = []
+
+	def render_in_thread(*args):
+		messages = list(history.messages)
+		rendered = render_state_message(*args)
+		rendered_with.append(messages == history.messages)
+		return rendered
+
+	message_manager._render_state_message = render_in_thread
+	await message_manager.aadd_state_message(make_state(buttons=['A', 'B', 'C', 'E']), use_vision=False)
+
+	assert rendered_with == [True]
+	assert '[3]<button >E />' in get_state_message(message_manager)
+	assert message_manager.state.state_delta_base.state_messages == 1  # type: ignore[union-attr]
+	assert history.current_tokens == sum(m.metadata.tokens for m in history.messages)
+
+
+def test_delta_keeps_the_scroll_hints(message_manager, make_state):
+	state = make_state(buttons=['A', 'B'])
+	state.pixels_above, state.pixels_below = 0, 0
+	message_manager.add_state_message(state, use_vision=False)
+	message_manager._remove_last_state_message()
+
+	state = make_state(buttons=['A', 'C'])
+	state.pixels_above, state.pixels_below = 300, 1200
+	message_manager.add_state_message(state, use_vision=False)
+
+	state_message = get_state_message(message_manager)
+	assert '... 300 pixels above - scroll or extract content to see more ...' in state_message
+	assert '... 1200 pixels below - scroll or extract content to see more ...' in state_message
+
+
+def test_new_base_is_appended_without_changing_the_history_before(message_manager, make_state):
+	message_manager.add_state_message(make_state(buttons=['A', 'B']), use_vision=False)
+	message_manager._remove_last_state_message()
+	history_before = [m.message.content for m in message_manager.state.history.messages]
+
+	message_manager.add_state_message(make_state('https://example.com/other', ['A', 'B']), use_vision=False)
+
+	history = [m.message.content for m in message_manager.state.history.messages]
+	assert history[: len(history_before)] == history_before
+	base_messages = get_base_messages(message_manager)
+	assert len(base_messages) == 1
+	assert 'https://example.com/other' in base_messages[0]
+
+
+def test_many_new_bases_keep_the_prompt_bounded(message_manager, make_state):
+	tokens = []
+	for page in range(30):
+		message_manager.add_state_message(make_state(f'https://example.com/{page:02}', ['A', 'B', 'C']), use_vision=False)
+		message_manager._remove_last_state_message()
+		tokens.append(message_manager.state.history.current_tokens)
+
+	# the last base and the one before it, which the messages after it may still refer to
+	message_types = [m.metadata.message_type for m in message_manager.state.history.messages]
+	assert message_types.count('state_base') == message_types.count(SUPERSEDED_STATE_BASE) == 1
+	assert tokens[-1] == tokens[2]
+
+
+def test_base_only_has_the_elements_within_the_token_budget(message_manager, make_state, monkeypatch):
+	monkeypatch.setattr(message_manager, '_get_elements_token_budget', lambda *args: 20)
+	message_manager.add_state_message(make_state(buttons=[f'Item {i}' for i in range(10)]), use_vision=False)
+
+	base_message = get_base_messages(message_manager)[0]
+	assert 'left out to save tokens' in base_message
+	shown = {index for index, _ in message_manager.state.state_delta_base.elements.values()}  # type: ignore[union-attr]
+	assert shown and len(shown) < 10
+	assert all(f'[{index}]<button' in base_message for index in shown)
+	assert not any(f'[{index}]<button' in base_message for index in set(range(10)) - shown)
@@ -0,0 +1,154 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, Mock
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from browser_use.agent.message_manager.utils import ActionStreamParser
+from browser_use.agent.service import Agent
+from browser_use.agent.views import ActionResult
+from browser_use.browser.browser import Browser, BrowserConfig
+from browser_use.browser.context import BrowserContext, BrowserContextConfig
+
+CURRENT_STATE = {
+	'evaluation_previous_goal': 'Success - the {search} page "loaded"',
+	'memory': 'Searching for [shoes]',
+	'next_goal': 'Type the query and submit',
+}
+OUTPUT = json.dumps(
+	{
+		'current_state': CURRENT_STATE,
+		'action': [{'input_text': {'index': 3, 'text': 'red shoes}'}}, {'click_element_by_index': {'index': 4}}],
+	}
+)
+
+
+def make_agent(output: str) -> Agent:
+	browser = Mock(spec=Browser)
+	browser.config = BrowserConfig()
+	browser_context = Mock(spec=BrowserContext)
+	browser_context.config = BrowserContextConfig()
+	browser_context.get_state = AsyncMock()
+	llm = GenericFakeChatModel(messages=iter([AIMessage(content=output)]))
+	llm._verified_api_keys = True  # type: ignore[attr-defined]
+	return Agent(
+		task='Test task',
+		llm=llm,
+		browser=browser,
+		browser_context=browser_context,
+		tool_calling_method='raw',
+		stream_actions=True,
+		enable_memory=False,
+	)
+
+
+def test_parser_hands_out_each_action_once_it_is_complete():
+	parser = ActionStreamParser()
+	text = f'```json\n{OUTPUT}\n```'
+	second_action_start = text.index('{"click_element_by_index"')
+
+	before_second_action = [piece for char in text[:second_action_start] for piece in parser.feed(char)]
+	rest = [piece for char in text[second_action_start:] for piece in parser.feed(char)]
+
+	assert before_second_action == [
+		('current_state', CURRENT_STATE),
+		('action', {'input_text': {'index': 3, 'text': 'red shoes}'}}),
+	]
+	assert rest == [('action', {'click_element_by_index': {'index': 4}})]
+
+
+def test_parser_skips_json_in_the_reasoning():
+	parser = ActionStreamParser()
+	reasoning = '<think>Maybe {"current_state": {}, "action": [{"go_back": {}}]} would do.</think>'
+
+	pieces = [piece for char in f'{reasoning}\n{OUTPUT}' for piece in parser.feed(char)]
+
+	assert [key for key, _ in pieces] == ['current_state', 'action', 'action']
+	assert {'go_back': {}} not in [value for _, value in pieces]
+
+
+async def test_streamed_actions_are_queued_before_the_output_is_returned():
+	agent = make_agent(OUTPUT)
+	streamed_actions = asyncio.Queue()
+
+	model_output = await agent.stream_next_action([HumanMessage(content='Find red shoes')], streamed_actions)
+
+	queued = [streamed_actions.get_nowait() for _ in range(streamed_actions.qsize())]
+	assert queued[-1] is None
+	assert [action.model_dump(exclude_unset=True) for action in queued[:-1]] == [
+		action.model_dump(exclude_unset=True) for action in model_output.action
+	]
+	assert model_output.action[1].get_index() == 4
+
+
+async def test_broken_output_keeps_the_actions_that_already_ran():
+	agent = make_agent(OUTPUT[: OUTPUT.index('{"click_element_by_index"')] + '{"click_element_by_')
+	streamed_actions = asyncio.Queue()
+
+	model_output = await agent.stream_next_action([HumanMessage(content='Find red shoes')], streamed_actions)
+
+	assert [action.get_index() for action in model_output.action] == [3]
+	assert model_output.current_state.next_goal == 'Type the query and submit'
+
+
+class ToolStreamingChatModel(GenericFakeChatModel):
+	"""Streams the output as the arguments of a tool call, after a thinking block like Anthropic"""
+
+	output: str = ''
+
+	def bind_tools(self, tools, **kwargs):
+		return self
+
+	async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+		yield ChatGenerationChunk(message=AIMessageChunk(content=[{'type': 'thinking', 'thinking': 'Search', 'index': 0}]))
+		yield ChatGenerationChunk(
+			message=AIMessageChunk(
+				content='', tool_call_chunks=[{'name': 'AgentOutput', 'args': '', 'id': 'toolu_1', 'index': 1}]
+			)
+		)
+		for start in range(0, len(self.output), 20):
+			tool_call_chunk = {'name': None, 'args': self.output[start : start + 20], 'id': None, 'index': 1}
+			yield ChatGenerationChunk(message=AIMessageChunk(content='', tool_call_chunks=[tool_call_chunk]))
+
+
+async def test_actions_are_streamed_from_a_tool_call_after_other_blocks():
+	agent = make_agent(OUTPUT)
+	agent.llm = ToolStreamingChatModel(messages=iter([]), output=OUTPUT)
+	agent.tool_calling_method = 'tools'
+	streamed_actions = asyncio.Queue()
+
+	model_output = await agent.stream_next_action([HumanMessage(content='Find red shoes')], streamed_actions)
+
+	assert streamed_actions.qsize() == 3
+	assert [action.get_index() for action in model_output.action] == [3, 4]
+
+
+async def test_actions_that_ran_are_kept_when_the_stream_fails(make_state):
+	acted = asyncio.Event()
+
+	class FailingChatModel(GenericFakeChatModel):
+		async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+			yield ChatGenerationChunk(message=AIMessageChunk(content=OUTPUT[: OUTPUT.index('{"click_element_by_index"')]))
+			await acted.wait()
+			raise ConnectionError('Stream interrupted')
+
+	async def act(*args, **kwargs) -> ActionResult:
+		acted.set()
+		return ActionResult(extracted_content='Typed red shoes', include_in_memory=True)
+
+	agent = make_agent(OUTPUT)
+	agent.llm = FailingChatModel(messages=iter([]))
+	agent.browser_context.get_state = AsyncMock(return_value=make_state(buttons=['Search', 'Buy']))
+	agent.browser_context.get_current_page = AsyncMock(return_value=Mock(url='https://example.com'))
+	agent.browser_context.get_selector_map = AsyncMock(return_value={})
+	agent.browser_context.remove_highlights = AsyncMock()
+	agent.controller.act = act  # type: ignore[method-assign]
+
+	await agent.step()
+
+	result = agent.state.history.history[-1].result
+	assert result[0].extracted_content == 'Typed red shoes'
+	assert result[-1].error is not None
+	assert agent.state.last_result == result
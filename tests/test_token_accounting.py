@@ -0,0 +1,123 @@
+import base64
+import struct
+
+import tiktoken
+from langchain_core.messages import HumanMessage
+
+from browser_use.agent.message_manager import tokenizers
+from browser_use.agent.message_manager.tokenizers import (
+	AnthropicTokenizer,
+	CharacterEstimateTokenizer,
+	TiktokenTokenizer,
+	Tokenizer,
+	get_image_size,
+	get_tokenizer,
+)
+
+
+class WordTokenizer(Tokenizer):
+	def __init__(self):
+		super().__init__()
+		self.counted: list[str] = []
+
+	def _count_text_tokens(self, text: str) -> int:
+		self.counted.append(text)
+		return len(text.split())
+
+
+def make_screenshot(width: int, height: int) -> str:
+	header = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', width, height) + b'\x08\x02\x00\x00\x00'
+	return base64.b64encode(header).decode()
+
+
+def test_texts_are_counted_once_per_content():
+	tokenizer = WordTokenizer()
+
+	assert tokenizer.count_text_tokens('one two three') == 3
+	assert tokenizer.count_text_tokens('one two three') == 3
+	assert tokenizer.counted == ['one two three']
+
+
+async def test_encoding_is_loaded_once_in_the_background(monkeypatch):
+	class WordEncoding:
+		def encode(self, text: str, disallowed_special=()) -> list[str]:
+			return text.split()
+
+	loaded: list[str] = []
+	monkeypatch.setattr(tiktoken, 'get_encoding', lambda name: loaded.append(name) or WordEncoding())
+	tokenizers._get_encoding.cache_clear()
+	try:
+		first, second = get_tokenizer('gpt-4o'), TiktokenTokenizer('o200k_base')
+		# estimated from the characters until the encoding is loaded
+		assert first.count_text_tokens('one two three four five six') == 9
+		assert loaded == []
+
+		await first.aload()
+		await second.aload()
+		assert loaded == ['o200k_base']
+		assert first.count_text_tokens('one two three four five six') == 6
+		assert second.count_text_tokens('three four') == 2
+	finally:
+		tokenizers._get_encoding.cache_clear()
+
+
+async def test_messages_are_counted_again_once_the_tokenizer_is_loaded(monkeypatch, make_message_manager):
+	class CharacterEncoding:
+		def encode(self, text: str, disallowed_special=()) -> list[str]:
+			return list(text)
+
+	monkeypatch.setattr(tokenizers, '_get_encoding', lambda name: CharacterEncoding())
+	message_manager = make_message_manager(TiktokenTokenizer())
+	estimated = message_manager.state.history.current_tokens
+
+	await message_manager.aload_tokenizer()
+
+	history = message_manager.state.history
+	assert history.current_tokens > estimated
+	assert history.current_tokens == sum(m.metadata.tokens for m in history.messages)
+	assert history.messages[0].metadata.tokens == len('System message')
+
+
+def test_tokenizer_is_picked_by_model_family():
+	assert isinstance(get_tokenizer('gpt-4o-mini'), TiktokenTokenizer)
+	assert get_tokenizer('gpt-4o-mini').encoding_name == 'o200k_base'  # type: ignore[attr-defined]
+	assert get_tokenizer('gpt-4-turbo').encoding_name == 'cl100k_base'  # type: ignore[attr-defined]
+	assert isinstance(get_tokenizer('claude-3-5-sonnet-20240620'), AnthropicTokenizer)
+	assert isinstance(get_tokenizer('Unknown'), CharacterEstimateTokenizer)
+
+
+def test_image_tokens_follow_the_screenshot_size(make_message_manager):
+	screenshot = make_screenshot(1280, 1100)
+	assert get_image_size(f'data:image/png;base64,{screenshot}') == (1280, 1100)
+	assert get_image_size('https://example.com/image.png') is None
+
+	message_manager = make_message_manager(WordTokenizer())
+	message = HumanMessage(
+		content=[
+			{'type': 'text', 'text': 'the page'},
+			{'type': 'image_url', 'image_url': {'url': f'data:image/png;base64,{screenshot}'}},
+		]
+	)
+
+	# 1280x1100 is scaled to 893x768, 2x2 tiles
+	assert message_manager._count_tokens(message) == 2 + 85 + 170 * 4
+	assert AnthropicTokenizer().count_image_tokens(1280, 1100) == 1878
+
+
+def test_reported_input_tokens_are_reconciled(make_message_manager):
+	message_manager = make_message_manager(WordTokenizer(), max_input_tokens=1000)
+	counted = message_manager.state.history.current_tokens
+
+	message_manager.reconcile_input_tokens(counted + 400)
+
+	assert message_manager.state.history.overhead_tokens == 400
+	assert message_manager._get_input_tokens() == counted + 400
+
+
+def test_page_elements_are_budgeted_with_the_tokenizer(make_state, make_message_manager):
+	tokenizer = WordTokenizer()
+	message_manager = make_message_manager(tokenizer)
+
+	message_manager.add_state_message(make_state(buttons=['Search', 'Buy']))
+
+	assert '[1]<button >Buy />' in tokenizer.counted